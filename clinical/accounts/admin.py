@@ -1,6 +1,9 @@
+from django import forms
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser,Patient,Staff,Doctor,DoctorWorkingHours,DoctorUnavailability,Appointment,PatientVisit,Prescription
+from django.utils import timezone
+from . import tasks
+from .models import CustomUser,Patient,Staff,Doctor,DoctorWorkingHours,DoctorUnavailability,Appointment,PatientVisit,Prescription,ArchivedAppointment,ArchivedPatientVisit,ArchivedPrescription,DoctorDailyStats,WaitlistEntry,DoctorQueue,QueueToken,Invoice,LedgerEntry,ClinicalText,DrugTerm,PatientChartSummary,Notification,Task,AuditEntry
 
 
 class CustomUserAdmin(UserAdmin):
@@ -16,7 +19,8 @@ class CustomUserAdmin(UserAdmin):
     )
 
 class PatientAdmin(admin.ModelAdmin):
-    list_display = ('user', 'phone_number', 'blood_group', 'created_at')
+    list_display = ('user', 'phone_number', 'blood_group', 'last_systolic', 'last_diastolic', 'balance', 'created_at')
+    readonly_fields = ('balance', 'last_systolic', 'last_diastolic', 'last_vitals_at')
     search_fields = ('user__username', 'user__email', 'user__first_name', 'user__last_name', 'phone_number')
     
 class StaffAdmin(admin.ModelAdmin):
@@ -25,7 +29,7 @@ class StaffAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'user__email', 'user__first_name', 'user__last_name', 'contact_phone')
 
 class DoctorAdmin(admin.ModelAdmin):
-    list_display = ('user', 'specialization', 'registration_no', 'consultation_duration_min', 'max_daily_appointments', 'created_at')
+    list_display = ('user', 'specialization', 'registration_no', 'consultation_duration_min', 'max_daily_appointments', 'consultation_fee', 'created_at')
     search_fields = ('user__username', 'user__email', 'user__first_name', 'user__last_name', 'specialization', 'registration_no')
 
 class DoctorWorkingHoursAdmin(admin.ModelAdmin):
@@ -62,8 +66,8 @@ class PatientVisitAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at')
 
 class PrescriptionAdmin(admin.ModelAdmin):
-    list_display = ('medicine_name', 'patient', 'doctor', 'visit', 'created_at')
-    list_filter = ('doctor', 'created_at')
+    list_display = ('medicine_name', 'patient', 'doctor', 'visit', 'dispense_status', 'conflict_warning', 'created_at')
+    list_filter = ('dispense_status', 'doctor', 'created_at')
     search_fields = (
         'medicine_name',
         'patient__user__username',
@@ -73,7 +77,8 @@ class PrescriptionAdmin(admin.ModelAdmin):
         'doctor__user__first_name',
         'doctor__user__last_name',
     )
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('claimed_at', 'dispensed_at', 'created_at', 'updated_at')
+    raw_id_fields = ('claimed_by', 'dispensed_by')
 
 admin.site.register(CustomUser, CustomUserAdmin)
 admin.site.register(Patient, PatientAdmin)
@@ -83,4 +88,197 @@ admin.site.register(DoctorWorkingHours, DoctorWorkingHoursAdmin)
 admin.site.register(DoctorUnavailability, DoctorUnavailabilityAdmin)
 admin.site.register(Appointment, AppointmentAdmin)
 admin.site.register(PatientVisit, PatientVisitAdmin)
-admin.site.register(Prescription, PrescriptionAdmin)
\ No newline at end of file
+admin.site.register(Prescription, PrescriptionAdmin)
+
+class ArchivedAppointmentAdmin(admin.ModelAdmin):
+    list_display = ('id', 'doctor', 'patient', 'appointment_date', 'appointment_time', 'status', 'archived_at')
+    list_filter = ('status',)
+    search_fields = ('doctor__user__username', 'patient__username', 'patient__first_name', 'patient__last_name')
+    raw_id_fields = ('doctor', 'patient')
+
+class ArchivedPatientVisitAdmin(admin.ModelAdmin):
+    list_display = ('id', 'patient', 'doctor', 'appointment_id', 'created_at', 'archived_at')
+    search_fields = ('patient__user__username', 'doctor__user__username')
+    raw_id_fields = ('patient', 'doctor')
+
+class ArchivedPrescriptionAdmin(admin.ModelAdmin):
+    list_display = ('medicine_name', 'patient', 'doctor', 'visit', 'created_at', 'archived_at')
+    search_fields = ('medicine_name', 'patient__user__username', 'doctor__user__username')
+    raw_id_fields = ('visit', 'patient', 'doctor')
+
+admin.site.register(ArchivedAppointment, ArchivedAppointmentAdmin)
+admin.site.register(ArchivedPatientVisit, ArchivedPatientVisitAdmin)
+admin.site.register(ArchivedPrescription, ArchivedPrescriptionAdmin)
+
+class DoctorDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ('doctor', 'date', 'booked', 'confirmed', 'canceled', 'completed', 'no_show', 'visits', 'prescriptions', 'capacity_minutes')
+    list_filter = ('doctor',)
+    date_hierarchy = 'date'
+    readonly_fields = ('updated_at',)
+
+admin.site.register(DoctorDailyStats, DoctorDailyStatsAdmin)
+
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('patient', 'doctor', 'specialization', 'earliest_date', 'latest_date', 'status', 'appointment', 'created_at')
+    list_filter = ('status', 'specialization')
+    search_fields = ('patient__username', 'patient__first_name', 'patient__last_name', 'doctor__user__username')
+    raw_id_fields = ('patient', 'doctor', 'appointment')
+    readonly_fields = ('offered_at', 'created_at', 'updated_at')
+
+admin.site.register(WaitlistEntry, WaitlistEntryAdmin)
+
+class QueueTokenInline(admin.TabularInline):
+    model = QueueToken
+    extra = 0
+    raw_id_fields = ('appointment', 'patient')
+
+class DoctorQueueAdmin(admin.ModelAdmin):
+    list_display = ('doctor', 'date', 'last_token', 'waiting', 'served', 'serving', 'avg_consult_seconds')
+    list_filter = ('doctor',)
+    date_hierarchy = 'date'
+    inlines = [QueueTokenInline]
+
+admin.site.register(DoctorQueue, DoctorQueueAdmin)
+
+class InvoiceAdmin(admin.ModelAdmin):
+    list_display = ('id', 'patient', 'doctor', 'service_date', 'amount', 'status', 'created_at')
+    list_filter = ('status',)
+    date_hierarchy = 'service_date'
+    search_fields = ('patient__user__username', 'patient__user__last_name', 'doctor__user__username')
+    raw_id_fields = ('patient', 'doctor', 'visit', 'appointment')
+
+class LedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ('patient', 'kind', 'amount', 'balance_after', 'invoice', 'created_by', 'created_at')
+    list_filter = ('kind',)
+    search_fields = ('patient__user__username', 'patient__user__last_name', 'note')
+    raw_id_fields = ('patient', 'invoice', 'created_by')
+
+    # Entries move Patient.balance, so they are only written through accounts.billing
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+admin.site.register(Invoice, InvoiceAdmin)
+admin.site.register(LedgerEntry, LedgerEntryAdmin)
+
+class ClinicalTextAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'object_id', 'patient', 'doctor', 'recorded_at')
+    list_filter = ('kind',)
+    date_hierarchy = 'recorded_at'
+    raw_id_fields = ('patient', 'doctor')
+
+    # Rows mirror their source records and are maintained by accounts.search
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+admin.site.register(ClinicalText, ClinicalTextAdmin)
+
+class DrugTermAdmin(admin.ModelAdmin):
+    list_display = ('term', 'ingredient', 'drug_class', 'updated_at')
+    list_filter = ('drug_class',)
+    search_fields = ('term', 'ingredient', 'drug_class')
+
+admin.site.register(DrugTerm, DrugTermAdmin)
+
+class PatientChartSummaryAdmin(admin.ModelAdmin):
+    list_display = ('patient', 'visit_count', 'last_visit_at', 'vitals_at', 'updated_at')
+    search_fields = ('patient__user__username', 'patient__user__last_name')
+    raw_id_fields = ('patient', 'last_doctor')
+
+    # Derived from visits and prescriptions by accounts.charts
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+admin.site.register(PatientChartSummary, PatientChartSummaryAdmin)
+
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'recipient', 'appointment', 'status', 'attempts', 'available_at', 'sent_at')
+    list_filter = ('status', 'kind')
+    search_fields = ('recipient__username', 'recipient__email')
+    raw_id_fields = ('recipient', 'appointment')
+    readonly_fields = ('attempts', 'last_error', 'sent_at', 'created_at')
+    actions = ['retry']
+
+    @admin.action(description='Send again')
+    def retry(self, request, queryset):
+        n = queryset.exclude(status='pending').update(status='pending', attempts=0, available_at=timezone.now())
+        self.message_user(request, f"{n} notification(s) queued again.")
+
+admin.site.register(Notification, NotificationAdmin)
+
+class TaskAdminForm(forms.ModelForm):
+    name = forms.ChoiceField(choices=())
+
+    class Meta:
+        model = Task
+        fields = ['name', 'args', 'run_after', 'max_attempts']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if 'name' in self.fields:
+            self.fields['name'].choices = [(n, n.replace('_', ' ').capitalize()) for n in tasks.registered()]
+
+class TaskAdmin(admin.ModelAdmin):
+    form = TaskAdminForm
+    list_display = ('id', 'name', 'status', 'progress', 'attempts', 'worker', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('status', 'attempts', 'worker', 'started_at', 'heartbeat_at', 'finished_at',
+                       'progress_done', 'progress_total', 'progress_note', 'result', 'last_error',
+                       'created_by', 'created_at')
+    actions = ['run_again']
+
+    @admin.display(description='Progress')
+    def progress(self, obj):
+        if obj.progress_total:
+            text = f"{obj.progress_done}/{obj.progress_total} ({100 * obj.progress_done // obj.progress_total}%)"
+        else:
+            text = str(obj.progress_done or '')
+        return f"{text} {obj.progress_note}".strip()
+
+    # Queued from here, run by `manage.py run_tasks`; only new tasks can be edited
+    def get_readonly_fields(self, request, obj=None):
+        if obj is not None:
+            return self.readonly_fields + ('name', 'args', 'run_after', 'max_attempts')
+        return self.readonly_fields
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.created_by = request.user
+        super().save_model(request, obj, form, change)
+
+    @admin.action(description='Run again')
+    def run_again(self, request, queryset):
+        n = queryset.filter(status__in=['done', 'failed']).update(
+            status='queued', attempts=0, run_after=timezone.now(), finished_at=None,
+            progress_done=0, progress_total=None, progress_note='', last_error='',
+        )
+        self.message_user(request, f"{n} task(s) queued again.")
+
+admin.site.register(Task, TaskAdmin)
+
+class AuditEntryAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'record_type', 'record_id', 'action', 'user', 'changes')
+    list_filter = ('record_type', 'action')
+    date_hierarchy = 'created_at'
+    search_fields = ('=record_id', '=user__username')
+    raw_id_fields = ('user',)
+
+    # Append-only: written by accounts.audit, and the table refuses updates and deletes
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+admin.site.register(AuditEntry, AuditEntryAdmin)
@@ -0,0 +1,217 @@
+import re
+import threading
+import time
+from collections import deque
+
+from django.db import connections, transaction
+from django.db.models import Count, Max
+
+from .models import DrugTerm
+
+# How long a process trusts its compiled dictionary before checking whether
+# DrugTerm changed. Edits made in this process invalidate it at once.
+DICTIONARY_RECHECK_SECONDS = 60
+CONCEPT_CACHE_SIZE = 20000
+WARNING_MAX_LENGTH = 255
+
+_SEPARATORS = re.compile(r'[\s\-_/]+')
+
+
+def normalize(text):
+    """Lower-case, with hyphens, slashes and runs of whitespace as one space."""
+    return _SEPARATORS.sub(' ', (text or '').lower()).strip()
+
+
+class Matcher:
+    """
+    Aho-Corasick automaton over every dictionary term: one left-to-right pass
+    finds all terms in a text, however many terms there are. Only whole-word
+    matches count, so "sulfa" does not fire on "ferrous sulfate".
+    """
+
+    def __init__(self, terms):
+        # terms: iterable of (term, payload); payload is returned on a match
+        goto, out = [{}], [[]]
+        for term, payload in terms:
+            term = normalize(term)
+            if not term:
+                continue
+            state = 0
+            for ch in term:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append([])
+                state = nxt
+            out[state].append((len(term), payload))
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                out[nxt] = out[nxt] + out[fail[nxt]]
+
+        self.goto, self.fail, self.out = goto, fail, out
+        self._cache = {}
+
+    def find(self, text):
+        """Payloads of every whole-word term in ``text``, in order of appearance."""
+        text = normalize(text)
+        goto, fail, out = self.goto, self.fail, self.out
+        last = len(text) - 1
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state] and (i == last or not text[i + 1].isalnum()):
+                for length, payload in out[state]:
+                    start = i - length + 1
+                    if start == 0 or not text[start - 1].isalnum():
+                        yield payload
+
+    def concepts(self, text):
+        """
+        {('ingredient' | 'class', name): term as found} for ``text``. Cached
+        per text, since medicine names and allergy notes repeat a lot.
+        """
+        if not text:
+            return {}
+        found = self._cache.get(text)
+        if found is None:
+            found = {}
+            for term, ingredient, drug_class in self.find(text):
+                if ingredient:
+                    found.setdefault(('ingredient', ingredient), term)
+                if drug_class:
+                    found.setdefault(('class', drug_class), term)
+            if len(self._cache) >= CONCEPT_CACHE_SIZE:
+                self._cache.clear()
+            self._cache[text] = found
+        return found
+
+
+_lock = threading.Lock()
+_matcher = None
+_version = None
+_checked_at = 0.0
+
+
+def _dictionary_version():
+    return tuple(DrugTerm.objects.aggregate(n=Count('id'), latest=Max('updated_at')).values())
+
+
+def get_matcher():
+    """The process-wide Matcher, recompiled only when DrugTerm has changed."""
+    global _matcher, _version, _checked_at
+    now = time.monotonic()
+    if _matcher is not None and now - _checked_at < DICTIONARY_RECHECK_SECONDS:
+        return _matcher
+    with _lock:
+        if _matcher is None or now - _checked_at >= DICTIONARY_RECHECK_SECONDS:
+            version = _dictionary_version()
+            if _matcher is None or version != _version:
+                terms = DrugTerm.objects.values_list('term', 'ingredient', 'drug_class')
+                _matcher = Matcher((t, (t, i, c)) for t, i, c in terms)
+                _version = version
+            _checked_at = now
+    return _matcher
+
+
+def invalidate():
+    """Make the next check in this process look at DrugTerm again."""
+    global _checked_at
+    _checked_at = 0.0
+
+
+def find_conflicts(medicine_name, allergies=None, current_medications=None):
+    """
+    Conflicts between a medicine and a patient's free-text allergies and
+    current medications, as (kind, concept name, term found in the patient's
+    text) with kind 'allergy', 'duplicate' (same ingredient already taken)
+    or 'same_class' (another drug of that class already taken).
+    """
+    matcher = get_matcher()
+    drug = matcher.concepts(medicine_name)
+    if not drug:
+        return []
+    conflicts = []
+    allergic = matcher.concepts(allergies)
+    noted = set()
+    # Ingredient before class, so "allergic to amoxicillin" is reported once
+    for key in sorted(drug, key=lambda k: k[0] != 'ingredient'):
+        if key in allergic and allergic[key] not in noted:
+            conflicts.append(('allergy', key[1], allergic[key]))
+            noted.add(allergic[key])
+
+    taking = matcher.concepts(current_medications)
+    duplicate = False
+    for (level, name), term in taking.items():
+        if level == 'ingredient' and (level, name) in drug:
+            conflicts.append(('duplicate', name, term))
+            duplicate = True
+    if not duplicate:
+        for (level, name), term in taking.items():
+            if level == 'class' and (level, name) in drug:
+                conflicts.append(('same_class', name, term))
+    return conflicts
+
+
+def describe(conflicts):
+    """One line for the doctor / pharmacist, at most WARNING_MAX_LENGTH long."""
+    parts = []
+    for kind, name, term in conflicts:
+        if kind == 'allergy':
+            parts.append(f"Allergy: {name} (noted: {term})")
+        elif kind == 'duplicate':
+            parts.append(f"Already taking {name}")
+        else:
+            parts.append(f"Already taking another {name} ({term})")
+    text = '; '.join(dict.fromkeys(parts))
+    if len(text) > WARNING_MAX_LENGTH:
+        text = text[:WARNING_MAX_LENGTH - 1] + '…'
+    return text
+
+
+def check_prescription(prescription):
+    patient = prescription.patient
+    return describe(find_conflicts(prescription.medicine_name, patient.allergies, patient.current_medications))
+
+
+AUDIT_COLUMNS = ('id', 'patient_id', 'doctor_id', 'created_at', 'medicine_name', 'conflict_warning',
+                 'patient__allergies', 'patient__current_medications')
+
+
+def audit_batch(model, after_id, batch_size, update=False):
+    """
+    Re-check one keyset batch of ``model`` (Prescription or
+    ArchivedPrescription) against the patients' current allergy and
+    medication notes. Returns (last id or None when done, rows checked,
+    conflicting rows as (id, patient_id, doctor_id, created_at,
+    medicine_name, warning), number of stored warnings that differ). With
+    ``update`` the stored warnings are rewritten to match.
+    """
+    with transaction.atomic():
+        rows = list(model.objects.filter(pk__gt=after_id).order_by('pk').values_list(*AUDIT_COLUMNS)[:batch_size])
+        if not rows:
+            return None, 0, [], 0
+        found, changed = [], []
+        for pk, patient_id, doctor_id, created_at, medicine, stored, allergies, taking in rows:
+            warning = describe(find_conflicts(medicine, allergies, taking))
+            if warning:
+                found.append((pk, patient_id, doctor_id, created_at, medicine, warning))
+            if warning != stored:
+                changed.append((warning, pk))
+        if update and changed:
+            table = model._meta.db_table
+            with connections[model.objects.db].cursor() as cursor:
+                cursor.executemany(f'UPDATE "{table}" SET "conflict_warning" = %s WHERE "id" = %s', changed)
+    return rows[-1][0], len(rows), found, len(changed)
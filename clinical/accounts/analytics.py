@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import CharField, Count, IntegerField
+from django.db.models.functions import Cast, Substr
+from django.utils import timezone
+
+from . import stats
+from .models import Appointment, Doctor, DoctorWorkingHours
+
+
+def _weekday_counts(start, end):
+    """How many Mondays..Sundays fall in [start, end]."""
+    days = np.arange(start.toordinal(), end.toordinal() + 1)
+    return np.bincount((days + 6) % 7, minlength=7)
+
+
+def _booked_counts(start, end, doctor_ids):
+    """
+    Appointments that were not canceled, counted per doctor, day and hour in
+    SQL, as (doctor_id, weekday, hour, count) arrays. The day comes back as
+    ISO text and numpy parses the whole column at once; SQLite's native
+    SUBSTR/CAST give the hour, where Extract* would run a Python function
+    per row.
+    """
+    rows = list(Appointment.objects
+                .filter(appointment_date__range=(start, end), doctor_id__in=doctor_ids)
+                .exclude(status='canceled')
+                .annotate(day=Cast('appointment_date', CharField()),
+                          hour=Cast(Substr('appointment_time', 1, 2), IntegerField()))
+                .values_list('doctor_id', 'day', 'hour')
+                .annotate(n=Count('id'))
+                .order_by())
+    if not rows:
+        return (np.zeros(0, dtype=np.int64),) * 4
+    doc, day, hour, n = zip(*rows)
+    days = np.array(day, dtype='datetime64[D]').astype(np.int64)
+    weekday = (days + 3) % 7  # 1970-01-01 was a Thursday
+    return np.array(doc, dtype=np.int64), weekday, np.array(hour, dtype=np.int64), np.array(n, dtype=np.int64)
+
+
+def utilization_report(start, end, doctors=None):
+    """
+    Booked vs available slots by doctor, weekday and hour for [start, end],
+    with cancellation and no-show rates. Heatmaps are (doctor, 7, 24) arrays;
+    the per-doctor outcome counts come from the DoctorDailyStats rollup.
+    """
+    if doctors is None:
+        doctors = Doctor.objects.select_related('user').order_by('user__first_name', 'user__last_name')
+    doctors = list(doctors)
+    doctor_ids = np.array(sorted(d.id for d in doctors), dtype=np.int64)
+    n = len(doctor_ids)
+    shape = (n, 7, 24)
+    booked = np.zeros(shape, dtype=np.int64)
+
+    if n:
+        doc, wd, hr, count = _booked_counts(start, end, doctor_ids.tolist())
+        np.add.at(booked, (np.searchsorted(doctor_ids, doc), wd, hr), count)
+
+    totals = stats.totals(start, end, doctor_ids.tolist())
+
+    def counter(field):
+        return np.array([(totals.get(i) or {}).get(field) or 0 for i in doctor_ids.tolist()], dtype=np.int64)
+
+    canceled, attended, no_show = counter('canceled'), counter('completed'), counter('no_show')
+
+    # Capacity in slots: each working block split into consultation-length
+    # slots, bucketed by hour, times how often that weekday occurs in range.
+    capacity = np.zeros(shape, dtype=np.int64)
+    weekday_counts = _weekday_counts(start, end)
+    duration = {d.id: d.consultation_duration_min or 15 for d in doctors}
+    blocks = (DoctorWorkingHours.objects
+              .filter(doctor_id__in=doctor_ids.tolist(), is_active=True)
+              .values_list('doctor_id', 'weekdays', 'start_time', 'end_time'))
+    for doc_id, wd, s, e in blocks:
+        starts = np.arange(s.hour * 60 + s.minute, e.hour * 60 + e.minute, duration[doc_id])
+        i = np.searchsorted(doctor_ids, doc_id)
+        capacity[i, wd] += np.bincount(starts // 60, minlength=24) * weekday_counts[wd]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        utilization = np.where(capacity > 0, booked / capacity, np.nan)
+        total = booked.sum(axis=(1, 2)) + canceled
+        cancel_rate = np.where(total > 0, canceled / total, np.nan)
+        past_active = no_show + attended
+        no_show_rate = np.where(past_active > 0, no_show / past_active, np.nan)
+        doctor_utilization = np.where(capacity.sum(axis=(1, 2)) > 0,
+                                      booked.sum(axis=(1, 2)) / capacity.sum(axis=(1, 2)), np.nan)
+
+    by_id = {d.id: d for d in doctors}
+    return {
+        'start': start,
+        'end': end,
+        'doctors': [by_id[i] for i in doctor_ids.tolist()],
+        'booked': booked,
+        'capacity': capacity,
+        'utilization': utilization,
+        'doctor_utilization': doctor_utilization,
+        'canceled': canceled,
+        'no_show': no_show,
+        'attended': attended,
+        'cancel_rate': cancel_rate,
+        'no_show_rate': no_show_rate,
+    }
+
+
+def default_range():
+    end = timezone.localdate()
+    return end - timedelta(days=27), end
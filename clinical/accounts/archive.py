@@ -0,0 +1,133 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BooleanField, F, Value
+from django.utils import timezone
+
+from . import search, vitals
+from .models import (
+    Appointment, ArchivedAppointment, ArchivedPatientVisit, ArchivedPrescription, Invoice,
+    Notification, PatientVisit, Prescription, QueueToken, WaitlistEntry,
+)
+from .signals import bulk_maintenance
+
+APPOINTMENT_FIELDS = ['id', 'doctor_id', 'patient_id', 'appointment_date', 'appointment_time',
+                      'status', 'notes', 'created_at', 'updated_at']
+VISIT_FIELDS = ['id', 'patient_id', 'doctor_id', 'appointment_id', 'height_cm', 'weight_kg',
+                'blood_pressure', 'bp_systolic', 'bp_diastolic', 'sugar_level', 'notes', 'symptoms',
+                'created_at', 'updated_at']
+PRESCRIPTION_FIELDS = ['id', 'visit_id', 'doctor_id', 'patient_id', 'medicine_name', 'dosage',
+                       'frequency', 'duration_days', 'notes', 'dispense_status', 'claimed_by_id',
+                       'claimed_at', 'dispensed_by_id', 'dispensed_at', 'conflict_warning', 'end_date', 'created_at', 'updated_at']
+
+
+def _aware_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def archive_horizon():
+    """Oldest date still guaranteed to be in the hot tables."""
+    return timezone.localdate() - timedelta(days=getattr(settings, 'ARCHIVE_RETENTION_DAYS', 730))
+
+
+# Rows that stay hot but point at archived ones. Deleting the target nulls
+# the foreign key (SET_NULL), so its id is copied to archived_<field>_id first.
+APPOINTMENT_REFERENCES = [(Invoice, 'appointment'), (Notification, 'appointment'),
+                          (QueueToken, 'appointment'), (WaitlistEntry, 'appointment')]
+VISIT_REFERENCES = [(Invoice, 'visit')]
+
+
+def _keep_references(references, ids):
+    for model, field in references:
+        model.objects.filter(**{f"{field}_id__in": ids}).update(**{f"archived_{field}_id": F(f"{field}_id")})
+
+
+def _move(model, archive_model, rows, references=()):
+    ids = [r['id'] for r in rows]
+    archive_model.objects.bulk_create([archive_model(**r) for r in rows], ignore_conflicts=True)
+    _keep_references(references, ids)
+    model.objects.filter(pk__in=ids).delete()
+
+
+def archive_appointment_batch(horizon, after_id, batch_size):
+    """
+    Move one batch of appointments dated before ``horizon`` (plus their visits
+    and prescriptions) into the archive tables. Each batch is its own
+    transaction, so an interrupted run simply continues where it stopped.
+    Returns (last appointment id, counts) or (None, counts) when done.
+    """
+    counts = {'appointments': 0, 'visits': 0, 'prescriptions': 0}
+    # The daily rollup and the search index keep describing archived rows,
+    # so leave them alone
+    with transaction.atomic(), bulk_maintenance(), search.retained():
+        appts = list(Appointment.objects
+                     .filter(pk__gt=after_id, appointment_date__lt=horizon)
+                     .order_by('pk').values(*APPOINTMENT_FIELDS)[:batch_size])
+        if not appts:
+            return None, counts
+
+        visits = list(PatientVisit.objects
+                      .filter(appointment_id__in=[a['id'] for a in appts])
+                      .values(*VISIT_FIELDS))
+        counts['visits'], counts['prescriptions'] = _move_visits(visits)
+        _move(Appointment, ArchivedAppointment, appts, APPOINTMENT_REFERENCES)
+        counts['appointments'] = len(appts)
+    return appts[-1]['id'], counts
+
+
+def archive_orphan_visit_batch(horizon, after_id, batch_size):
+    """Same as above for walk-in visits that have no appointment."""
+    cutoff = _aware_start(horizon)
+    with transaction.atomic(), bulk_maintenance(), search.retained():
+        visits = list(PatientVisit.objects
+                      .filter(pk__gt=after_id, appointment__isnull=True, created_at__lt=cutoff)
+                      .order_by('pk').values(*VISIT_FIELDS)[:batch_size])
+        if not visits:
+            return None, (0, 0)
+        moved = _move_visits(visits)
+    return visits[-1]['id'], moved
+
+
+def _move_visits(visits):
+    if not visits:
+        return 0, 0
+    prescriptions = list(Prescription.objects
+                         .filter(visit_id__in=[v['id'] for v in visits])
+                         .values(*PRESCRIPTION_FIELDS))
+    # Parents first in the archive, children first out of the hot tables
+    ArchivedPatientVisit.objects.bulk_create([ArchivedPatientVisit(**v) for v in visits], ignore_conflicts=True)
+    if prescriptions:
+        _move(Prescription, ArchivedPrescription, prescriptions)
+    visit_ids = [v['id'] for v in visits]
+    _keep_references(VISIT_REFERENCES, visit_ids)
+    PatientVisit.objects.filter(pk__in=visit_ids).delete()
+    # Latest readings come from the hot table only
+    vitals.refresh_latest({v['patient_id'] for v in visits if v['bp_systolic'] is not None})
+    return len(visits), len(prescriptions)
+
+
+# History read path. Callers that only need recent data keep using the hot
+# tables; the archive is only unioned in when ``since`` reaches past the horizon.
+
+def _history(hot_qs, archive_qs, fields, date_filter, since, horizon):
+    if since is not None:
+        hot_qs = hot_qs.filter(**{f"{date_filter}__gte": since})
+    hot = hot_qs.values(*fields).annotate(archived=Value(False, output_field=BooleanField()))
+    if since is not None and since >= horizon:
+        return hot
+    if since is not None:
+        archive_qs = archive_qs.filter(**{f"{date_filter}__gte": since})
+    old = archive_qs.values(*fields).annotate(archived=Value(True, output_field=BooleanField()))
+    return hot.union(old, all=True)
+
+
+def visit_history(patient, since=None, fields=VISIT_FIELDS):
+    """Visits for a Patient profile, newest first, as dicts of ``fields``."""
+    since_dt = _aware_start(since) if since else None
+    qs = _history(
+        PatientVisit.objects.filter(patient=patient),
+        ArchivedPatientVisit.objects.filter(patient=patient),
+        fields, 'created_at', since_dt, _aware_start(archive_horizon()),
+    )
+    return qs.order_by('-created_at')
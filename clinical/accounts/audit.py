@@ -0,0 +1,147 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+from functools import partial
+
+from django.db import router, transaction
+from django.utils import timezone
+
+from .models import AuditEntry, PatientVisit, Prescription
+
+# Who changed what in the medical records. The signal handlers in
+# accounts.signals diff each save against the stored row and hand the result
+# to record(); an entry is kept only once its change commits, and entries are
+# then written together, one INSERT per request (AuditMiddleware) or batch()
+# block, rather than one per save. queryset.update() and bulk_create bypass
+# the signals: pharmacy claim/release/dispense call record() themselves, and
+# bulk loads are not audited.
+
+# Audited fields per model, by attname. Values derived from these
+# (bp_systolic, end_date, conflict_warning, ...) and timestamps are left out.
+TRACKED = {
+    PatientVisit: ('visit', ['patient_id', 'doctor_id', 'appointment_id', 'height_cm', 'weight_kg',
+                             'blood_pressure', 'sugar_level', 'notes', 'symptoms']),
+    Prescription: ('prescription', ['visit_id', 'patient_id', 'doctor_id', 'medicine_name', 'dosage',
+                                    'frequency', 'duration_days', 'notes',
+                                    'dispense_status', 'claimed_by_id', 'dispensed_by_id']),
+}
+
+# The request's user, read lazily so requests that change nothing never load it
+_actor = ContextVar('audit_actor', default=None)
+# Committed entries waiting to be written; None writes each one straight away
+_pending = ContextVar('audit_pending', default=None)
+
+
+def snapshot(instance):
+    """The stored values of ``instance``'s audited fields, or None when it is being created."""
+    if instance._state.adding or instance.pk is None:
+        return None
+    model = type(instance)
+    return (model._base_manager.using(router.db_for_write(model))
+            .filter(pk=instance.pk).values(*TRACKED[model][1]).first())
+
+
+def _normalized(field, value):
+    """``value`` as ``field`` stores it: its Python type, and decimals at the field's places."""
+    value = field.to_python(value)
+    if isinstance(value, Decimal) and value.is_finite():
+        value = value.quantize(Decimal(1).scaleb(-field.decimal_places))
+    return value
+
+
+def diff(instance, before):
+    """
+    {field: [old, new]} for the audited fields that changed since ``before``
+    (a snapshot()), or {field: value} for the non-empty ones when there was
+    no stored row. Both sides are _normalized(), so 70.5 and Decimal('70.50')
+    are the same weight and an edit from 65 to 71 kg logs ["65.00", "71.00"].
+    """
+    meta = instance._meta
+    changes = {}
+    for name in TRACKED[type(instance)][1]:
+        field = meta.get_field(name)
+        new = _normalized(field, getattr(instance, name))
+        if before is None:
+            if new not in (None, ''):
+                changes[name] = new
+            continue
+        old = _normalized(field, before[name])
+        if old != new:
+            changes[name] = [old, new]
+    return changes
+
+
+def record(instance, action, changes):
+    """Queue an entry for ``instance``; it is kept only if the surrounding transaction commits."""
+    model = type(instance)
+    user = _actor.get()
+    entry = AuditEntry(
+        record_type=TRACKED[model][0], record_id=instance.pk, action=action, changes=changes,
+        user_id=user.pk if user is not None and user.is_authenticated else None,
+        created_at=timezone.now(),
+    )
+    # One callback per entry, so Django drops it along with a rolled-back savepoint
+    transaction.on_commit(partial(_committed, entry), using=router.db_for_write(model))
+
+
+def _committed(entry):
+    pending = _pending.get()
+    if pending is None:
+        AuditEntry.objects.bulk_create([entry])
+    else:
+        pending.append(entry)
+
+
+@contextmanager
+def batch():
+    """Hold entries committed inside the block and write them in one INSERT at its end."""
+    if _pending.get() is not None:
+        yield
+        return
+    token = _pending.set([])
+    try:
+        yield
+    finally:
+        entries = _pending.get()
+        _pending.reset(token)
+        if entries:
+            AuditEntry.objects.bulk_create(entries)
+
+
+class AuditMiddleware:
+    """
+    Attributes a request's changes to its user and writes their entries in
+    one batch after the view, errors included. Goes after
+    AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _actor.set(request.user)
+        try:
+            with batch():
+                return self.get_response(request)
+        finally:
+            _actor.reset(token)
+
+
+def history(record_or_type, record_id=None):
+    """Entries for one visit or prescription, newest first: pass the instance, or its type ('visit', ...) and id."""
+    if record_id is None:
+        record_type, record_id = TRACKED[type(record_or_type)][0], record_or_type.pk
+    else:
+        record_type = record_or_type
+    return (AuditEntry.objects.filter(record_type=record_type, record_id=record_id)
+            .order_by('-created_at', '-id'))
+
+
+def by_user(user, since=None, until=None):
+    """Entries for changes made by ``user`` (or a user id), newest first, optionally within [since, until)."""
+    entries = AuditEntry.objects.filter(user_id=getattr(user, 'pk', user))
+    if since is not None:
+        entries = entries.filter(created_at__gte=since)
+    if until is not None:
+        entries = entries.filter(created_at__lt=until)
+    return entries.order_by('-created_at', '-id')
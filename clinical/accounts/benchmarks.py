@@ -0,0 +1,31 @@
+import tempfile
+from contextlib import contextmanager
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.db import connection
+
+DATASET_SIZES = {
+    'small': {'doctors': 10, 'patients': 1000, 'years': 0.25},
+    'medium': {'doctors': 30, 'patients': 5000, 'years': 1.0},
+    'large': {'doctors': 100, 'patients': 20000, 'years': 3.0},
+}
+
+
+@contextmanager
+def scratch_database(size, seed):
+    """
+    Point the default connection at a throwaway SQLite file, migrate it and
+    fill it with generate_hospital_data, so benchmarks never touch real data.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        old_name = connection.settings_dict['NAME']
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = str(Path(tmp) / 'scratch.sqlite3')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            call_command('generate_hospital_data', seed=seed, stdout=StringIO(), **DATASET_SIZES[size])
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            connection.settings_dict['TEST']['NAME'] = None
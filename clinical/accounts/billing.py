@@ -0,0 +1,76 @@
+from datetime import datetime, time
+
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q, Sum
+from django.utils import timezone
+
+from .models import Invoice, LedgerEntry, Patient, PatientVisit
+
+
+def billable_visits(day):
+    """Visits on ``day`` (by appointment date, or creation date for walk-ins) with no invoice yet."""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = timezone.make_aware(datetime.combine(day, time.max))
+    return (PatientVisit.objects
+            .filter(Q(appointment__appointment_date=day)
+                    | Q(appointment__isnull=True, created_at__range=(start, end)))
+            .filter(doctor__consultation_fee__gt=0)
+            .exclude(Exists(Invoice.objects.filter(visit=OuterRef('pk')))))
+
+
+def generate_invoices(day):
+    """
+    Invoice every billable visit of ``day`` at the doctor's consultation fee,
+    in one transaction: invoices and ledger charges go in with bulk_create and
+    the patients' running balances with one bulk_update. Returns the invoices.
+    """
+    with transaction.atomic():
+        visits = list(billable_visits(day)
+                      .select_related('doctor')
+                      .only('id', 'patient_id', 'doctor_id', 'appointment_id', 'doctor__consultation_fee')
+                      .order_by('id'))
+        if not visits:
+            return []
+
+        invoices = Invoice.objects.bulk_create([
+            Invoice(patient_id=v.patient_id, doctor_id=v.doctor_id, visit_id=v.id,
+                    appointment_id=v.appointment_id, service_date=day, amount=v.doctor.consultation_fee)
+            for v in visits
+        ])
+
+        patients = {p.pk: p for p in Patient.objects
+                    .select_for_update()
+                    .filter(pk__in={v.patient_id for v in visits})
+                    .only('id', 'balance')}
+        entries = []
+        for inv in invoices:
+            patient = patients[inv.patient_id]
+            patient.balance += inv.amount
+            entries.append(LedgerEntry(patient_id=inv.patient_id, invoice=inv, kind='charge',
+                                       amount=inv.amount, balance_after=patient.balance,
+                                       note=f"Consultation on {day}"))
+        LedgerEntry.objects.bulk_create(entries)
+        Patient.objects.bulk_update(patients.values(), ['balance'], batch_size=500)
+    return invoices
+
+
+def post_entry(patient, kind, amount, invoice=None, note='', user=None):
+    """
+    Record one ledger entry and move the running balance with it. Payments
+    are passed as positive amounts and stored negative; an adjustment is
+    signed as given, so a credit or write-off is a negative one. An invoice
+    is marked paid once its payments together cover it.
+    """
+    signed = -amount if kind == 'payment' else amount
+    with transaction.atomic():
+        Patient.objects.filter(pk=patient.pk).update(balance=F('balance') + signed)
+        balance = Patient.objects.filter(pk=patient.pk).values_list('balance', flat=True).get()
+        entry = LedgerEntry.objects.create(patient=patient, invoice=invoice, kind=kind, amount=signed,
+                                           balance_after=balance, note=note, created_by=user)
+        if invoice is not None and kind == 'payment':
+            # Split payments count together; payments are stored negative
+            paid = -(invoice.ledger_entries.filter(kind='payment').aggregate(total=Sum('amount'))['total'] or 0)
+            if paid >= invoice.amount:
+                Invoice.objects.filter(pk=invoice.pk, status='open').update(status='paid', updated_at=timezone.now())
+    patient.balance = balance
+    return entry
@@ -0,0 +1,154 @@
+from collections import Counter
+from datetime import date, timedelta
+
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .models import ArchivedPatientVisit, Patient, PatientChartSummary, PatientVisit, Prescription
+
+# A prescription without duration_days counts as active for this long
+OPEN_ENDED_DAYS = 30
+
+VITALS_FIELDS = ('height_cm', 'weight_kg', 'blood_pressure', 'sugar_level')
+HAS_VITALS = (Q(height_cm__isnull=False) | Q(weight_kg__isnull=False)
+              | Q(blood_pressure__gt='') | Q(sugar_level__isnull=False))
+SUMMARY_FIELDS = ['visit_count', 'last_visit_at', 'last_doctor', 'vitals_at', *VITALS_FIELDS,
+                  'active_medications', 'allergies', 'chronic_diseases', 'updated_at']
+
+
+def course_end(created_at, duration_days):
+    """Last day of a course started at ``created_at``: a 5-day course started today ends in 4 days."""
+    return timezone.localdate(created_at) + timedelta(days=(duration_days or OPEN_ENDED_DAYS) - 1)
+
+
+def _has_vitals(visit):
+    return any(getattr(visit, f) not in (None, '') for f in VITALS_FIELDS)
+
+
+def active_prescriptions(patient_ids, today=None):
+    """
+    Prescriptions of ``patient_ids`` whose course has not ended by ``today``,
+    oldest first: a range scan of rx_patient_end per patient.
+    """
+    today = today or timezone.localdate()
+    return (Prescription.objects
+            .filter(patient_id__in=list(patient_ids), end_date__gte=today)
+            .order_by('created_at', 'pk'))
+
+
+def _active_medications(patient_ids, today):
+    meds = {pid: [] for pid in patient_ids}
+    rows = active_prescriptions(patient_ids, today).values(
+        'id', 'patient_id', 'medicine_name', 'dosage', 'frequency', 'end_date',
+    )
+    for r in rows:
+        meds[r['patient_id']].append({
+            'id': r['id'], 'medicine_name': r['medicine_name'], 'dosage': r['dosage'],
+            'frequency': r['frequency'], 'until': r['end_date'].isoformat(),
+        })
+    return meds
+
+
+def _latest_visits(patient_ids, condition=Q()):
+    """{patient_id: newest hot or archived visit matching ``condition``}."""
+    latest = {}
+    for model in (PatientVisit, ArchivedPatientVisit):
+        newest = model.objects.filter(condition, patient=OuterRef('pk')).order_by('-created_at', '-pk')
+        ids = dict(Patient.objects.filter(pk__in=patient_ids)
+                   .annotate(visit_id=Subquery(newest.values('pk')[:1]))
+                   .filter(visit_id__isnull=False)
+                   .values_list('pk', 'visit_id'))
+        for visit in model.objects.in_bulk(ids.values()).values():
+            seen = latest.get(visit.patient_id)
+            if seen is None or visit.created_at > seen.created_at:
+                latest[visit.patient_id] = visit
+    return latest
+
+
+def rebuild(patient_ids):
+    """Recompute the summaries of ``patient_ids`` from scratch (upsert)."""
+    patient_ids = list(patient_ids)
+    if not patient_ids:
+        return 0
+    today = timezone.localdate()
+    counts = Counter()
+    for model in (PatientVisit, ArchivedPatientVisit):
+        rows = (model.objects.filter(patient_id__in=patient_ids)
+                .values('patient_id').annotate(n=Count('id')).order_by())
+        counts.update({r['patient_id']: r['n'] for r in rows})
+    last_visit = _latest_visits(patient_ids)
+    last_vitals = _latest_visits(patient_ids, HAS_VITALS)
+    meds = _active_medications(patient_ids, today)
+
+    summaries = []
+    for pid, allergies, chronic in (Patient.objects.filter(pk__in=patient_ids)
+                                    .values_list('pk', 'allergies', 'chronic_diseases')):
+        visit, vitals = last_visit.get(pid), last_vitals.get(pid)
+        summary = PatientChartSummary(
+            patient_id=pid, visit_count=counts[pid],
+            last_visit_at=visit.created_at if visit else None,
+            last_doctor_id=visit.doctor_id if visit else None,
+            vitals_at=vitals.created_at if vitals else None,
+            active_medications=meds[pid], allergies=allergies, chronic_diseases=chronic,
+        )
+        for f in VITALS_FIELDS:
+            setattr(summary, f, getattr(vitals, f) if vitals else None)
+        summaries.append(summary)
+    PatientChartSummary.objects.bulk_create(
+        summaries, update_conflicts=True, unique_fields=['patient'], update_fields=SUMMARY_FIELDS,
+    )
+    return len(summaries)
+
+
+# Incremental maintenance, called from accounts.signals. Each is one or two
+# UPDATEs; a patient without a summary row yet gets a full rebuild instead.
+
+def visit_saved(visit, created):
+    rows = PatientChartSummary.objects.filter(patient_id=visit.patient_id)
+    if created:
+        if not rows.update(visit_count=F('visit_count') + 1):
+            rebuild([visit.patient_id])
+            return
+        rows.filter(Q(last_visit_at__isnull=True) | Q(last_visit_at__lte=visit.created_at)).update(
+            last_visit_at=visit.created_at, last_doctor_id=visit.doctor_id,
+        )
+    if _has_vitals(visit):
+        # Only ever move the vitals forward in time
+        rows.filter(Q(vitals_at__isnull=True) | Q(vitals_at__lte=visit.created_at)).update(
+            vitals_at=visit.created_at, **{f: getattr(visit, f) for f in VITALS_FIELDS},
+        )
+
+
+def visit_deleted(visit):
+    if PatientChartSummary.objects.filter(patient_id=visit.patient_id).exists():
+        rebuild([visit.patient_id])
+
+
+def medications_changed(patient_id):
+    meds = _active_medications([patient_id], timezone.localdate())[patient_id]
+    if not PatientChartSummary.objects.filter(patient_id=patient_id).update(active_medications=meds):
+        rebuild([patient_id])
+
+
+def patient_saved(patient):
+    PatientChartSummary.objects.filter(patient_id=patient.pk).update(
+        allergies=patient.allergies, chronic_diseases=patient.chronic_diseases,
+    )
+
+
+def get_chart(patient_id):
+    """
+    The patient's summary in one query (built on first use), with
+    ``current_medications``: the stored courses that have not ended today.
+    """
+    charts = PatientChartSummary.objects.select_related('last_doctor__user')
+    chart = charts.filter(patient_id=patient_id).first()
+    if chart is None:
+        rebuild([patient_id])
+        chart = charts.get(patient_id=patient_id)
+    today = timezone.localdate()
+    chart.current_medications = [
+        dict(m, until=date.fromisoformat(m['until'])) for m in chart.active_medications
+        if date.fromisoformat(m['until']) >= today
+    ]
+    return chart
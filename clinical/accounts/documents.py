@@ -0,0 +1,203 @@
+import hashlib
+import os
+from datetime import datetime, time, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import pdf
+from .models import PatientVisit, Prescription
+
+# Printable prescriptions, one PDF per visit, cached on disk under
+# DOCUMENT_CACHE_DIR. A file's name carries a hash of everything printed on
+# it (the rows' updated_at plus the user names, which live on CustomUser and
+# have no timestamp), so an edit simply makes a new file; serving an
+# unchanged document costs two small queries and no rendering.
+
+# Part of every key: bump it when the layout below changes
+LAYOUT_VERSION = 1
+
+MARGIN = 50
+BOTTOM = pdf.PAGE_HEIGHT - 60
+LINE = 14
+KEY_FIELDS = ['updated_at', 'patient__updated_at', 'doctor__updated_at',
+              'patient__user__first_name', 'patient__user__last_name',
+              'doctor__user__first_name', 'doctor__user__last_name']
+
+
+def cache_dir():
+    return Path(getattr(settings, 'DOCUMENT_CACHE_DIR', settings.BASE_DIR / 'documents'))
+
+
+def cache_key(visit_id):
+    """Hash of the rows that make up the visit's document, or None if there is no such visit."""
+    row = PatientVisit.objects.filter(pk=visit_id).values_list(*KEY_FIELDS).first()
+    if row is None:
+        return None
+    prescriptions = Prescription.objects.filter(visit_id=visit_id).order_by('pk').values_list('pk', 'updated_at')
+    parts = [LAYOUT_VERSION, *row, *prescriptions]
+    return hashlib.sha256(repr(parts).encode()).hexdigest()[:20]
+
+
+def document_path(visit_id, key):
+    # Grouped by thousands of visit ids to keep directories small
+    return cache_dir() / str(visit_id // 1000) / f"visit-{visit_id}-{key}.pdf"
+
+
+def build(visit, prescriptions):
+    """The prescription for ``visit`` (with patient and doctor users loaded) as PDF bytes."""
+    doctor, patient = visit.doctor, visit.patient
+    doc = pdf.Document(f"Prescription - {patient}")
+    visited = timezone.localtime(visit.created_at)
+    width = pdf.PAGE_WIDTH - 2 * MARGIN
+    y = MARGIN + 10
+
+    def footer():
+        doc.line(MARGIN, BOTTOM + 12, pdf.PAGE_WIDTH - MARGIN, BOTTOM + 12)
+        doc.text(MARGIN, BOTTOM + 26, f"{patient} - visit {visit.pk} - {visited:%d %b %Y}", 8)
+
+    def room(lines):
+        # Start a new page when the next block would run into the footer
+        nonlocal y
+        if y + lines * LINE > BOTTOM:
+            footer()
+            doc.new_page()
+            y = MARGIN + 10
+
+    doc.text(MARGIN, y, f"Dr. {doctor}", 16, 'bold')
+    doc.text(pdf.PAGE_WIDTH - MARGIN - pdf.text_width('PRESCRIPTION', 12, 'bold'), y, 'PRESCRIPTION', 12, 'bold')
+    y += LINE + 4
+    for detail in (', '.join(filter(None, [doctor.qualification, doctor.specialization])),
+                   f"Reg. No. {doctor.registration_no}" if doctor.registration_no else '',
+                   doctor.clinic_location):
+        if detail:
+            doc.text(MARGIN, y, detail, 9)
+            y += LINE - 2
+    y += 4
+    doc.line(MARGIN, y, pdf.PAGE_WIDTH - MARGIN, y, 1)
+    y += LINE + 6
+
+    visit_day = visited.date()
+    age = visit_day.year - patient.dob.year - ((visit_day.month, visit_day.day) < (patient.dob.month, patient.dob.day))
+    details = [f"{age} y", patient.get_gender_display()]
+    if patient.blood_group:
+        details.append(patient.blood_group)
+    doc.text(MARGIN, y, str(patient), 12, 'bold')
+    date_label = f"Date: {visited:%d %b %Y}"
+    doc.text(pdf.PAGE_WIDTH - MARGIN - pdf.text_width(date_label, 10), y, date_label)
+    y += LINE
+    doc.text(MARGIN, y, ', '.join(details), 9)
+    y += LINE
+
+    vitals = [label % value for label, value in (
+        ('BP %s', visit.blood_pressure), ('Weight %s kg', visit.weight_kg),
+        ('Height %s cm', visit.height_cm), ('Sugar %s', visit.sugar_level),
+    ) if value not in (None, '')]
+    if vitals:
+        doc.text(MARGIN, y, '   '.join(vitals), 9)
+        y += LINE
+    if visit.symptoms:
+        y += 4
+        for line in pdf.wrap(f"Complaints: {visit.symptoms}", width, 9):
+            room(1)
+            doc.text(MARGIN, y, line, 9)
+            y += LINE - 2
+    y += 10
+
+    doc.text(MARGIN, y, 'Rx', 14, 'bold')
+    y += LINE + 6
+    if not prescriptions:
+        doc.text(MARGIN, y, 'No medicines prescribed.', 10)
+        y += LINE
+    for n, p in enumerate(prescriptions, 1):
+        directions = ', '.join(filter(None, [
+            p.dosage, p.frequency, f"for {p.duration_days} days" if p.duration_days else '',
+        ]))
+        notes = pdf.wrap(p.notes, width - 20, 9) if p.notes else []
+        room(2 + min(len(notes), 3))
+        doc.text(MARGIN, y, f"{n}.", 11, 'bold')
+        doc.text(MARGIN + 20, y, p.medicine_name, 11, 'bold')
+        y += LINE
+        if directions:
+            doc.text(MARGIN + 20, y, directions, 10)
+            y += LINE
+        for line in notes:
+            room(1)
+            doc.text(MARGIN + 20, y, line, 9)
+            y += LINE - 2
+        y += 6
+
+    room(4)
+    y = max(y + 2 * LINE, BOTTOM - 3 * LINE)
+    signature = f"Dr. {doctor}"
+    doc.line(pdf.PAGE_WIDTH - MARGIN - 160, y, pdf.PAGE_WIDTH - MARGIN, y)
+    doc.text(pdf.PAGE_WIDTH - MARGIN - 160, y + LINE, signature, 10)
+    footer()
+    return doc.render()
+
+
+def render(visit_id, key):
+    """Write the visit's document for ``key`` and drop its superseded versions; returns the path."""
+    visit = PatientVisit.objects.select_related('patient__user', 'doctor__user').get(pk=visit_id)
+    prescriptions = list(Prescription.objects.filter(visit_id=visit_id).order_by('created_at', 'pk'))
+    path = document_path(visit_id, key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Written aside and renamed, so a concurrent reader never sees half a file
+    partial = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    partial.write_bytes(build(visit, prescriptions))
+    os.replace(partial, path)
+    for old in path.parent.glob(f"visit-{visit_id}-*.pdf"):
+        if old != path:
+            old.unlink(missing_ok=True)
+    return path
+
+
+def get(visit_id):
+    """(path, key) of the visit's current document, rendering it if needed; None for an unknown visit."""
+    key = cache_key(visit_id)
+    if key is None:
+        return None
+    path = document_path(visit_id, key)
+    if not path.exists():
+        render(visit_id, key)
+    return path, key
+
+
+def open_current(visit_id):
+    """
+    (open binary file, key) of the visit's current document; None for an
+    unknown visit. Another request may render a newer version and drop the
+    one get() returned before it is opened; the second get() finds the new
+    one.
+    """
+    for attempt in range(2):
+        found = get(visit_id)
+        if found is None:
+            return None
+        path, key = found
+        try:
+            return open(path, 'rb'), key
+        except FileNotFoundError:
+            if attempt:
+                raise
+
+
+def visits_on(day):
+    """Ids of the visits on ``day`` that have prescriptions, i.e. whose documents will be asked for."""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return list(PatientVisit.objects
+                .filter(created_at__gte=start, created_at__lt=start + timedelta(days=1),
+                        prescriptions__isnull=False)
+                .distinct().order_by('pk').values_list('pk', flat=True))
+
+
+def prerender(visit_ids):
+    """Bring the given visits' documents up to date; returns how many had to be rendered."""
+    rendered = 0
+    for visit_id in visit_ids:
+        key = cache_key(visit_id)
+        if key is not None and not document_path(visit_id, key).exists():
+            render(visit_id, key)
+            rendered += 1
+    return rendered
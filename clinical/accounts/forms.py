@@ -1,6 +1,10 @@
+from decimal import Decimal
+
 from django import forms
 from django.utils import timezone
-from .models import CustomUser, Patient, GENDER_CHOICE, BLOOD_GROUP, STAFF_ROLE_CHOICES,PatientVisit,Prescription
+from .allergies import describe as describe_conflicts, find_conflicts
+from .vitals import parse_blood_pressure
+from .models import CustomUser, Patient, GENDER_CHOICE, BLOOD_GROUP, STAFF_ROLE_CHOICES,PatientVisit,Prescription,WaitlistEntry
 
 class SignUpForm(forms.ModelForm):
     password1 = forms.CharField(label="Password", widget=forms.PasswordInput)
@@ -65,8 +69,16 @@ class StaffCheckInForm(forms.ModelForm):
             "notes": forms.Textarea(attrs={"rows": 3}),
         }
 
+    def clean_blood_pressure(self):
+        val = self.cleaned_data.get("blood_pressure")
+        if val and parse_blood_pressure(val) == (None, None):
+            raise forms.ValidationError("Enter blood pressure as systolic/diastolic, e.g. 120/80.")
+        return val
+
 
 class PrescriptionForm(forms.ModelForm):
+    prescribe_anyway = forms.BooleanField(required=False, label="Prescribe anyway")
+
     class Meta:
         model = Prescription
         fields = ["medicine_name", "dosage", "frequency", "duration_days", "notes"]
@@ -78,12 +90,30 @@ class PrescriptionForm(forms.ModelForm):
             "notes": forms.Textarea(attrs={"rows": 2, "placeholder": "After food / any caution"}),
         }
 
+    def __init__(self, *args, patient=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.patient = patient
+        self.conflict_warning = ""
+
     def clean_duration_days(self):
         val = self.cleaned_data.get("duration_days")
         if val is not None and val <= 0:
             raise forms.ValidationError("Duration must be a positive number of days.")
         return val
-    
+
+    def clean(self):
+        cleaned = super().clean()
+        medicine = cleaned.get("medicine_name")
+        if medicine and self.patient is not None:
+            self.conflict_warning = describe_conflicts(find_conflicts(
+                medicine, self.patient.allergies, self.patient.current_medications))
+            # The pre_save check reuses this instead of running it again
+            self.instance._conflicts = (medicine, self.patient.pk, self.conflict_warning)
+            if self.conflict_warning and not cleaned.get("prescribe_anyway"):
+                raise forms.ValidationError(
+                    f"{self.conflict_warning}. Tick 'Prescribe anyway' to add it regardless.")
+        return cleaned
+
 class VisitSymptomsForm(forms.ModelForm):
     class Meta:
         model = PatientVisit
@@ -93,4 +123,48 @@ class VisitSymptomsForm(forms.ModelForm):
                 "rows": 3,
                 "placeholder": "e.g., fever for 3 days, dry cough, headache…"
             })
-        }
\ No newline at end of file
+        }
+
+class WaitlistForm(forms.ModelForm):
+    any_doctor = forms.BooleanField(required=False, label="Any doctor with this specialization")
+
+    class Meta:
+        model = WaitlistEntry
+        fields = ["doctor", "earliest_date", "latest_date", "earliest_time", "latest_time"]
+        widgets = {
+            "doctor": forms.HiddenInput(),
+            "earliest_date": forms.DateInput(attrs={"type": "date"}),
+            "latest_date": forms.DateInput(attrs={"type": "date"}),
+            "earliest_time": forms.TimeInput(attrs={"type": "time"}),
+            "latest_time": forms.TimeInput(attrs={"type": "time"}),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["doctor"].required = True
+
+    def clean_earliest_date(self):
+        day = self.cleaned_data.get("earliest_date")
+        if day and day < timezone.localdate():
+            raise forms.ValidationError("The waitlist window cannot start in the past.")
+        return day
+
+
+class LedgerEntryForm(forms.Form):
+    """
+    A payment, extra charge or credit posted from the billing desk. The
+    amount is always entered positive; the action decides its sign.
+    """
+    ACTION_CHOICES = (("pay", "Record payment"), ("adjust", "Add charge"), ("credit", "Add credit"))
+
+    amount = forms.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal("0.01"))
+    note = forms.CharField(max_length=200, required=False)
+    action = forms.ChoiceField(choices=ACTION_CHOICES, required=False)
+
+    def entry(self):
+        """(ledger kind, amount for billing.post_entry) for the cleaned form."""
+        amount = self.cleaned_data["amount"]
+        action = self.cleaned_data["action"] or "pay"
+        if action == "pay":
+            return "payment", amount
+        return "adjustment", -amount if action == "credit" else amount
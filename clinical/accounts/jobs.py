@@ -0,0 +1,154 @@
+import csv
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from . import charts, documents, search, stats
+from .archive import archive_appointment_batch, archive_horizon, archive_orphan_visit_batch
+from .models import Appointment, Doctor, Patient
+from .routers import read_from_replica
+from .tasks import register, report
+
+# Jobs runnable through accounts.tasks. Arguments come from Task.args (JSON),
+# so dates arrive as YYYY-MM-DD strings; return values are stored as the
+# task's result.
+
+
+def _day(value, default=None):
+    return date.fromisoformat(value) if value else default
+
+
+@register()
+def rebuild_daily_stats(task, since=None, until=None, doctor_ids=None, window_days=31):
+    bounds = Appointment.objects.aggregate(first=Min('appointment_date'), last=Max('appointment_date'))
+    start, end = _day(since, bounds['first']), _day(until, bounds['last'])
+    if start is None or end is None:
+        return {'rows': 0}
+    windows = (end - start).days // window_days + 1
+    written = 0
+    for i in range(windows):
+        first = start + timedelta(days=i * window_days)
+        last = min(first + timedelta(days=window_days - 1), end)
+        written += stats.rebuild(first, last, doctor_ids)
+        report(task, i + 1, windows, f"through {last}")
+    return {'rows': written, 'since': start.isoformat(), 'until': end.isoformat()}
+
+
+@register()
+def refresh_slot_capacity(task, doctor_ids=None):
+    """Recompute future capacity minutes, e.g. after working hours were edited in bulk."""
+    doctors = Doctor.objects.order_by('pk')
+    if doctor_ids:
+        doctors = doctors.filter(pk__in=doctor_ids)
+    doctors = list(doctors.values_list('pk', flat=True))
+    for i, doctor_id in enumerate(doctors, 1):
+        stats.refresh_future_capacity(doctor_id)
+        report(task, i, len(doctors))
+    return {'doctors': len(doctors)}
+
+
+@register()
+def archive_history(task, batch_size=2000):
+    horizon = archive_horizon()
+    totals = {'appointments': 0, 'visits': 0, 'prescriptions': 0}
+    batches = 0
+    last_id = 0
+    while last_id is not None:
+        last_id, counts = archive_appointment_batch(horizon, last_id, batch_size)
+        for k, v in counts.items():
+            totals[k] += v
+        batches += 1
+        report(task, batches, note=f"{totals['appointments']} appointments moved")
+    last_id = 0
+    while last_id is not None:
+        last_id, (visits, prescriptions) = archive_orphan_visit_batch(horizon, last_id, batch_size)
+        totals['visits'] += visits
+        totals['prescriptions'] += prescriptions
+        batches += 1
+        report(task, batches, note=f"{totals['visits']} visits moved")
+    return dict(totals, horizon=horizon.isoformat())
+
+
+@register()
+def rebuild_chart_summaries(task, batch_size=500):
+    total = Patient.objects.count()
+    done = 0
+    last_id = 0
+    while True:
+        ids = list(Patient.objects.filter(pk__gt=last_id).order_by('pk')
+                   .values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        done += charts.rebuild(ids)
+        last_id = ids[-1]
+        report(task, done, max(total, done))
+    return {'patients': done}
+
+
+@register()
+def index_clinical_text(task, batch_size=5000):
+    indexed = {}
+    for i, source in enumerate(search.SOURCES, 1):
+        indexed[source] = 0
+        last_id = 0
+        while True:
+            last_id, n = search.backfill_batch(source, last_id, batch_size)
+            if last_id is None:
+                break
+            indexed[source] += n
+            report(task, i - 1, len(search.SOURCES), f"{source}: {indexed[source]} added")
+        report(task, i, len(search.SOURCES), f"{source}: {indexed[source]} added")
+    search.optimize()
+    return indexed
+
+
+@register()
+def render_prescriptions(task, day=None, batch_size=50):
+    """The day's printable prescriptions into the document cache; see `manage.py render_prescriptions`."""
+    visit_ids = documents.visits_on(_day(day, timezone.localdate()))
+    rendered = 0
+    for i in range(0, len(visit_ids), batch_size):
+        rendered += documents.prerender(visit_ids[i:i + batch_size])
+        report(task, min(i + batch_size, len(visit_ids)), len(visit_ids))
+    return {'visits': len(visit_ids), 'rendered': rendered}
+
+
+EXPORT_BATCH_SIZE = 5000
+EXPORT_COLUMNS = ['id', 'appointment_date', 'appointment_time', 'status', 'doctor_id',
+                  'doctor__user__first_name', 'doctor__user__last_name', 'patient_id',
+                  'patient__first_name', 'patient__last_name', 'created_at']
+
+
+@register()
+def export_appointments(task, since, until, doctor_ids=None):
+    """Appointments in [since, until] as CSV under EXPORT_DIR, in booking order; the result holds the file's path."""
+    start, end = _day(since), _day(until)
+    rows = Appointment.objects.filter(appointment_date__range=(start, end))
+    if doctor_ids:
+        rows = rows.filter(doctor_id__in=doctor_ids)
+    out_dir = Path(getattr(settings, 'EXPORT_DIR', settings.BASE_DIR / 'exports'))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / f"appointments-{start}-{end}-task{task.pk}.csv"
+    written = 0
+    last_id = 0
+    # The rows come from the replica when there is one; progress still goes
+    # to the primary, as every write does
+    with read_from_replica(), open(path, 'w', newline='') as f:
+        total = rows.count()
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_COLUMNS)
+        # Keyset batches rather than one long cursor: progress writes while a
+        # read is still open could not get SQLite's write lock
+        while True:
+            batch = list(rows.filter(pk__gt=last_id).order_by('pk').values_list(*EXPORT_COLUMNS)[:EXPORT_BATCH_SIZE])
+            if not batch:
+                break
+            writer.writerows(batch)
+            written += len(batch)
+            last_id = batch[-1][0]
+            report(task, written, total)
+    report(task, written, max(total, written))
+    return {'path': str(path), 'rows': written}
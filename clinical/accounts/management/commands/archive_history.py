@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.archive import archive_appointment_batch, archive_horizon, archive_orphan_visit_batch
+
+
+class Command(BaseCommand):
+    help = ('Move appointments, visits and prescriptions older than ARCHIVE_RETENTION_DAYS '
+            'into the archive tables in small, resumable batches')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--max-batches', type=int, default=0, help='Stop after this many batches (0 = no limit)')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches to leave room for live writes')
+
+    def handle(self, *args, **opts):
+        horizon = archive_horizon()
+        self.stdout.write(f"Archiving records dated before {horizon}")
+        batches = 0
+        totals = {'appointments': 0, 'visits': 0, 'prescriptions': 0}
+
+        stopped = False
+        last_id = 0
+        while last_id is not None and not stopped:
+            last_id, counts = archive_appointment_batch(horizon, last_id, opts['batch_size'])
+            for k, v in counts.items():
+                totals[k] += v
+            batches += 1
+            stopped = self.should_stop(batches, opts)
+
+        last_id = 0
+        while last_id is not None and not stopped:
+            last_id, (visits, prescriptions) = archive_orphan_visit_batch(horizon, last_id, opts['batch_size'])
+            totals['visits'] += visits
+            totals['prescriptions'] += prescriptions
+            batches += 1
+            stopped = self.should_stop(batches, opts)
+
+        self.stdout.write(self.style.SUCCESS(
+            'Archived {appointments} appointments, {visits} visits, {prescriptions} prescriptions'.format(**totals)
+            + f" in {batches} batches"
+        ))
+
+    def should_stop(self, batches, opts):
+        if opts['max_batches'] and batches >= opts['max_batches']:
+            self.stdout.write('Batch limit reached; run again to continue.')
+            return True
+        if opts['pause']:
+            time.sleep(opts['pause'])
+        return False
@@ -0,0 +1,50 @@
+import csv
+import sys
+
+from django.core.management.base import BaseCommand
+
+from accounts import allergies
+from accounts.models import ArchivedPrescription, Prescription
+
+
+class Command(BaseCommand):
+    help = ("Check every prescription (hot and archived) against its patient's allergies and current "
+            "medications in one streaming pass, writing conflicts as CSV")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='CSV file for the conflicts (default: stdout)')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--update', action='store_true',
+                            help='Also rewrite stored conflict warnings that are out of date')
+        parser.add_argument('--skip-archived', action='store_true')
+
+    def handle(self, *args, **opts):
+        out = open(opts['output'], 'w', newline='') if opts['output'] else sys.stdout
+        try:
+            writer = csv.writer(out)
+            writer.writerow(['prescription_id', 'archived', 'patient_id', 'doctor_id', 'created_at',
+                             'medicine_name', 'conflict'])
+            models = [Prescription] if opts['skip_archived'] else [Prescription, ArchivedPrescription]
+            checked = conflicts = stale = 0
+            for model in models:
+                archived = model is ArchivedPrescription
+                last_id = 0
+                while True:
+                    last_id, n, found, changed = allergies.audit_batch(
+                        model, last_id, opts['batch_size'], update=opts['update'])
+                    if last_id is None:
+                        break
+                    checked += n
+                    conflicts += len(found)
+                    stale += changed
+                    for pk, patient_id, doctor_id, created_at, medicine, warning in found:
+                        writer.writerow([pk, int(archived), patient_id, doctor_id, created_at.isoformat(),
+                                         medicine, warning])
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+        verb = 'updated' if opts['update'] else 'out of date'
+        self.stderr.write(self.style.SUCCESS(
+            f"Checked {checked} prescriptions: {conflicts} with conflicts, {stale} stored warnings {verb}"
+        ))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import vitals
+
+
+class Command(BaseCommand):
+    help = ('Parse free-text PatientVisit.blood_pressure into bp_systolic/bp_diastolic in batches, '
+            "then refresh every patient's latest reading")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches to leave room for live writes')
+
+    def handle(self, *args, **opts):
+        parsed = skipped = batches = 0
+        last_id = 0
+        while True:
+            last_id, ok, bad = vitals.backfill_batch(last_id, opts['batch_size'])
+            if last_id is None:
+                break
+            parsed += ok
+            skipped += bad
+            batches += 1
+            if opts['pause']:
+                time.sleep(opts['pause'])
+
+        updated = vitals.refresh_latest()
+        self.stdout.write(self.style.SUCCESS(
+            f"Parsed {parsed} readings ({skipped} unparseable) in {batches} batches; "
+            f"refreshed latest vitals for {updated} patients"
+        ))
@@ -0,0 +1,181 @@
+import json
+import statistics
+import time
+import tracemalloc
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.benchmarks import DATASET_SIZES, scratch_database
+from accounts.models import Appointment, CustomUser, Doctor, Patient, Staff
+from accounts.scheduling import compute_slots
+
+
+class Command(BaseCommand):
+    help = ('Benchmark slot computation, booking and dashboards against generated '
+            'SQLite datasets, and compare the results with a stored JSON baseline')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='small,medium', help=f"Comma-separated, from {', '.join(DATASET_SIZES)}")
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=7)
+        parser.add_argument('--baseline', default=str(settings.BASE_DIR / 'benchmarks' / 'baseline.json'))
+        parser.add_argument('--save-baseline', action='store_true', help='Overwrite the baseline with this run')
+        parser.add_argument('--threshold', type=float, default=0.20, help='Allowed relative slowdown before flagging')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **opts):
+        sizes = [s.strip() for s in opts['sizes'].split(',') if s.strip()]
+        unknown = [s for s in sizes if s not in DATASET_SIZES]
+        if unknown:
+            raise CommandError(f"Unknown dataset size(s): {', '.join(unknown)}")
+
+        self.iterations = opts['iterations']
+        results = {}
+        setup_test_environment()
+        try:
+            for size in sizes:
+                self.stdout.write(f"Building '{size}' dataset...")
+                with scratch_database(size, opts['seed']):
+                    results[size] = self.run_suite()
+                self.print_results(size, results[size])
+        finally:
+            teardown_test_environment()
+
+        baseline_path = Path(opts['baseline'])
+        regressions = []
+        if baseline_path.exists():
+            baseline = json.loads(baseline_path.read_text())
+            regressions = self.compare(baseline.get('results', {}), results, opts['threshold'])
+
+        if opts['save_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps({
+                'created': timezone.now().isoformat(),
+                'iterations': self.iterations,
+                'results': results,
+            }, indent=2, sort_keys=True))
+            self.stdout.write(f"Baseline written to {baseline_path}")
+
+        if regressions and opts['fail_on_regression']:
+            raise CommandError(f"{len(regressions)} benchmark regression(s)")
+
+    def measure(self, fn):
+        fn()  # warm caches and lazy imports
+        timings, queries = [], 0
+        for _ in range(self.iterations):
+            with CaptureQueriesContext(connection) as ctx:
+                t0 = time.perf_counter()
+                fn()
+                timings.append((time.perf_counter() - t0) * 1000)
+            queries = max(queries, len(ctx.captured_queries))
+
+        # Memory is measured on a separate run so tracing doesn't skew timings
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        timings.sort()
+        return {
+            'median_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+            'queries': queries,
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    def run_suite(self):
+        today = timezone.localdate()
+        doctor = (Doctor.objects.select_related('user')
+                  .filter(max_daily_appointments=0).order_by('id').first()
+                  or Doctor.objects.select_related('user').order_by('id').first())
+        patient = Patient.objects.select_related('user').order_by('id').first()
+
+        busy_day = (Appointment.objects.filter(doctor=doctor, appointment_date__lte=today)
+                    .order_by('-appointment_date').values_list('appointment_date', flat=True).first()) or today
+        future_days = [today + timedelta(days=i) for i in range(1, 60)]
+
+        staff_user = CustomUser.objects.create_user(username='bench_staff', password='x', role='staff')
+        Staff.objects.create(user=staff_user, staff_role='receptionist')
+
+        results = {}
+        results['compute_slots'] = self.measure(lambda: compute_slots(doctor, busy_day))
+
+        def clean_open_slot():
+            appt = Appointment(doctor=doctor, patient=patient.user, appointment_date=busy_day,
+                               appointment_time=doctor.working_hours.order_by('start_time').first().start_time)
+            try:
+                appt.clean()
+            except ValidationError:
+                pass
+        results['appointment_clean'] = self.measure(clean_open_slot)
+
+        # Every booking iteration takes a fresh free slot, found up front so
+        # slot discovery isn't part of the timing
+        free = []
+        for day in future_days:
+            free.extend((day, s['time_value']) for s in compute_slots(doctor, day)
+                        if not s['booked'] and not s['blocked'])
+            if len(free) > self.iterations + 2:
+                break
+        slots = iter(free)
+        client = Client()
+        client.force_login(patient.user)
+        book_url = reverse('book_appointment')
+
+        def book():
+            day, t = next(slots)
+            client.post(book_url, {'action': 'search', 'doctor_id': doctor.id, 'date': day.isoformat()})
+            resp = client.post(book_url, {'action': 'book', 'doctor_id': doctor.id,
+                                          'date': day.isoformat(), 'time': t})
+            if resp.status_code != 302:
+                raise CommandError('Booking benchmark did not reach the redirect')
+        results['booking_flow'] = self.measure(book)
+
+        results['patient_dashboard'] = self.measure(lambda: client.get(reverse('patient_dashboard')))
+
+        doctor_client = Client()
+        doctor_client.force_login(doctor.user)
+        results['doctor_dashboard'] = self.measure(
+            lambda: doctor_client.get(reverse('doctor_dashboard'), {'date': busy_day.isoformat()}))
+
+        staff_client = Client()
+        staff_client.force_login(staff_user)
+        results['staff_dashboard'] = self.measure(
+            lambda: staff_client.get(reverse('staff_dashboard'), {'date': busy_day.isoformat()}))
+        return results
+
+    def print_results(self, size, results):
+        self.stdout.write(f"\n[{size}]")
+        self.stdout.write(f"  {'case':<20}{'median ms':>12}{'p95 ms':>10}{'queries':>9}{'peak KB':>10}")
+        for case, r in results.items():
+            self.stdout.write(f"  {case:<20}{r['median_ms']:>12.2f}{r['p95_ms']:>10.2f}{r['queries']:>9}{r['peak_kb']:>10.1f}")
+
+    def compare(self, baseline, results, threshold):
+        regressions = []
+        for size, cases in results.items():
+            for case, r in cases.items():
+                base = baseline.get(size, {}).get(case)
+                if not base:
+                    continue
+                for metric in ('median_ms', 'peak_kb'):
+                    if base[metric] and r[metric] > base[metric] * (1 + threshold):
+                        regressions.append((size, case, metric, base[metric], r[metric]))
+                if r['queries'] > base['queries']:
+                    regressions.append((size, case, 'queries', base['queries'], r['queries']))
+
+        if regressions:
+            self.stdout.write(self.style.ERROR(f"\n{len(regressions)} regression(s) against baseline:"))
+            for size, case, metric, old, new in regressions:
+                self.stdout.write(f"  [{size}] {case} {metric}: {old} -> {new}")
+        else:
+            self.stdout.write(self.style.SUCCESS('\nNo regressions against baseline.'))
+        return regressions
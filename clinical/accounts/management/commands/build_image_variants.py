@@ -0,0 +1,29 @@
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import staticfiles
+
+
+class Command(BaseCommand):
+    help = ('Write the downscaled copies of large static images listed in STATIC_IMAGE_VARIANTS next to '
+            'their sources (needs Pillow). Run after replacing one of those images, then commit the results')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quality', type=int, default=80, help='JPEG quality of the copies')
+
+    def handle(self, *args, **opts):
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            raise CommandError('Pillow is required: pip install Pillow')
+
+        for name, widths in getattr(settings, 'STATIC_IMAGE_VARIANTS', {}).items():
+            source = finders.find(name)
+            if source is None:
+                raise CommandError(f"{name} is not in any static directory")
+            original = os.path.getsize(source)
+            for path, size in staticfiles.build_variants(source, widths, opts['quality']):
+                self.stdout.write(f"{path.name}: {size // 1024} KB ({size * 100 // original}% of {name})")
@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.scheduling import close_out
+
+
+class Command(BaseCommand):
+    help = ('Nightly job: mark past pending/confirmed appointments as completed '
+            '(visit recorded) or no_show')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--through', help='Last day to close out, YYYY-MM-DD (default: yesterday)')
+
+    def handle(self, *args, **opts):
+        if opts['through']:
+            try:
+                through = datetime.strptime(opts['through'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--through must be YYYY-MM-DD')
+        else:
+            through = timezone.localdate() - timedelta(days=1)
+        if through >= timezone.localdate():
+            raise CommandError("Only past days can be closed out")
+
+        completed, no_show = close_out(through + timedelta(days=1))
+        self.stdout.write(self.style.SUCCESS(
+            f"Closed out appointments through {through}: {completed} completed, {no_show} no-show"
+        ))
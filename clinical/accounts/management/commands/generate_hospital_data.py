@@ -0,0 +1,379 @@
+import random
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from accounts import charts, search, stats, vitals
+from accounts.charts import course_end
+from accounts.models import (
+    BLOOD_GROUP, Appointment, CustomUser, Doctor, DoctorUnavailability,
+    DoctorWorkingHours, Patient, PatientVisit, Prescription,
+)
+
+SPECIALIZATIONS = [
+    'General Medicine', 'Pediatrics', 'Cardiology', 'Dermatology', 'Orthopedics',
+    'ENT', 'Gynecology', 'Neurology', 'Psychiatry', 'Ophthalmology',
+]
+FIRST_NAMES = [
+    'Aarav', 'Vivaan', 'Aditya', 'Ishaan', 'Arjun', 'Ananya', 'Diya', 'Saanvi', 'Priya', 'Kavya',
+    'Rahul', 'Rohan', 'Karthik', 'Meera', 'Lakshmi', 'Nikhil', 'Sneha', 'Pooja', 'Vikram', 'Neha',
+]
+LAST_NAMES = [
+    'Sharma', 'Verma', 'Iyer', 'Nair', 'Reddy', 'Patel', 'Gupta', 'Menon', 'Rao', 'Das',
+    'Kumar', 'Singh', 'Joshi', 'Pillai', 'Bose',
+]
+CITIES = [('Chennai', 'Tamil Nadu'), ('Bengaluru', 'Karnataka'), ('Kochi', 'Kerala'),
+          ('Mumbai', 'Maharashtra'), ('Hyderabad', 'Telangana'), ('Delhi', 'Delhi')]
+ALLERGIES = ['Penicillin', 'Sulfa drugs', 'Aspirin', 'Ibuprofen', 'Peanuts', 'Dust', 'Pollen', 'Latex']
+CHRONIC = ['Type 2 diabetes', 'Hypertension', 'Asthma', 'Hypothyroidism', 'Migraine']
+SYMPTOMS = ['fever', 'dry cough', 'headache', 'back pain', 'sore throat', 'fatigue',
+            'rash', 'joint pain', 'dizziness', 'chest discomfort', 'abdominal pain']
+MEDICINES = [
+    ('Paracetamol 500 mg', '1 tablet', 'Thrice daily', 5),
+    ('Amoxicillin 500 mg', '1 capsule', 'Thrice daily', 7),
+    ('Cetirizine 10 mg', '1 tablet', 'Once daily', 5),
+    ('Metformin 500 mg', '1 tablet', 'Twice daily', 30),
+    ('Amlodipine 5 mg', '1 tablet', 'Once daily', 30),
+    ('Pantoprazole 40 mg', '1 tablet', 'Before breakfast', 14),
+    ('Azithromycin 500 mg', '1 tablet', 'Once daily', 3),
+    ('Ibuprofen 400 mg', '1 tablet', 'Twice daily', 5),
+    ('Salbutamol inhaler', '2 puffs', 'As needed', 30),
+    ('Vitamin D3 60000 IU', '1 sachet', 'Weekly', 56),
+]
+SHIFTS = [
+    [(time(9, 0), time(13, 0)), (time(14, 0), time(17, 0))],
+    [(time(10, 0), time(14, 0))],
+    [(time(16, 0), time(20, 0))],
+    [(time(8, 30), time(12, 30)), (time(17, 0), time(19, 0))],
+]
+
+
+@contextmanager
+def raw_timestamps(*models):
+    """Let bulk_create keep the created_at/updated_at values we assign."""
+    saved = []
+    for model in models:
+        for name in ('created_at', 'updated_at'):
+            field = model._meta.get_field(name)
+            saved.append((field, field.auto_now, field.auto_now_add))
+            field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = 'Generate a large, deterministic synthetic dataset of doctors, patients and appointment history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=50)
+        parser.add_argument('--patients', type=int, default=20000)
+        parser.add_argument('--years', type=float, default=2.0, help='Years of history before today')
+        parser.add_argument('--future-days', type=int, default=30, help='Days of upcoming bookings after today')
+        parser.add_argument('--fill', type=float, default=0.7, help='Average fraction of slots booked on a working day')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='gen', help='Username prefix for generated accounts')
+        parser.add_argument('--password', default='password123', help='Password set on every generated account')
+
+    def handle(self, *args, **opts):
+        self.rng = random.Random(opts['seed'])
+        self.chunk = opts['chunk_size']
+        self.prefix = opts['prefix']
+        if CustomUser.objects.filter(username__startswith=f"{self.prefix}_").exists():
+            raise CommandError(f"Accounts with prefix '{self.prefix}_' already exist; pick another --prefix")
+
+        self.tz = timezone.get_current_timezone()
+        self.now = timezone.now()
+        # One PBKDF2 run shared by every account instead of one per user
+        self.password_hash = make_password(opts['password'])
+
+        today = timezone.localdate()
+        start = today - timedelta(days=int(opts['years'] * 365))
+        end = today + timedelta(days=opts['future_days'])
+        # Where the generated rows start, for indexing only those
+        first_ids = {source: (model.objects.order_by('-pk').values_list('pk', flat=True).first() or 0)
+                     for source, model in (('patients', Patient), ('visits', PatientVisit),
+                                           ('prescriptions', Prescription))}
+
+        with raw_timestamps(Patient, Doctor, DoctorWorkingHours,
+                            DoctorUnavailability, Appointment, PatientVisit, Prescription):
+            doctors = self.create_doctors(opts['doctors'], start)
+            patients = self.create_patients(opts['patients'], start)
+            self.stdout.write(f"Created {len(doctors)} doctors and {len(patients)} patients")
+
+            totals = self.create_history(doctors, patients, start, today, end, opts['fill'])
+        self.stdout.write(self.style.SUCCESS(
+            'Created {appointments} appointments, {visits} visits, {prescriptions} prescriptions'.format(**totals)
+        ))
+        self.derive(doctors, patients, start, end, first_ids)
+
+    def derive(self, doctors, patients, start, end, first_ids):
+        """
+        bulk_create skips the signals that keep the derived tables current, so
+        build them for the generated rows the way the rebuild/backfill
+        commands do: daily stats, the clinical text index, chart summaries
+        and Patient.last_* readings.
+        """
+        written = stats.rebuild_windows(start, end, [d.pk for d in doctors])
+        self.stdout.write(f"Rebuilt {written} daily stats rows")
+
+        indexed = 0
+        for source, last_id in first_ids.items():
+            while last_id is not None:
+                last_id, n = search.backfill_batch(source, last_id, self.chunk)
+                indexed += n
+        self.stdout.write(f"Indexed {indexed} clinical text rows")
+
+        patient_ids = [p.pk for p in patients]
+        summaries = 0
+        for i in range(0, len(patient_ids), self.chunk):
+            batch = patient_ids[i:i + self.chunk]
+            summaries += charts.rebuild(batch)
+            vitals.refresh_latest(batch)
+        self.stdout.write(f"Rebuilt {summaries} chart summaries and latest vitals")
+
+    def aware(self, day, t):
+        return timezone.make_aware(datetime.combine(day, t), self.tz)
+
+    def make_users(self, role, count):
+        rng = self.rng
+        users = []
+        for i in range(count):
+            users.append(CustomUser(
+                username=f"{self.prefix}_{role}_{i}",
+                first_name=rng.choice(FIRST_NAMES),
+                last_name=rng.choice(LAST_NAMES),
+                email=f"{self.prefix}_{role}_{i}@example.com",
+                password=self.password_hash,
+                role=role,
+            ))
+        created = []
+        for i in range(0, len(users), self.chunk):
+            created.extend(CustomUser.objects.bulk_create(users[i:i + self.chunk]))
+        return created
+
+    @transaction.atomic
+    def create_doctors(self, count, start):
+        rng = self.rng
+        users = self.make_users('doctor', count)
+        stamp = self.aware(start, time(9, 0))
+        doctors = Doctor.objects.bulk_create([
+            Doctor(
+                user=u,
+                specialization=rng.choice(SPECIALIZATIONS),
+                qualification='MBBS, MD',
+                years_of_experience=rng.randint(2, 35),
+                registration_no=f"REG{100000 + i}",
+                consultation_duration_min=rng.choice([10, 15, 15, 15, 20, 30]),
+                max_daily_appointments=rng.choice([0, 0, 0, 20, 30]),
+                consultation_fee=rng.choice([300, 400, 500, 500, 700, 1000]),
+                clinic_location=f"Block {rng.choice('ABCD')}, Room {rng.randint(1, 40)}",
+                created_at=stamp, updated_at=stamp,
+            )
+            for i, u in enumerate(users)
+        ])
+
+        hours = []
+        for d in doctors:
+            shift = rng.choice(SHIFTS)
+            days_off = {6} if rng.random() < 0.7 else {5, 6}
+            d.schedule = {}
+            for wd in range(7):
+                if wd in days_off:
+                    continue
+                d.schedule[wd] = shift
+                for s, e in shift:
+                    hours.append(DoctorWorkingHours(
+                        doctor=d, weekdays=wd, start_time=s, end_time=e,
+                        created_at=stamp, updated_at=stamp,
+                    ))
+        DoctorWorkingHours.objects.bulk_create(hours, batch_size=self.chunk)
+        return doctors
+
+    @transaction.atomic
+    def create_patients(self, count, start):
+        rng = self.rng
+        users = self.make_users('patient', count)
+        today = timezone.localdate()
+        profiles = []
+        for u in users:
+            city, state = rng.choice(CITIES)
+            stamp = self.aware(start + timedelta(days=rng.randint(0, 60)), time(10, 0))
+            age_days = int(rng.triangular(1, 85, 35) * 365)
+            profiles.append(Patient(
+                user=u,
+                gender='O' if rng.random() < 0.01 else rng.choice('MF'),
+                dob=today - timedelta(days=age_days),
+                blood_group=rng.choice(BLOOD_GROUP)[0],
+                address=f"{rng.randint(1, 300)}, {rng.choice(LAST_NAMES)} Street",
+                city=city, state=state,
+                pincode=f"{rng.randint(100000, 999999)}",
+                phone_number=f"9{rng.randint(100000000, 999999999)}",
+                height_cm=round(rng.gauss(162, 10), 1),
+                weight_kg=round(rng.gauss(65, 12), 1),
+                allergies=', '.join(rng.sample(ALLERGIES, rng.choice([0, 0, 0, 1, 2]))) or None,
+                chronic_diseases=', '.join(rng.sample(CHRONIC, rng.choice([0, 0, 0, 1]))) or None,
+                created_at=stamp, updated_at=stamp,
+            ))
+        return Patient.objects.bulk_create(profiles, batch_size=self.chunk)
+
+    def create_history(self, doctors, patients, start, today, end, fill):
+        rng = self.rng
+        # Heavy-tailed visit frequency: a few patients come very often
+        weights = [rng.paretovariate(1.5) for _ in patients]
+        cum, acc = [], 0.0
+        for w in weights:
+            acc += w
+            cum.append(acc)
+
+        totals = {'appointments': 0, 'visits': 0, 'prescriptions': 0}
+        buffer = []
+        unavail = []
+
+        for d in doctors:
+            step = timedelta(minutes=d.consultation_duration_min)
+            slots_by_weekday = {}
+            for wd, shift in d.schedule.items():
+                slots = []
+                for s, e in shift:
+                    cur, stop = datetime.combine(start, s), datetime.combine(start, e)
+                    while cur < stop:
+                        slots.append(cur.time())
+                        cur += step
+                slots_by_weekday[wd] = slots
+
+            day = start
+            while day <= end:
+                slots = slots_by_weekday.get(day.weekday())
+                if not slots:
+                    day += timedelta(days=1)
+                    continue
+
+                # ~2% full days off, ~3% partial blocks
+                r = rng.random()
+                blocked = set()
+                if r < 0.02:
+                    unavail.append(DoctorUnavailability(
+                        doctor=d, date=day, reason='Leave',
+                        created_at=self.aware(day - timedelta(days=14), time(9, 0)),
+                        updated_at=self.aware(day - timedelta(days=14), time(9, 0)),
+                    ))
+                    day += timedelta(days=1)
+                    continue
+                if r < 0.05:
+                    i = rng.randrange(len(slots))
+                    j = min(i + rng.randint(2, 6), len(slots) - 1)
+                    if j > i:
+                        blocked = set(slots[i:j + 1])
+                        unavail.append(DoctorUnavailability(
+                            doctor=d, date=day, start_time=slots[i], end_time=slots[j], reason='Meeting',
+                            created_at=self.aware(day - timedelta(days=3), time(9, 0)),
+                            updated_at=self.aware(day - timedelta(days=3), time(9, 0)),
+                        ))
+
+                open_slots = [t for t in slots if t not in blocked]
+                # Mondays busier, Saturdays lighter
+                day_fill = min(1.0, max(0.0, rng.gauss(fill, 0.15) + (0.1 if day.weekday() == 0 else 0)
+                                        - (0.15 if day.weekday() == 5 else 0)))
+                n = int(len(open_slots) * day_fill)
+                if d.max_daily_appointments:
+                    n = min(n, d.max_daily_appointments)
+                for t in rng.sample(open_slots, n):
+                    buffer.append(self.plan_appointment(d, patients, cum, day, t, today))
+                    # Some slots were canceled and rebooked by someone else
+                    if buffer[-1][0].status == 'canceled' and rng.random() < 0.5:
+                        buffer.append(self.plan_appointment(d, patients, cum, day, t, today, rebook=True))
+
+                if len(buffer) >= self.chunk:
+                    self.flush(buffer, unavail, totals)
+                    buffer, unavail = [], []
+                day += timedelta(days=1)
+
+        self.flush(buffer, unavail, totals)
+        return totals
+
+    def plan_appointment(self, doctor, patients, cum, day, t, today, rebook=False):
+        rng = self.rng
+        patient = patients[self._pick(cum)]
+        lead = min(int(rng.expovariate(1 / 5.0)), 60)
+        booked_at = self.aware(day - timedelta(days=lead), time(rng.randint(7, 21), rng.randint(0, 59)))
+        if booked_at > self.now:
+            booked_at = self.now
+
+        past = day < today
+        if rebook:
+            status = 'completed' if past else 'pending'
+        elif rng.random() < 0.1:
+            status = 'canceled'
+        elif past:
+            status = 'completed' if rng.random() < 0.92 else 'no_show'
+        else:
+            status = 'pending'
+
+        appt = Appointment(
+            doctor=doctor, patient_id=patient.user_id,
+            appointment_date=day, appointment_time=t, status=status,
+            created_at=booked_at, updated_at=booked_at,
+        )
+        return appt, patient, status == 'completed'
+
+    def _pick(self, cum):
+        x = self.rng.random() * cum[-1]
+        lo, hi = 0, len(cum) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if cum[mid] < x:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    @transaction.atomic
+    def flush(self, buffer, unavail, totals):
+        rng = self.rng
+        if unavail:
+            DoctorUnavailability.objects.bulk_create(unavail, batch_size=self.chunk)
+        if not buffer:
+            return
+        Appointment.objects.bulk_create([p[0] for p in buffer], batch_size=self.chunk)
+
+        visits = []
+        for appt, patient, attended in buffer:
+            if not attended:
+                continue
+            seen_at = self.aware(appt.appointment_date, appt.appointment_time) + timedelta(minutes=rng.randint(0, 20))
+            systolic, diastolic = int(rng.gauss(124, 14)), int(rng.gauss(80, 9))
+            visits.append(PatientVisit(
+                patient=patient, doctor=appt.doctor, appointment=appt,
+                height_cm=patient.height_cm,
+                weight_kg=round(float(patient.weight_kg) + rng.gauss(0, 1.5), 1) if patient.weight_kg else None,
+                blood_pressure=f"{systolic}/{diastolic}",
+                bp_systolic=systolic, bp_diastolic=diastolic,
+                sugar_level=round(rng.gauss(105, 20), 1) if rng.random() < 0.4 else None,
+                symptoms=', '.join(rng.sample(SYMPTOMS, rng.randint(1, 3))),
+                created_at=seen_at, updated_at=seen_at,
+            ))
+        PatientVisit.objects.bulk_create(visits, batch_size=self.chunk)
+
+        prescriptions = []
+        for v in visits:
+            for name, dosage, freq, days in rng.sample(MEDICINES, rng.choice([0, 1, 1, 2, 2, 3])):
+                prescriptions.append(Prescription(
+                    visit=v, doctor=v.doctor, patient=v.patient,
+                    medicine_name=name, dosage=dosage, frequency=freq, duration_days=days,
+                    dispense_status='dispensed', dispensed_at=v.created_at,
+                    end_date=course_end(v.created_at, days),
+                    created_at=v.created_at, updated_at=v.created_at,
+                ))
+        Prescription.objects.bulk_create(prescriptions, batch_size=self.chunk)
+
+        totals['appointments'] += len(buffer)
+        totals['visits'] += len(visits)
+        totals['prescriptions'] += len(prescriptions)
@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.billing import generate_invoices
+
+
+class Command(BaseCommand):
+    help = "Invoice the day's visits at each doctor's consultation fee and post the charges to the ledger"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Service date, YYYY-MM-DD (default: today)')
+
+    def handle(self, *args, **opts):
+        try:
+            day = datetime.strptime(opts['date'], '%Y-%m-%d').date() if opts['date'] else timezone.localdate()
+        except ValueError:
+            raise CommandError('--date must be YYYY-MM-DD')
+
+        invoices = generate_invoices(day)
+        total = sum(inv.amount for inv in invoices)
+        self.stdout.write(self.style.SUCCESS(f"Generated {len(invoices)} invoices for {day}, total {total}"))
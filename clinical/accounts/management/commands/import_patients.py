@@ -0,0 +1,108 @@
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from itertools import islice
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import patient_import
+
+
+class Command(BaseCommand):
+    help = ('Import patients from a CSV (one CustomUser + Patient per row). Passwords are hashed across a '
+            'process pool; rows without one get an unusable password and a set-your-password invite link')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV with a header row: ' + ', '.join(
+            ('password',) + patient_import.USER_COLUMNS + patient_import.PATIENT_COLUMNS))
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows validated and inserted per transaction')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes hashing passwords')
+        parser.add_argument('--errors', help='Write rejected rows (line, username, errors) to this CSV')
+        parser.add_argument('--invites', help='Write invite links (username, email, phone, path) to this CSV')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only; nothing is written')
+
+    def handle(self, *args, **opts):
+        started = time.monotonic()
+        self.imported = self.rejected = self.invited = 0
+        errors_out = invites_out = None
+        try:
+            with ExitStack() as stack:
+                if opts['errors']:
+                    errors_out = csv.writer(stack.enter_context(open(opts['errors'], 'w', newline='')))
+                    errors_out.writerow(['line', 'username', 'errors'])
+                if opts['invites']:
+                    invites_out = csv.writer(stack.enter_context(open(opts['invites'], 'w', newline='')))
+                    invites_out.writerow(['username', 'email', 'phone_number', 'path'])
+                f = stack.enter_context(open(opts['path'], newline='', encoding='utf-8-sig'))
+                # A dry run never hashes, so it does not start the workers
+                pool = None if opts['dry_run'] else stack.enter_context(
+                    ProcessPoolExecutor(max_workers=opts['workers'], initializer=django.setup))
+                self._run(csv.DictReader(f), pool, opts, errors_out, invites_out)
+        except OSError as e:
+            raise CommandError(str(e))
+
+        verb = 'Validated' if opts['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {self.imported} patients ({self.invited} invited), rejected {self.rejected} rows "
+            f"in {time.monotonic() - started:.1f}s"
+        ))
+
+    def _run(self, reader, pool, opts, errors_out, invites_out):
+        missing = [c for c in patient_import.REQUIRED_COLUMNS if c not in (reader.fieldnames or [])]
+        if missing:
+            raise CommandError(f"Missing columns: {', '.join(missing)}")
+
+        seen = set()
+        rows = enumerate(reader, start=2)
+        pending = None
+        while True:
+            chunk = list(islice(rows, opts['chunk_size']))
+            job = None
+            if chunk:
+                records, errors = patient_import.validate_chunk(chunk, seen)
+                self._report(errors, errors_out)
+                if records and not opts['dry_run']:
+                    job = (records, self._hash(pool, records, opts['workers']))
+                else:
+                    self.imported += len(records)
+            # Hash this chunk in the pool while the previous one is written
+            if pending is not None:
+                self._write(*pending, invites_out)
+            pending = job
+            if not chunk:
+                break
+
+    def _hash(self, pool, records, workers):
+        lines = [line for line, _, _, password in records if password]
+        passwords = [password for _, _, _, password in records if password]
+        if not passwords:
+            return lines, iter(())
+        # A few pieces per worker keeps them all busy without per-row overhead
+        size = max(1, -(-len(passwords) // (workers * 4)))
+        pieces = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+        return lines, pool.map(patient_import.hash_passwords, pieces)
+
+    def _write(self, records, hashing, invites_out):
+        lines, results = hashing
+        hashes = dict(zip(lines, (h for piece in results for h in piece)))
+        users = patient_import.write_chunk(records, hashes)
+        self.imported += len(users)
+        for (_, _, patient, _), user in zip(records, users):
+            if not user.has_usable_password():
+                self.invited += 1
+                if invites_out:
+                    invites_out.writerow([user.username, user.email, patient['phone_number'],
+                                          patient_import.invite_path(user)])
+
+    def _report(self, errors, errors_out):
+        self.rejected += len(errors)
+        for line, username, message in errors:
+            if errors_out:
+                errors_out.writerow([line, username, message])
+            else:
+                self.stderr.write(f"line {line} ({username}): {message}")
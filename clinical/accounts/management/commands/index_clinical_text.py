@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import search
+from accounts.models import ClinicalText
+
+
+class Command(BaseCommand):
+    help = ('Index visit symptoms/notes, prescription notes and patient allergies/chronic diseases '
+            '(hot and archived) for clinical text search, in batches')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches to leave room for live writes')
+        parser.add_argument('--reset', action='store_true',
+                            help='Drop the whole index first and rebuild it from scratch')
+
+    def handle(self, *args, **opts):
+        if opts['reset']:
+            deleted, _ = ClinicalText.objects.all().delete()
+            self.stdout.write(f"Dropped {deleted} index rows")
+
+        started = time.monotonic()
+        for source in search.SOURCES:
+            added = batches = 0
+            last_id = 0
+            while True:
+                last_id, n = search.backfill_batch(source, last_id, opts['batch_size'])
+                if last_id is None:
+                    break
+                added += n
+                batches += 1
+                if opts['pause']:
+                    time.sleep(opts['pause'])
+            self.stdout.write(f"{source}: {added} rows added in {batches} batches")
+
+        search.optimize()
+        self.stdout.write(self.style.SUCCESS(
+            f"Clinical text index ready ({ClinicalText.objects.count()} rows) in {time.monotonic() - started:.1f}s"
+        ))
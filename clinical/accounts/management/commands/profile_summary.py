@@ -0,0 +1,55 @@
+import json
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Summarize the hottest functions across captured request profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None, help='Profile directory (defaults to PROFILING_DIR)')
+        parser.add_argument('--view', default='', help='Only include captures of this view name')
+        parser.add_argument('--limit', type=int, default=20)
+
+    def handle(self, *args, **opts):
+        out_dir = Path(opts['dir'] or getattr(settings, 'PROFILING_DIR', settings.BASE_DIR / 'profiles'))
+        self_counts, total_counts = Counter(), Counter()
+        captures = total_samples = 0
+        slowest = []
+
+        for folded in sorted(out_dir.glob('*.folded')):
+            meta_path = folded.with_suffix('.json')
+            meta = json.loads(meta_path.read_text()) if meta_path.exists() else {}
+            if opts['view'] and meta.get('view') != opts['view']:
+                continue
+            captures += 1
+            slowest.append((meta.get('elapsed_ms', 0), meta.get('view', '?'), meta.get('query_count', 0)))
+
+            for line in folded.read_text().splitlines():
+                stack, _, n = line.rpartition(' ')
+                if not stack:
+                    continue
+                n = int(n)
+                frames = stack.split(';')
+                total_samples += n
+                self_counts[frames[-1]] += n
+                for f in set(frames):
+                    total_counts[f] += n
+
+        if not captures:
+            self.stdout.write(f"No captures found in {out_dir}")
+            return
+
+        self.stdout.write(f"{captures} captures, {total_samples} samples from {out_dir}\n")
+        self.stdout.write('Top functions by self samples:')
+        for func, n in self_counts.most_common(opts['limit']):
+            self.stdout.write(f"  {100.0 * n / total_samples:6.2f}%  {func}")
+        self.stdout.write('\nTop functions by inclusive samples:')
+        for func, n in total_counts.most_common(opts['limit']):
+            self.stdout.write(f"  {100.0 * n / total_samples:6.2f}%  {func}")
+        self.stdout.write('\nSlowest captures:')
+        for ms, view, nq in sorted(slowest, reverse=True)[:opts['limit']]:
+            self.stdout.write(f"  {ms:10.1f} ms  {nq:4d} queries  {view}")
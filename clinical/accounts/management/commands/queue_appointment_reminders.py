@@ -0,0 +1,26 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts import notifications
+
+
+class Command(BaseCommand):
+    help = ("Nightly job: queue a reminder for each of tomorrow's appointments; "
+            "send_notifications delivers them")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Day whose appointments to remind, YYYY-MM-DD (default: tomorrow)')
+
+    def handle(self, *args, **opts):
+        if opts['date']:
+            try:
+                day = datetime.strptime(opts['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--date must be YYYY-MM-DD')
+        else:
+            day = timezone.localdate() + timedelta(days=1)
+
+        queued = notifications.queue_reminders(day)
+        self.stdout.write(self.style.SUCCESS(f"Queued {queued} reminders for {day}"))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import charts
+from accounts.models import Patient
+
+
+class Command(BaseCommand):
+    help = 'Recompute every PatientChartSummary (visit count, latest vitals, active medications) in patient batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches to leave room for live writes')
+
+    def handle(self, *args, **opts):
+        started = time.monotonic()
+        done = 0
+        last_id = 0
+        while True:
+            ids = list(Patient.objects.filter(pk__gt=last_id).order_by('pk')
+                       .values_list('pk', flat=True)[:opts['batch_size']])
+            if not ids:
+                break
+            done += charts.rebuild(ids)
+            last_id = ids[-1]
+            if opts['pause']:
+                time.sleep(opts['pause'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {done} chart summaries in {time.monotonic() - started:.1f}s"
+        ))
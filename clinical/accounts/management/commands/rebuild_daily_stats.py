@@ -0,0 +1,31 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+
+from accounts import stats
+from accounts.models import Appointment
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the DoctorDailyStats rollup from appointments, visits and prescriptions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='YYYY-MM-DD (default: first appointment)')
+        parser.add_argument('--until', help='YYYY-MM-DD (default: last appointment)')
+        parser.add_argument('--doctor', type=int, action='append', dest='doctors', help='Only this doctor id (repeatable)')
+        parser.add_argument('--window-days', type=int, default=31, help='Days rebuilt per transaction')
+
+    def handle(self, *args, **opts):
+        bounds = Appointment.objects.aggregate(first=Min('appointment_date'), last=Max('appointment_date'))
+        try:
+            start = datetime.strptime(opts['since'], '%Y-%m-%d').date() if opts['since'] else bounds['first']
+            end = datetime.strptime(opts['until'], '%Y-%m-%d').date() if opts['until'] else bounds['last']
+        except ValueError:
+            raise CommandError('Dates must be YYYY-MM-DD')
+        if start is None or end is None:
+            self.stdout.write('No appointments; nothing to rebuild.')
+            return
+
+        written = stats.rebuild_windows(start, end, opts['doctors'], opts['window_days'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} rollup rows for {start} .. {end}"))
@@ -0,0 +1,93 @@
+import multiprocessing
+import os
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.core.management.base import BaseCommand
+
+from accounts import tasks
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks (exports, rollup rebuilds, archival, ...) with a thread or process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2, help='Tasks run at the same time')
+        parser.add_argument('--processes', action='store_true',
+                            help='Run tasks in worker processes instead of threads (for CPU-bound jobs)')
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Seconds between polls of the queue when idle')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when nothing is queued or running instead of polling forever')
+        parser.add_argument('--stale-seconds', type=int, default=tasks.STALE_SECONDS,
+                            help="Requeue running tasks whose worker has not checked in for this long")
+
+    def handle(self, *args, **opts):
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self.opts = opts
+        kind = 'processes' if opts['processes'] else 'threads'
+        self.stdout.write(f"Worker {self.worker}: {opts['concurrency']} {kind}")
+        counts = {'done': 0, 'retrying': 0, 'failed': 0}
+
+        pool = self._pool()
+        running = {}
+        checked_stale = 0.0
+        try:
+            while True:
+                if time.monotonic() - checked_stale >= opts['interval'] * 10:
+                    requeued, failed = tasks.requeue_stale(opts['stale_seconds'])
+                    if requeued or failed:
+                        self.stdout.write(f"Requeued {requeued} and failed {failed} abandoned tasks")
+                    checked_stale = time.monotonic()
+
+                free = opts['concurrency'] - len(running)
+                for task_id in (tasks.claim(self.worker, free) if free else []):
+                    running[pool.submit(tasks.execute, task_id)] = task_id
+
+                if not running:
+                    if opts['once']:
+                        break
+                    time.sleep(opts['interval'])
+                    continue
+
+                finished, _ = wait(running, timeout=opts['interval'], return_when=FIRST_COMPLETED)
+                lost = []
+                for future in finished:
+                    task_id = running.pop(future)
+                    try:
+                        outcome = future.result()
+                    except BrokenProcessPool:
+                        lost.append(task_id)
+                        continue
+                    except Exception as e:
+                        outcome = tasks.record_failure(task_id, repr(e))
+                    self._finished(task_id, outcome, counts)
+                if lost:
+                    # A worker process died mid-task, which takes every task in the pool down with it
+                    lost.extend(running.values())
+                    running.clear()
+                    for task_id in lost:
+                        self._finished(task_id, tasks.record_failure(task_id, 'Worker process died'), counts)
+                    pool.shutdown(wait=False)
+                    pool = self._pool()
+                tasks.heartbeat(self.worker, list(running.values()))
+        finally:
+            pool.shutdown(wait=True)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['done']} done, {counts['retrying']} to retry, {counts['failed']} failed"
+        ))
+
+    def _finished(self, task_id, outcome, counts):
+        counts[outcome] += 1
+        self.stdout.write(f"Task {task_id}: {outcome}")
+
+    def _pool(self):
+        if self.opts['processes']:
+            # spawn, not fork: children must not inherit this process's SQLite handles
+            return ProcessPoolExecutor(max_workers=self.opts['concurrency'], initializer=django.setup,
+                                       mp_context=multiprocessing.get_context('spawn'))
+        return ThreadPoolExecutor(max_workers=self.opts['concurrency'], thread_name_prefix='task')
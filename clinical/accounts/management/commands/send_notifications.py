@@ -0,0 +1,40 @@
+import smtplib
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import notifications
+
+
+class Command(BaseCommand):
+    help = 'Deliver pending notifications from the outbox in batches, one mail connection per batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=notifications.BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running, polling the outbox when it is empty')
+        parser.add_argument('--interval', type=float, default=10.0,
+                            help='Seconds to wait when idle or the mail server is down (with --loop)')
+
+    def handle(self, *args, **opts):
+        totals = [0, 0, 0]
+        while True:
+            try:
+                counts = notifications.deliver_batch(opts['batch_size'])
+            except (smtplib.SMTPException, OSError) as e:
+                if not opts['loop']:
+                    raise CommandError(f"Mail server unavailable: {e}")
+                self.stderr.write(f"Mail server unavailable, retrying in {opts['interval']}s: {e}")
+                time.sleep(opts['interval'])
+                continue
+            totals = [t + c for t, c in zip(totals, counts)]
+            if any(counts):
+                self.stdout.write(f"sent {counts[0]}, failed {counts[1]}, skipped {counts[2]}")
+            if not any(counts):
+                if not opts['loop']:
+                    break
+                time.sleep(opts['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent {totals[0]}, failed {totals[1]}, skipped {totals[2]}"
+        ))
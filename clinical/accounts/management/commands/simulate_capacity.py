@@ -0,0 +1,71 @@
+import os
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import simulation
+from accounts.models import Doctor
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(',') if v.strip()] if value else []
+
+
+class Command(BaseCommand):
+    help = ("Replay a doctor's historical booking demand against schedule variants and "
+            'report fill rate, turn-aways and time to first available slot')
+
+    def add_arguments(self, parser):
+        parser.add_argument('doctor_id', type=int)
+        parser.add_argument('--since', help='YYYY-MM-DD, start of the demand window (default: 180 days ago)')
+        parser.add_argument('--until', help='YYYY-MM-DD, end of the demand window (default: today)')
+        parser.add_argument('--durations', default='', help='Consultation lengths to try, e.g. 10,15,20')
+        parser.add_argument('--extra-weekdays', default='', help='Weekdays (0=Mon) to try adding, e.g. 5,6')
+        parser.add_argument('--extend-minutes', default='', help='Minutes to add to the last block, e.g. 30,60')
+        parser.add_argument('--horizon-days', type=int, default=30, help='How far ahead a patient will accept a slot')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, **opts):
+        try:
+            doctor = Doctor.objects.select_related('user').get(pk=opts['doctor_id'])
+        except Doctor.DoesNotExist:
+            raise CommandError('Doctor not found')
+
+        start, end = simulation.default_window()
+        try:
+            if opts['since']:
+                start = datetime.strptime(opts['since'], '%Y-%m-%d').date()
+            if opts['until']:
+                end = datetime.strptime(opts['until'], '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError('Dates must be YYYY-MM-DD')
+
+        demand = simulation.load_demand(doctor, start, end)
+        if not len(demand['requested']):
+            self.stdout.write('No bookings in this window.')
+            return
+
+        base = simulation.schedule_for(doctor)
+        schedules = [base] + simulation.variants(
+            base,
+            durations=_int_list(opts['durations']),
+            extra_weekdays=_int_list(opts['extra_weekdays']),
+            extend_minutes=_int_list(opts['extend_minutes']),
+        )
+
+        started = time.perf_counter()
+        results = simulation.sweep(demand, schedules, opts['horizon_days'], opts['workers'])
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f"Dr. {doctor}: {len(demand['requested'])} requests, {start} .. {end}, "
+                          f"{len(schedules)} schedules in {elapsed:.2f}s\n")
+        self.stdout.write(f"  {'schedule':<24}{'fill':>7}{'served':>8}{'lost':>6}{'moved':>7}{'full days':>10}{'wait avg':>10}{'p90':>6}{'delay avg':>11}")
+        for r in results:
+            self.stdout.write(
+                f"  {r['name']:<24}{100 * r['fill_rate']:>6.1f}%{r['served']:>8}{r['lost']:>6}"
+                f"{r['moved']:>7}{r['turn_away_days']:>10}"
+                f"{r['mean_wait_days'] if r['mean_wait_days'] is not None else float('nan'):>10.2f}"
+                f"{r['p90_wait_days'] if r['p90_wait_days'] is not None else float('nan'):>6.0f}"
+                f"{r['mean_delay_days'] if r['mean_delay_days'] is not None else float('nan'):>11.2f}"
+            )
@@ -0,0 +1,46 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.routers import REPLICA_ALIAS
+
+
+class Command(BaseCommand):
+    help = ('Refresh the local SQLite replica from the primary database with the '
+            'online backup API; use --interval to keep refreshing it')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Seconds between snapshots; 0 takes a single snapshot')
+        parser.add_argument('--pages', type=int, default=4096,
+                            help='Pages copied per backup step, so writers are not blocked for long')
+
+    def handle(self, *args, **opts):
+        if REPLICA_ALIAS not in settings.DATABASES:
+            raise CommandError(f"No '{REPLICA_ALIAS}' database configured (set REPLICA_ENABLED=1)")
+        primary = settings.DATABASES['default']
+        replica = settings.DATABASES[REPLICA_ALIAS]
+        if 'sqlite3' not in primary['ENGINE'] or 'sqlite3' not in replica['ENGINE']:
+            raise CommandError('snapshot_replica only handles SQLite primaries and replicas')
+
+        while True:
+            started = time.perf_counter()
+            self.snapshot(str(primary['NAME']), str(replica['NAME']), opts['pages'])
+            self.stdout.write(f"Replica refreshed in {(time.perf_counter() - started) * 1000:.0f} ms")
+            if not opts['interval']:
+                break
+            time.sleep(opts['interval'])
+
+    def snapshot(self, src_path, dst_path, pages):
+        src = sqlite3.connect(src_path, timeout=30)
+        dst = sqlite3.connect(dst_path, timeout=30)
+        try:
+            # Readers hold the replica open, so it is overwritten in place; the
+            # backup commits as a single transaction on the destination.
+            src.backup(dst, pages=pages)
+            dst.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            dst.close()
+            src.close()
@@ -0,0 +1,113 @@
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, OperationalError, close_old_connections, connection, connections
+from django.utils import timezone
+
+from accounts.benchmarks import DATASET_SIZES, scratch_database
+from accounts.models import Appointment, CustomUser, Doctor
+from accounts.scheduling import book_slot, compute_slots
+
+
+class Command(BaseCommand):
+    help = ('Measure dashboard read throughput on a scratch SQLite database while '
+            'concurrent bookings run, to check the WAL / IMMEDIATE write profile')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', default='small', choices=list(DATASET_SIZES))
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5.0, help='Length of each phase')
+        parser.add_argument('--seed', type=int, default=7)
+        parser.add_argument('--legacy', action='store_true',
+                            help="Run with Django's default SQLite settings (rollback journal) for comparison")
+
+    def handle(self, *args, **opts):
+        if connection.vendor != 'sqlite':
+            self.stderr.write('This load test only applies to SQLite.')
+            return
+
+        with scratch_database(opts['size'], opts['seed']):
+            if opts['legacy']:
+                connection.close()
+                connection.settings_dict['OPTIONS'] = {'init_command': 'PRAGMA journal_mode=DELETE'}
+                connection.settings_dict['CONN_MAX_AGE'] = 0
+            mode = connection.cursor().execute('PRAGMA journal_mode').fetchone()[0]
+            self.stdout.write(f"journal_mode={mode}, readers={opts['readers']}, writers={opts['writers']}")
+
+            today = timezone.localdate()
+            self.doctors = list(Doctor.objects.select_related('user'))
+            self.patients = list(CustomUser.objects.filter(role='patient').values_list('id', flat=True))
+            self.days = [today - timedelta(days=i) for i in range(0, 30)]
+            self.future = [today + timedelta(days=i) for i in range(1, 45)]
+
+            quiet = self.run_phase(opts['readers'], 0, opts['seconds'])
+            burst = self.run_phase(opts['readers'], opts['writers'], opts['seconds'])
+
+        secs = opts['seconds']
+        quiet_rps = quiet['reads'] / secs
+        burst_rps = burst['reads'] / secs
+        self.stdout.write(f"Reads/s without writers: {quiet_rps:10.1f}")
+        self.stdout.write(f"Reads/s during bookings: {burst_rps:10.1f}  ({100.0 * burst_rps / max(quiet_rps, 1):.0f}% of quiet)")
+        self.stdout.write(f"Bookings/s:              {burst['booked'] / secs:10.1f}")
+        self.stdout.write(f"Slot conflicts:          {burst['conflict']:10d}")
+        self.stdout.write(f"'database is locked':    {quiet['locked'] + burst['locked']:10d}")
+
+    def run_phase(self, readers, writers, seconds):
+        stop = threading.Event()
+        counts = Counter()
+        lock = threading.Lock()
+
+        def worker(fn):
+            local = Counter()
+            try:
+                while not stop.is_set():
+                    try:
+                        local[fn()] += 1
+                    except OperationalError as e:
+                        if 'locked' not in str(e):
+                            raise
+                        local['locked'] += 1
+            finally:
+                close_old_connections()
+                connections.close_all()
+                with lock:
+                    counts.update(local)
+
+        threads = ([threading.Thread(target=worker, args=(self.read_dashboard,)) for _ in range(readers)]
+                   + [threading.Thread(target=worker, args=(self.book,)) for _ in range(writers)])
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        return counts
+
+    def read_dashboard(self):
+        # Same shape as staff_dashboard and the booking page's slot search
+        day = random.choice(self.days)
+        doctor = random.choice(self.doctors)
+        list(Appointment.objects.select_related('doctor__user', 'patient')
+             .filter(appointment_date=day).exclude(status='canceled').order_by('appointment_time'))
+        compute_slots(doctor, day)
+        return 'reads'
+
+    def book(self):
+        doctor = random.choice(self.doctors)
+        day = random.choice(self.future)
+        free = [s['time_value'] for s in compute_slots(doctor, day) if not s['booked'] and not s['blocked']]
+        if not free:
+            return 'full'
+        t = datetime.strptime(random.choice(free), '%H:%M').time()
+        user = CustomUser(pk=random.choice(self.patients))
+        try:
+            book_slot(doctor, user, day, t)
+        except (ValidationError, IntegrityError):
+            return 'conflict'
+        return 'booked'
@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_patientvisit_symptoms'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPatientVisit',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('appointment_id', models.BigIntegerField(blank=True, db_index=True, null=True)),
+                ('height_cm', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('weight_kg', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('blood_pressure', models.CharField(blank=True, max_length=20, null=True)),
+                ('sugar_level', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('symptoms', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_visits', to='accounts.doctor')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_visits', to='accounts.patient')),
+            ],
+            options={
+                'verbose_name': 'Archived Patient Visit',
+                'verbose_name_plural': 'Archived Patient Visits',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedPrescription',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('medicine_name', models.CharField(max_length=200)),
+                ('dosage', models.CharField(blank=True, max_length=100, null=True)),
+                ('frequency', models.CharField(blank=True, max_length=100, null=True)),
+                ('duration_days', models.PositiveIntegerField(blank=True, null=True)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_prescriptions', to='accounts.doctor')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_prescriptions', to='accounts.patient')),
+                ('visit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prescriptions', to='accounts.archivedpatientvisit')),
+            ],
+            options={
+                'verbose_name': 'Archived Prescription',
+                'verbose_name_plural': 'Archived Prescriptions',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedAppointment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('appointment_date', models.DateField()),
+                ('appointment_time', models.TimeField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('canceled', 'Canceled')], max_length=10)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_appointments', to='accounts.doctor')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_appointments', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Archived Appointment',
+                'verbose_name_plural': 'Archived Appointments',
+                'indexes': [models.Index(fields=['patient', 'appointment_date'], name='arch_appt_patient_date'), models.Index(fields=['doctor', 'appointment_date'], name='arch_appt_doctor_date')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedpatientvisit',
+            index=models.Index(fields=['patient', 'created_at'], name='arch_visit_patient_created'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedprescription',
+            index=models.Index(fields=['patient', 'created_at'], name='arch_rx_patient_created'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_archived_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('booked', models.PositiveIntegerField(default=0, help_text='Appointments made for this day, any status')),
+                ('pending', models.PositiveIntegerField(default=0)),
+                ('confirmed', models.PositiveIntegerField(default=0)),
+                ('canceled', models.PositiveIntegerField(default=0)),
+                ('visits', models.PositiveIntegerField(default=0)),
+                ('prescriptions', models.PositiveIntegerField(default=0)),
+                ('capacity_minutes', models.PositiveIntegerField(default=0, help_text='Working minutes left after unavailability')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='accounts.doctor')),
+            ],
+            options={
+                'verbose_name': 'Doctor Daily Stats',
+                'verbose_name_plural': 'Doctor Daily Stats',
+                'indexes': [models.Index(fields=['date'], name='dds_date')],
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'date'), name='uniq_doctor_daily_stats')],
+            },
+        ),
+    ]
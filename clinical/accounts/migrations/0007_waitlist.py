@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_doctor_daily_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('specialization', models.CharField(blank=True, help_text='Used when no doctor is chosen', max_length=120)),
+                ('earliest_date', models.DateField()),
+                ('latest_date', models.DateField()),
+                ('earliest_time', models.TimeField(blank=True, null=True)),
+                ('latest_time', models.TimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('waiting', 'Waiting'), ('offered', 'Offered'), ('withdrawn', 'Withdrawn')], default='waiting', max_length=10)),
+                ('offered_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('appointment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='waitlist_offers', to='accounts.appointment')),
+                ('doctor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='accounts.doctor')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Waitlist Entry',
+                'verbose_name_plural': 'Waitlist Entries',
+                'indexes': [models.Index(condition=models.Q(('doctor__isnull', False), ('status', 'waiting')), fields=['doctor', 'earliest_date'], name='wl_doctor_date'), models.Index(condition=models.Q(('doctor__isnull', True), ('status', 'waiting')), fields=['specialization', 'earliest_date'], name='wl_specialization_date'), models.Index(fields=['patient', 'status'], name='wl_patient_status')],
+                'constraints': [models.CheckConstraint(condition=models.Q(('earliest_date__lte', models.F('latest_date'))), name='wl_window_order'), models.CheckConstraint(condition=models.Q(('doctor__isnull', False), models.Q(('specialization', ''), _negated=True), _connector='OR'), name='wl_doctor_or_specialization')],
+            },
+        ),
+    ]
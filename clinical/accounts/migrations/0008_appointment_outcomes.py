@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_waitlist'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctordailystats',
+            name='completed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='doctordailystats',
+            name='no_show',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='appointment',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('canceled', 'Canceled'), ('completed', 'Completed'), ('no_show', 'No Show')], default='pending', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='archivedappointment',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('canceled', 'Canceled'), ('completed', 'Completed'), ('no_show', 'No Show')], max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status', 'pending'), ('status', 'confirmed'), _connector='OR'), fields=['appointment_date'], name='appt_active_date'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:43
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_appointment_outcomes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorQueue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('last_token', models.PositiveIntegerField(default=0)),
+                ('serving', models.PositiveIntegerField(blank=True, help_text='Token currently with the doctor', null=True)),
+                ('waiting', models.PositiveIntegerField(default=0)),
+                ('served', models.PositiveIntegerField(default=0)),
+                ('avg_consult_seconds', models.PositiveIntegerField(help_text='Moving average of actual consult lengths')),
+                ('consult_started_at', models.DateTimeField(blank=True, null=True)),
+                ('version', models.PositiveIntegerField(default=0, help_text='Bumped on every queue event')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='queues', to='accounts.doctor')),
+            ],
+            options={
+                'verbose_name': 'Doctor Queue',
+                'verbose_name_plural': 'Doctor Queues',
+            },
+        ),
+        migrations.CreateModel(
+            name='QueueToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('walk_in_name', models.CharField(blank=True, max_length=120)),
+                ('status', models.CharField(choices=[('waiting', 'Waiting'), ('in_consult', 'In Consultation'), ('done', 'Done'), ('left', 'Left')], default='waiting', max_length=10)),
+                ('checked_in_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('called_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('appointment', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='queue_token', to='accounts.appointment')),
+                ('patient', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='queue_tokens', to='accounts.patient')),
+                ('queue', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens', to='accounts.doctorqueue')),
+            ],
+            options={
+                'verbose_name': 'Queue Token',
+                'verbose_name_plural': 'Queue Tokens',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='doctorqueue',
+            constraint=models.UniqueConstraint(fields=('doctor', 'date'), name='uniq_doctor_queue_day'),
+        ),
+        migrations.AddIndex(
+            model_name='queuetoken',
+            index=models.Index(condition=models.Q(('status', 'waiting')), fields=['queue', 'number'], name='qt_waiting'),
+        ),
+        migrations.AddConstraint(
+            model_name='queuetoken',
+            constraint=models.UniqueConstraint(fields=('queue', 'number'), name='uniq_queue_token_number'),
+        ),
+    ]
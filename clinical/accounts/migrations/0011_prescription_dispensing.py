@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_token_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedprescription',
+            name='dispense_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('claimed', 'Claimed'), ('dispensed', 'Dispensed')], default='dispensed', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='archivedprescription',
+            name='dispensed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedprescription',
+            name='dispensed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_dispensed_prescriptions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='prescription',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='prescription',
+            name='claimed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='claimed_prescriptions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='prescription',
+            name='dispense_status',
+            # Prescriptions written before dispensing was tracked count as dispensed
+            field=models.CharField(choices=[('pending', 'Pending'), ('claimed', 'Claimed'), ('dispensed', 'Dispensed')], default='dispensed', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='prescription',
+            name='dispense_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('claimed', 'Claimed'), ('dispensed', 'Dispensed')], default='pending', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='prescription',
+            name='dispensed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='prescription',
+            name='dispensed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='dispensed_prescriptions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(condition=models.Q(('dispense_status', 'dispensed'), _negated=True), fields=['visit', 'id'], name='rx_dispense_queue'),
+        ),
+    ]
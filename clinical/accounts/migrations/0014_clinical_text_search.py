@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+FTS_SQL = [
+    # External-content FTS5 index over accounts_clinicaltext. Porter stemming
+    # so "coughing" finds "cough"; diacritics folded.
+    """
+    CREATE VIRTUAL TABLE clinical_text_fts USING fts5(
+        body,
+        scope,
+        content='accounts_clinicaltext',
+        content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+    # Rank on body only; scope tokens are filters, not relevance
+    "INSERT INTO clinical_text_fts(clinical_text_fts, rank) VALUES ('rank', 'bm25(1.0, 0.0)')",
+    """
+    CREATE TRIGGER clinicaltext_fts_insert AFTER INSERT ON accounts_clinicaltext BEGIN
+        INSERT INTO clinical_text_fts(rowid, body, scope) VALUES (new.id, new.body, new.scope);
+    END
+    """,
+    """
+    CREATE TRIGGER clinicaltext_fts_delete AFTER DELETE ON accounts_clinicaltext BEGIN
+        INSERT INTO clinical_text_fts(clinical_text_fts, rowid, body, scope)
+        VALUES ('delete', old.id, old.body, old.scope);
+    END
+    """,
+    """
+    CREATE TRIGGER clinicaltext_fts_update AFTER UPDATE OF body, scope ON accounts_clinicaltext BEGIN
+        INSERT INTO clinical_text_fts(clinical_text_fts, rowid, body, scope)
+        VALUES ('delete', old.id, old.body, old.scope);
+        INSERT INTO clinical_text_fts(rowid, body, scope) VALUES (new.id, new.body, new.scope);
+    END
+    """,
+]
+
+FTS_REVERSE_SQL = [
+    'DROP TRIGGER IF EXISTS clinicaltext_fts_update',
+    'DROP TRIGGER IF EXISTS clinicaltext_fts_delete',
+    'DROP TRIGGER IF EXISTS clinicaltext_fts_insert',
+    'DROP TABLE IF EXISTS clinical_text_fts',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_structured_vitals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClinicalText',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('visit', 'Visit'), ('prescription', 'Prescription'), ('patient', 'Patient record')], max_length=12)),
+                ('object_id', models.BigIntegerField()),
+                ('recorded_at', models.DateTimeField()),
+                ('body', models.TextField()),
+                ('scope', models.CharField(editable=False, max_length=60)),
+                ('doctor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='accounts.doctor')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='accounts.patient')),
+            ],
+            options={
+                'verbose_name': 'Clinical Text',
+                'verbose_name_plural': 'Clinical Texts',
+                'indexes': [models.Index(fields=['doctor', 'recorded_at'], name='clinicaltext_doctor_time'), models.Index(fields=['recorded_at'], name='clinicaltext_time')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='clinicaltext_source')],
+            },
+        ),
+        migrations.RunSQL(FTS_SQL, FTS_REVERSE_SQL),
+    ]
@@ -0,0 +1,130 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:02
+
+from django.db import migrations, models
+
+
+# Starter dictionary: (term, ingredient, class). Maintained in the admin
+# from here on.
+SEED_TERMS = [
+    ('penicillin', '', 'penicillin'),
+    ('penicillins', '', 'penicillin'),
+    ('amoxicillin', 'amoxicillin', 'penicillin'),
+    ('amoxycillin', 'amoxicillin', 'penicillin'),
+    ('amoxil', 'amoxicillin', 'penicillin'),
+    ('augmentin', 'amoxicillin', 'penicillin'),
+    ('ampicillin', 'ampicillin', 'penicillin'),
+    ('cloxacillin', 'cloxacillin', 'penicillin'),
+    ('piperacillin', 'piperacillin', 'penicillin'),
+    ('cephalosporin', '', 'cephalosporin'),
+    ('cephalosporins', '', 'cephalosporin'),
+    ('cephalexin', 'cephalexin', 'cephalosporin'),
+    ('cefuroxime', 'cefuroxime', 'cephalosporin'),
+    ('cefixime', 'cefixime', 'cephalosporin'),
+    ('ceftriaxone', 'ceftriaxone', 'cephalosporin'),
+    ('sulfa', '', 'sulfonamide'),
+    ('sulpha', '', 'sulfonamide'),
+    ('sulfa drugs', '', 'sulfonamide'),
+    ('sulfonamide', '', 'sulfonamide'),
+    ('sulfonamides', '', 'sulfonamide'),
+    ('sulphonamides', '', 'sulfonamide'),
+    ('sulfamethoxazole', 'sulfamethoxazole', 'sulfonamide'),
+    ('cotrimoxazole', 'sulfamethoxazole', 'sulfonamide'),
+    ('co trimoxazole', 'sulfamethoxazole', 'sulfonamide'),
+    ('septran', 'sulfamethoxazole', 'sulfonamide'),
+    ('bactrim', 'sulfamethoxazole', 'sulfonamide'),
+    ('nsaid', '', 'nsaid'),
+    ('nsaids', '', 'nsaid'),
+    ('aspirin', 'aspirin', 'nsaid'),
+    ('acetylsalicylic acid', 'aspirin', 'nsaid'),
+    ('ecosprin', 'aspirin', 'nsaid'),
+    ('disprin', 'aspirin', 'nsaid'),
+    ('ibuprofen', 'ibuprofen', 'nsaid'),
+    ('brufen', 'ibuprofen', 'nsaid'),
+    ('advil', 'ibuprofen', 'nsaid'),
+    ('combiflam', 'ibuprofen', 'nsaid'),
+    ('diclofenac', 'diclofenac', 'nsaid'),
+    ('voveran', 'diclofenac', 'nsaid'),
+    ('naproxen', 'naproxen', 'nsaid'),
+    ('paracetamol', 'paracetamol', ''),
+    ('acetaminophen', 'paracetamol', ''),
+    ('crocin', 'paracetamol', ''),
+    ('dolo', 'paracetamol', ''),
+    ('calpol', 'paracetamol', ''),
+    ('macrolide', '', 'macrolide'),
+    ('macrolides', '', 'macrolide'),
+    ('azithromycin', 'azithromycin', 'macrolide'),
+    ('azithral', 'azithromycin', 'macrolide'),
+    ('zithromax', 'azithromycin', 'macrolide'),
+    ('clarithromycin', 'clarithromycin', 'macrolide'),
+    ('erythromycin', 'erythromycin', 'macrolide'),
+    ('fluoroquinolone', '', 'fluoroquinolone'),
+    ('fluoroquinolones', '', 'fluoroquinolone'),
+    ('quinolones', '', 'fluoroquinolone'),
+    ('ciprofloxacin', 'ciprofloxacin', 'fluoroquinolone'),
+    ('levofloxacin', 'levofloxacin', 'fluoroquinolone'),
+    ('ofloxacin', 'ofloxacin', 'fluoroquinolone'),
+    ('tetracycline', 'tetracycline', 'tetracycline'),
+    ('tetracyclines', '', 'tetracycline'),
+    ('doxycycline', 'doxycycline', 'tetracycline'),
+    ('opioid', '', 'opioid'),
+    ('opioids', '', 'opioid'),
+    ('codeine', 'codeine', 'opioid'),
+    ('tramadol', 'tramadol', 'opioid'),
+    ('morphine', 'morphine', 'opioid'),
+    ('cetirizine', 'cetirizine', 'antihistamine'),
+    ('levocetirizine', 'levocetirizine', 'antihistamine'),
+    ('metformin', 'metformin', 'biguanide'),
+    ('amlodipine', 'amlodipine', 'calcium channel blocker'),
+    ('pantoprazole', 'pantoprazole', 'proton pump inhibitor'),
+    ('omeprazole', 'omeprazole', 'proton pump inhibitor'),
+    ('salbutamol', 'salbutamol', 'beta agonist'),
+    ('albuterol', 'salbutamol', 'beta agonist'),
+    ('atorvastatin', 'atorvastatin', 'statin'),
+    ('lisinopril', 'lisinopril', 'ace inhibitor'),
+    ('enalapril', 'enalapril', 'ace inhibitor'),
+    ('warfarin', 'warfarin', 'anticoagulant'),
+]
+
+
+def seed_terms(apps, schema_editor):
+    DrugTerm = apps.get_model('accounts', 'DrugTerm')
+    DrugTerm.objects.bulk_create(
+        [DrugTerm(term=t, ingredient=i, drug_class=c) for t, i, c in SEED_TERMS],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0014_clinical_text_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedprescription',
+            name='conflict_warning',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='prescription',
+            name='conflict_warning',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.CreateModel(
+            name='DrugTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(help_text='e.g. "amoxicillin", "augmentin", "penicillins"', max_length=100, unique=True)),
+                ('ingredient', models.CharField(blank=True, max_length=100)),
+                ('drug_class', models.CharField(blank=True, max_length=100)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Drug Term',
+                'verbose_name_plural': 'Drug Terms',
+                'constraints': [models.CheckConstraint(condition=models.Q(('drug_class', ''), ('ingredient', ''), _negated=True), name='drugterm_has_concept')],
+            },
+        ),
+        migrations.RunPython(seed_terms, migrations.RunPython.noop),
+    ]
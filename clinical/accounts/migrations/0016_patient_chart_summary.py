@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_drug_conflicts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientChartSummary',
+            fields=[
+                ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='chart', serialize=False, to='accounts.patient')),
+                ('visit_count', models.PositiveIntegerField(default=0, help_text='Hot and archived visits')),
+                ('last_visit_at', models.DateTimeField(blank=True, null=True)),
+                ('vitals_at', models.DateTimeField(blank=True, null=True)),
+                ('height_cm', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('weight_kg', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('blood_pressure', models.CharField(blank=True, max_length=20, null=True)),
+                ('sugar_level', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('active_medications', models.JSONField(blank=True, default=list)),
+                ('allergies', models.TextField(blank=True, null=True)),
+                ('chronic_diseases', models.TextField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('last_doctor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='accounts.doctor')),
+            ],
+            options={
+                'verbose_name': 'Patient Chart Summary',
+                'verbose_name_plural': 'Patient Chart Summaries',
+            },
+        ),
+    ]
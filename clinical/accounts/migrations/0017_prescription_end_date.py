@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0016_patient_chart_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedprescription',
+            name='end_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='prescription',
+            name='end_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(fields=['patient', 'end_date'], name='rx_patient_end'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:20
+
+import accounts.models
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+APPEND_ONLY_SQL = [
+    """
+    CREATE TRIGGER auditentry_no_update BEFORE UPDATE ON accounts_auditentry BEGIN
+        SELECT RAISE(ABORT, 'audit entries are append-only');
+    END
+    """,
+    """
+    CREATE TRIGGER auditentry_no_delete BEFORE DELETE ON accounts_auditentry BEGIN
+        SELECT RAISE(ABORT, 'audit entries are append-only');
+    END
+    """,
+]
+
+APPEND_ONLY_REVERSE_SQL = [
+    'DROP TRIGGER IF EXISTS auditentry_no_delete',
+    'DROP TRIGGER IF EXISTS auditentry_no_update',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0019_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('record_type', models.CharField(choices=[('visit', 'Visit'), ('prescription', 'Prescription')], max_length=12)),
+                ('record_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('create', 'Created'), ('update', 'Updated'), ('delete', 'Deleted')], max_length=6)),
+                ('changes', models.JSONField(encoder=accounts.models.CompactJSONEncoder)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Audit entry',
+                'verbose_name_plural': 'Audit entries',
+                'indexes': [models.Index(fields=['record_type', 'record_id', 'created_at'], name='audit_record'), models.Index(fields=['user', 'created_at'], name='audit_user')],
+            },
+        ),
+        migrations.RunSQL(APPEND_ONLY_SQL, APPEND_ONLY_REVERSE_SQL),
+    ]
@@ -0,0 +1,84 @@
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models import Count, Q
+from django.db.models.functions import Coalesce
+
+STATUSES = ('pending', 'confirmed', 'canceled', 'completed', 'no_show')
+
+
+def _minutes(start, end):
+    return (end.hour * 60 + end.minute) - (start.hour * 60 + start.minute)
+
+
+def backfill_daily_stats(apps, schema_editor):
+    """
+    Add the rollup rows missing for (doctor, day)s with appointments, visits
+    or prescriptions, counted as stats.rebuild() counts them, so incremental
+    maintenance starts from real numbers. Existing rows are kept: they may
+    still count history that has since been archived.
+    """
+    Appointment = apps.get_model('accounts', 'Appointment')
+    PatientVisit = apps.get_model('accounts', 'PatientVisit')
+    Prescription = apps.get_model('accounts', 'Prescription')
+    DoctorWorkingHours = apps.get_model('accounts', 'DoctorWorkingHours')
+    DoctorUnavailability = apps.get_model('accounts', 'DoctorUnavailability')
+    DoctorDailyStats = apps.get_model('accounts', 'DoctorDailyStats')
+
+    rows = defaultdict(lambda: defaultdict(int))
+    counts = {'booked': Count('id')}
+    for status in STATUSES:
+        counts[status] = Count('id', filter=Q(status=status))
+    for r in Appointment.objects.values('doctor_id', 'appointment_date').annotate(**counts):
+        for field in counts:
+            rows[(r['doctor_id'], r['appointment_date'])][field] = r[field]
+    for model, field, appt_path, created_path in (
+        (PatientVisit, 'visits', 'appointment', 'created_at'),
+        (Prescription, 'prescriptions', 'visit__appointment', 'visit__created_at'),
+    ):
+        grouped = (model.objects
+                   .annotate(day=Coalesce(f"{appt_path}__appointment_date", f"{created_path}__date"))
+                   .values('doctor_id', 'day').annotate(n=Count('id')))
+        for r in grouped:
+            rows[(r['doctor_id'], r['day'])][field] = r['n']
+
+    for key in DoctorDailyStats.objects.values_list('doctor_id', 'date'):
+        rows.pop(key, None)
+    if not rows:
+        return
+
+    blocks = defaultdict(list)
+    for doc_id, wd, s, e in (DoctorWorkingHours.objects.filter(is_active=True)
+                             .values_list('doctor_id', 'weekdays', 'start_time', 'end_time')):
+        blocks[(doc_id, wd)].append((s, e))
+    unavail = defaultdict(list)
+    for doc_id, day, s, e in DoctorUnavailability.objects.values_list('doctor_id', 'date', 'start_time', 'end_time'):
+        unavail[(doc_id, day)].append((s, e))
+    for (doc_id, day), values in rows.items():
+        off = unavail.get((doc_id, day), [])
+        if any(s is None and e is None for s, e in off):
+            continue
+        total = 0
+        for bs, be in blocks.get((doc_id, day.weekday()), []):
+            minutes = _minutes(bs, be)
+            for us, ue in off:
+                if us is not None and ue is not None and max(bs, us) < min(be, ue):
+                    minutes -= _minutes(max(bs, us), min(be, ue))
+            total += max(minutes, 0)
+        values['capacity_minutes'] = total
+
+    DoctorDailyStats.objects.bulk_create(
+        [DoctorDailyStats(doctor_id=doc_id, date=day, **values) for (doc_id, day), values in rows.items()],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0020_audit_entry'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
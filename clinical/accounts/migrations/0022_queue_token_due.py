@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:05
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def due_at_arrival(apps, schema_editor):
+    # Existing tokens keep the order they were issued in
+    QueueToken = apps.get_model('accounts', 'QueueToken')
+    QueueToken.objects.update(due_at=F('checked_in_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0021_backfill_daily_stats'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='queuetoken',
+            name='qt_waiting',
+        ),
+        migrations.AddField(
+            model_name='queuetoken',
+            name='due_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='Call order; later of arrival and appointment time'),
+        ),
+        migrations.RunPython(due_at_arrival, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='queuetoken',
+            index=models.Index(condition=models.Q(('status', 'waiting')), fields=['queue', 'due_at', 'number'], name='qt_waiting_due'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+from django.db.models import CharField, DateField, F, Func, Value
+from django.db.models.functions import Cast, Coalesce, Concat, TruncDate
+
+# charts.OPEN_ENDED_DAYS when this was written
+OPEN_ENDED_DAYS = 30
+
+
+def backfill_end_dates(apps, schema_editor):
+    """
+    end_date for rows written before it was maintained, as charts.course_end
+    computes it (local date of created_at plus the course, less a day), in
+    one UPDATE per table.
+    """
+    days = Cast(Coalesce(F('duration_days'), OPEN_ENDED_DAYS) - 1, CharField())
+    # SQLite's date(day, '+N days')
+    end_date = Func(TruncDate('created_at'), Concat(Value('+'), days, Value(' days')),
+                    function='DATE', output_field=DateField())
+    for name in ('Prescription', 'ArchivedPrescription'):
+        apps.get_model('accounts', name).objects.filter(end_date__isnull=True).update(end_date=end_date)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0023_archive_references'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_end_dates, migrations.RunPython.noop),
+    ]
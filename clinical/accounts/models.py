@@ -5,6 +5,7 @@ from django.core.validators import RegexValidator,MinValueValidator,MaxValueVali
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.db.models import Q,F
+from django.core.serializers.json import DjangoJSONEncoder
 
 class CustomUser(AbstractUser):
     Role_Choice=(
@@ -61,12 +62,25 @@ class Patient(models.Model):
     chronic_diseases = models.TextField(blank=True, null=True)
     current_medications = models.TextField(blank=True, null=True)
 
+    # Latest structured blood pressure, copied from the newest visit that has
+    # one, so cohort filters hit an index instead of scanning visit text
+    last_systolic = models.PositiveSmallIntegerField(blank=True, null=True)
+    last_diastolic = models.PositiveSmallIntegerField(blank=True, null=True)
+    last_vitals_at = models.DateTimeField(blank=True, null=True)
+
+    # Running total of the billing ledger, kept in step by accounts.billing
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text='Amount the patient owes')
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = 'Patient'
         verbose_name_plural = 'Patients'
+        indexes = [
+            models.Index(fields=['last_systolic'], name='patient_last_systolic'),
+            models.Index(fields=['last_diastolic'], name='patient_last_diastolic'),
+        ]
 
     def clean(self):
         if self.dob and self.dob > timezone.localdate():
@@ -113,6 +127,7 @@ class Doctor(models.Model):
     registration_no = models.CharField(max_length=60, blank=True)
     consultation_duration_min = models.PositiveSmallIntegerField(default=15, validators=[MinValueValidator(5), MaxValueValidator(120)], help_text='Minutes per appointment')
     max_daily_appointments = models.PositiveSmallIntegerField(default=0,)
+    consultation_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0, validators=[MinValueValidator(0)])
     clinic_location = models.CharField(max_length=120, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
@@ -191,6 +206,13 @@ class DoctorUnavailability(models.Model):
             return f"{self.doctor} {self.date} {self.start_time} {self.end_time}"
         return f"{self.doctor} {self.date}"
 
+# Appointment statuses that still hold their slot; past days are moved to
+# completed / no_show by `manage.py close_out_appointments`
+ACTIVE_APPOINTMENT_STATUSES = ('pending', 'confirmed')
+# The same as a filter. Spelled as an OR rather than IN: SQLite only matches a
+# partial index against parameterized queries when each term is an equality
+ACTIVE_APPOINTMENT = Q(*[('status', s) for s in ACTIVE_APPOINTMENT_STATUSES], _connector=Q.OR)
+
 class Appointment(models.Model):
     doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='appointments')
     patient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='appointments')
@@ -202,7 +224,10 @@ class Appointment(models.Model):
         ('pending','Pending'),
         ('confirmed','Confirmed'),
         ('canceled','Canceled'),
+        ('completed','Completed'),
+        ('no_show','No Show'),
     )
+    ACTIVE_STATUSES = ACTIVE_APPOINTMENT_STATUSES
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     
     notes = models.TextField(blank=True, null=True)
@@ -220,6 +245,9 @@ class Appointment(models.Model):
                 name='uniq_active_appointment_per_slot',
             ),
         ]
+        indexes = [
+            models.Index(fields=['appointment_date'], name='appt_active_date', condition=ACTIVE_APPOINTMENT),
+        ]
 
     def __str__(self):
         return f"Appointment {self.id} with Dr. {self.doctor} on {self.appointment_date} at {self.appointment_time}"
@@ -261,6 +289,9 @@ class PatientVisit(models.Model):
     height_cm = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
     weight_kg = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
     blood_pressure = models.CharField(max_length=20, blank=True, null=True)
+    # Parsed from blood_pressure on save, see accounts.vitals
+    bp_systolic = models.PositiveSmallIntegerField(blank=True, null=True)
+    bp_diastolic = models.PositiveSmallIntegerField(blank=True, null=True)
     sugar_level = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
     notes = models.TextField(blank=True, null=True)
     symptoms = models.TextField(blank=True, null=True)
@@ -287,12 +318,595 @@ class Prescription(models.Model):
     duration_days = models.PositiveIntegerField(blank=True, null=True)
     notes = models.TextField(blank=True, null=True)
 
+    DISPENSE_STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('claimed', 'Claimed'),
+        ('dispensed', 'Dispensed'),
+    )
+    dispense_status = models.CharField(max_length=10, choices=DISPENSE_STATUS_CHOICES, default='pending')
+    claimed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True, related_name='claimed_prescriptions')
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    dispensed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True, related_name='dispensed_prescriptions')
+    dispensed_at = models.DateTimeField(blank=True, null=True)
+    # Allergy / duplicate-therapy conflicts found when saved, see accounts.allergies
+    conflict_warning = models.CharField(max_length=255, blank=True, default='')
+    # Last day of the course, set on save from created_at and duration_days
+    # (see accounts.charts.course_end) so active medications are a range scan
+    end_date = models.DateField(blank=True, null=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = 'Prescription'
         verbose_name_plural = 'Prescriptions'
+        # Only undispensed rows are indexed, so the pharmacy queue only ever
+        # reads the open prescriptions however much history piles up.
+        indexes = [
+            models.Index(fields=['visit', 'id'], name='rx_dispense_queue',
+                         condition=~Q(dispense_status='dispensed')),
+            models.Index(fields=['patient', 'end_date'], name='rx_patient_end'),
+        ]
 
     def __str__(self):
         return f"{self.medicine_name} for {self.patient} by {self.doctor}"
+
+
+# Archive tables: rows moved out of Appointment / PatientVisit / Prescription by
+# `manage.py archive_history`. They keep their original ids so archived
+# visits and prescriptions still point at each other.
+
+class ArchivedAppointment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='archived_appointments')
+    patient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='archived_appointments')
+
+    appointment_date = models.DateField()
+    appointment_time = models.TimeField()
+    status = models.CharField(max_length=10, choices=Appointment.STATUS_CHOICES)
+    notes = models.TextField(blank=True, null=True)
+
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Archived Appointment'
+        verbose_name_plural = 'Archived Appointments'
+        indexes = [
+            models.Index(fields=['patient', 'appointment_date'], name='arch_appt_patient_date'),
+            models.Index(fields=['doctor', 'appointment_date'], name='arch_appt_doctor_date'),
+        ]
+
+    def __str__(self):
+        return f"Archived appointment {self.id} with Dr. {self.doctor} on {self.appointment_date}"
+
+class ArchivedPatientVisit(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='archived_visits')
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='archived_visits')
+    appointment_id = models.BigIntegerField(blank=True, null=True, db_index=True)
+
+    height_cm = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
+    weight_kg = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
+    blood_pressure = models.CharField(max_length=20, blank=True, null=True)
+    bp_systolic = models.PositiveSmallIntegerField(blank=True, null=True)
+    bp_diastolic = models.PositiveSmallIntegerField(blank=True, null=True)
+    sugar_level = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
+    notes = models.TextField(blank=True, null=True)
+    symptoms = models.TextField(blank=True, null=True)
+
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Archived Patient Visit'
+        verbose_name_plural = 'Archived Patient Visits'
+        indexes = [
+            models.Index(fields=['patient', 'created_at'], name='arch_visit_patient_created'),
+        ]
+
+    def __str__(self):
+        return f"Archived visit {self.id} {self.patient} by {self.doctor} on {self.created_at.date()}"
+
+class ArchivedPrescription(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    visit = models.ForeignKey(ArchivedPatientVisit, on_delete=models.CASCADE, related_name='prescriptions')
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='archived_prescriptions')
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='archived_prescriptions')
+
+    medicine_name = models.CharField(max_length=200)
+    dosage = models.CharField(max_length=100, blank=True, null=True)
+    frequency = models.CharField(max_length=100, blank=True, null=True)
+    duration_days = models.PositiveIntegerField(blank=True, null=True)
+    notes = models.TextField(blank=True, null=True)
+    dispense_status = models.CharField(max_length=10, choices=Prescription.DISPENSE_STATUS_CHOICES, default='dispensed')
+    claimed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True, related_name='archived_claimed_prescriptions')
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    dispensed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True, related_name='archived_dispensed_prescriptions')
+    dispensed_at = models.DateTimeField(blank=True, null=True)
+    conflict_warning = models.CharField(max_length=255, blank=True, default='')
+    end_date = models.DateField(blank=True, null=True)
+
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Archived Prescription'
+        verbose_name_plural = 'Archived Prescriptions'
+        indexes = [
+            models.Index(fields=['patient', 'created_at'], name='arch_rx_patient_created'),
+        ]
+
+    def __str__(self):
+        return f"Archived {self.medicine_name} for {self.patient} by {self.doctor}"
+
+# Per-doctor, per-day rollup kept current by accounts.signals and rebuilt with
+# `manage.py rebuild_daily_stats`. Reports read these rows instead of scanning
+# Appointment.
+
+class DoctorDailyStats(models.Model):
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+
+    booked = models.PositiveIntegerField(default=0, help_text='Appointments made for this day, any status')
+    pending = models.PositiveIntegerField(default=0)
+    confirmed = models.PositiveIntegerField(default=0)
+    canceled = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    no_show = models.PositiveIntegerField(default=0)
+    visits = models.PositiveIntegerField(default=0)
+    prescriptions = models.PositiveIntegerField(default=0)
+    capacity_minutes = models.PositiveIntegerField(default=0, help_text='Working minutes left after unavailability')
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Doctor Daily Stats'
+        verbose_name_plural = 'Doctor Daily Stats'
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'date'], name='uniq_doctor_daily_stats'),
+        ]
+        indexes = [
+            models.Index(fields=['date'], name='dds_date'),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor} {self.date}"
+
+# Waitlist: patients asking for a slot with a doctor (or any doctor of a
+# specialization) inside a date window. Cancellations offer the freed slot to
+# the best waiting entry, see accounts.waitlist.
+
+WAITLIST_MAX_WINDOW_DAYS = 30
+
+class WaitlistEntry(models.Model):
+    patient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='waitlist_entries')
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='waitlist_entries', blank=True, null=True)
+    specialization = models.CharField(max_length=120, blank=True, help_text='Used when no doctor is chosen')
+
+    earliest_date = models.DateField()
+    latest_date = models.DateField()
+    earliest_time = models.TimeField(blank=True, null=True)
+    latest_time = models.TimeField(blank=True, null=True)
+
+    STATUS_CHOICES = (
+        ('waiting', 'Waiting'),
+        ('offered', 'Offered'),
+        ('withdrawn', 'Withdrawn'),
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='waiting')
+    appointment = models.ForeignKey(Appointment, on_delete=models.SET_NULL, blank=True, null=True, related_name='waitlist_offers')
+    archived_appointment_id = models.BigIntegerField(blank=True, null=True, editable=False)
+    offered_at = models.DateTimeField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Waitlist Entry'
+        verbose_name_plural = 'Waitlist Entries'
+        constraints = [
+            models.CheckConstraint(
+                name='wl_window_order',
+                check=Q(earliest_date__lte=F('latest_date'))
+            ),
+            models.CheckConstraint(
+                name='wl_doctor_or_specialization',
+                check=Q(doctor__isnull=False) | ~Q(specialization='')
+            ),
+        ]
+        # Partial indexes: only waiting entries are ever matched, so offered
+        # and withdrawn rows do not grow them.
+        indexes = [
+            models.Index(fields=['doctor', 'earliest_date'], name='wl_doctor_date',
+                         condition=Q(status='waiting', doctor__isnull=False)),
+            models.Index(fields=['specialization', 'earliest_date'], name='wl_specialization_date',
+                         condition=Q(status='waiting', doctor__isnull=True)),
+            models.Index(fields=['patient', 'status'], name='wl_patient_status'),
+        ]
+
+    def clean(self):
+        if self.earliest_date and self.latest_date:
+            if self.earliest_date > self.latest_date:
+                raise ValidationError('The waitlist window must end on or after its start')
+            if (self.latest_date - self.earliest_date).days >= WAITLIST_MAX_WINDOW_DAYS:
+                raise ValidationError(f'The waitlist window can be at most {WAITLIST_MAX_WINDOW_DAYS} days')
+        if self.earliest_time and self.latest_time and self.earliest_time > self.latest_time:
+            raise ValidationError('The earliest time must be before the latest time')
+        if not self.doctor_id and not self.specialization:
+            raise ValidationError('Choose a doctor or a specialization')
+
+    def __str__(self):
+        target = self.doctor or self.specialization
+        return f"Waitlist {self.id} {self.patient} for {target} {self.earliest_date}..{self.latest_date}"
+
+# Front-desk token queue, one per doctor per day. Scheduled patients get a
+# token when staff check them in, walk-ins when they arrive. Tokens are called
+# in due_at order: arrival time for walk-ins, the appointment time for
+# scheduled patients who arrive early. DoctorQueue holds running counters so
+# every event is a constant-size update, see accounts.queues.
+
+class DoctorQueue(models.Model):
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='queues')
+    date = models.DateField()
+
+    last_token = models.PositiveIntegerField(default=0)
+    serving = models.PositiveIntegerField(blank=True, null=True, help_text='Token currently with the doctor')
+    waiting = models.PositiveIntegerField(default=0)
+    served = models.PositiveIntegerField(default=0)
+    avg_consult_seconds = models.PositiveIntegerField(help_text='Moving average of actual consult lengths')
+    consult_started_at = models.DateTimeField(blank=True, null=True)
+    version = models.PositiveIntegerField(default=0, help_text='Bumped on every queue event')
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Doctor Queue'
+        verbose_name_plural = 'Doctor Queues'
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'date'], name='uniq_doctor_queue_day'),
+        ]
+
+    def __str__(self):
+        return f"Queue {self.doctor} {self.date}"
+
+class QueueToken(models.Model):
+    queue = models.ForeignKey(DoctorQueue, on_delete=models.CASCADE, related_name='tokens')
+    number = models.PositiveIntegerField()
+    appointment = models.OneToOneField(Appointment, on_delete=models.SET_NULL, blank=True, null=True, related_name='queue_token')
+    archived_appointment_id = models.BigIntegerField(blank=True, null=True, editable=False)
+    patient = models.ForeignKey(Patient, on_delete=models.SET_NULL, blank=True, null=True, related_name='queue_tokens')
+    walk_in_name = models.CharField(max_length=120, blank=True)
+
+    STATUS_CHOICES = (
+        ('waiting', 'Waiting'),
+        ('in_consult', 'In Consultation'),
+        ('done', 'Done'),
+        ('left', 'Left'),
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='waiting')
+    checked_in_at = models.DateTimeField(default=timezone.now)
+    due_at = models.DateTimeField(default=timezone.now, help_text='Call order; later of arrival and appointment time')
+    called_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = 'Queue Token'
+        verbose_name_plural = 'Queue Tokens'
+        constraints = [
+            models.UniqueConstraint(fields=['queue', 'number'], name='uniq_queue_token_number'),
+        ]
+        indexes = [
+            models.Index(fields=['queue', 'due_at', 'number'], name='qt_waiting_due',
+                         condition=Q(status='waiting')),
+        ]
+
+    @property
+    def display_name(self):
+        if self.patient_id:
+            return str(self.patient)
+        return self.walk_in_name or f"Token {self.number}"
+
+    def __str__(self):
+        return f"Token {self.number} {self.queue}"
+
+# Billing: one invoice per visit, and a ledger of charges and payments per
+# patient. Patient.balance is the ledger's running total, so balance lookups
+# never sum the ledger.
+
+class Invoice(models.Model):
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='invoices')
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='invoices')
+    visit = models.OneToOneField(PatientVisit, on_delete=models.SET_NULL, blank=True, null=True, related_name='invoice')
+    appointment = models.ForeignKey(Appointment, on_delete=models.SET_NULL, blank=True, null=True, related_name='invoices')
+    # Set when the visit / appointment moves to the archive tables
+    archived_visit_id = models.BigIntegerField(blank=True, null=True, editable=False)
+    archived_appointment_id = models.BigIntegerField(blank=True, null=True, editable=False)
+
+    service_date = models.DateField()
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+
+    STATUS_CHOICES = (
+        ('open', 'Open'),
+        ('paid', 'Paid'),
+        ('void', 'Void'),
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='open')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Invoice'
+        verbose_name_plural = 'Invoices'
+        indexes = [
+            models.Index(fields=['patient', 'status'], name='invoice_patient_status'),
+            models.Index(fields=['service_date'], name='invoice_service_date'),
+        ]
+
+    def __str__(self):
+        return f"Invoice {self.id} {self.patient} {self.amount}"
+
+class LedgerEntry(models.Model):
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='ledger')
+    invoice = models.ForeignKey(Invoice, on_delete=models.SET_NULL, blank=True, null=True, related_name='ledger_entries')
+
+    KIND_CHOICES = (
+        ('charge', 'Charge'),
+        ('payment', 'Payment'),
+        ('adjustment', 'Adjustment'),
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, help_text='Positive adds to what the patient owes')
+    balance_after = models.DecimalField(max_digits=12, decimal_places=2)
+    note = models.CharField(max_length=200, blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True, related_name='ledger_entries')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Ledger Entry'
+        verbose_name_plural = 'Ledger Entries'
+        indexes = [
+            models.Index(fields=['patient', 'created_at'], name='ledger_patient_created'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.amount} for {self.patient}"
+
+# Clinical text search: one row per searchable record (visit symptoms/notes,
+# prescription notes, patient allergies/chronic diseases), kept in step by
+# accounts.signals. The FTS5 table clinical_text_fts indexes `body` and
+# `scope` as external content and is maintained by SQLite triggers on this
+# table, see accounts.search and migration 0014.
+
+class ClinicalText(models.Model):
+    KIND_CHOICES = (
+        ('visit', 'Visit'),
+        ('prescription', 'Prescription'),
+        ('patient', 'Patient record'),
+    )
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES)
+    # Id of the visit / prescription / patient; archived rows keep their id
+    object_id = models.BigIntegerField()
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='+')
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, blank=True, null=True, related_name='+')
+    recorded_at = models.DateTimeField()
+    body = models.TextField()
+    # Filter tokens indexed next to body ("kvisit d12 m202603"), so doctor,
+    # month and kind filters are resolved inside the FTS index
+    scope = models.CharField(max_length=60, editable=False)
+
+    class Meta:
+        verbose_name = 'Clinical Text'
+        verbose_name_plural = 'Clinical Texts'
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='clinicaltext_source'),
+        ]
+        indexes = [
+            models.Index(fields=['doctor', 'recorded_at'], name='clinicaltext_doctor_time'),
+            models.Index(fields=['recorded_at'], name='clinicaltext_time'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.object_id} for {self.patient}"
+
+# Drug dictionary for the prescription conflict check in accounts.allergies.
+# Each term is a word or phrase as it appears in medicine names, allergy
+# notes or current medications (ingredient, brand or class name), with the
+# ingredient and/or class it stands for.
+
+class DrugTerm(models.Model):
+    term = models.CharField(max_length=100, unique=True, help_text='e.g. "amoxicillin", "augmentin", "penicillins"')
+    ingredient = models.CharField(max_length=100, blank=True)
+    drug_class = models.CharField(max_length=100, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Drug Term'
+        verbose_name_plural = 'Drug Terms'
+        constraints = [
+            models.CheckConstraint(check=~Q(ingredient='', drug_class=''), name='drugterm_has_concept'),
+        ]
+
+    def __str__(self):
+        return self.term
+
+# Materialized chart for the consult screen: one row per patient with the
+# latest vitals, active medications, allergy/chronic notes and visit count,
+# kept current by accounts.signals (see accounts.charts) and rebuilt with
+# `manage.py rebuild_chart_summaries`.
+
+class PatientChartSummary(models.Model):
+    patient = models.OneToOneField(Patient, on_delete=models.CASCADE, primary_key=True, related_name='chart')
+
+    visit_count = models.PositiveIntegerField(default=0, help_text='Hot and archived visits')
+    last_visit_at = models.DateTimeField(blank=True, null=True)
+    last_doctor = models.ForeignKey(Doctor, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+
+    # From the most recent visit that recorded any vitals
+    vitals_at = models.DateTimeField(blank=True, null=True)
+    height_cm = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
+    weight_kg = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
+    blood_pressure = models.CharField(max_length=20, blank=True, null=True)
+    sugar_level = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
+
+    # [{"id", "medicine_name", "dosage", "frequency", "until": "YYYY-MM-DD"}],
+    # courses that had not ended when the row was last refreshed
+    active_medications = models.JSONField(default=list, blank=True)
+    allergies = models.TextField(blank=True, null=True)
+    chronic_diseases = models.TextField(blank=True, null=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Patient Chart Summary'
+        verbose_name_plural = 'Patient Chart Summaries'
+
+    def __str__(self):
+        return f"Chart for {self.patient}"
+
+# Notification outbox: rows are written in the same transaction as the
+# booking / cancellation / check-in they announce and delivered later by
+# `manage.py send_notifications`, so requests never wait on email.
+
+class Notification(models.Model):
+    KIND_CHOICES = (
+        ('booked', 'Appointment booked'),
+        ('canceled', 'Appointment canceled'),
+        ('checked_in', 'Checked in'),
+        ('offered', 'Waitlist slot offered'),
+        ('reminder', 'Appointment reminder'),
+    )
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES)
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notifications')
+    appointment = models.ForeignKey(Appointment, on_delete=models.SET_NULL, blank=True, null=True, related_name='notifications')
+    archived_appointment_id = models.BigIntegerField(blank=True, null=True, editable=False)
+
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+        ('skipped', 'Skipped'),
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.CharField(max_length=255, blank=True)
+    # Not tried before this; pushed back after a failed attempt
+    available_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Notification'
+        verbose_name_plural = 'Notifications'
+        constraints = [
+            # Makes the nightly reminder batch safe to re-run
+            models.UniqueConstraint(fields=['appointment'], condition=Q(kind='reminder'),
+                                    name='notification_one_reminder'),
+        ]
+        # Only undelivered rows are indexed, so draining never walks history
+        indexes = [
+            models.Index(fields=['available_at', 'id'], name='notification_due',
+                         condition=Q(status='pending')),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} to {self.recipient} ({self.status})"
+
+# Background tasks: a queue of jobs run by `manage.py run_tasks` off the
+# request path. Workers claim rows with one UPDATE, see accounts.tasks; the
+# jobs themselves are registered in accounts.jobs.
+
+class Task(models.Model):
+    name = models.CharField(max_length=100)
+    args = models.JSONField(default=dict, blank=True, help_text='Keyword arguments for the job')
+
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    # Not started before this; pushed back after a failed attempt
+    run_after = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+
+    worker = models.CharField(max_length=100, blank=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    # Set on claim, by the worker's heartbeats and on every progress write;
+    # a running task that goes quiet is requeued
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    progress_done = models.PositiveIntegerField(default=0)
+    progress_total = models.PositiveIntegerField(blank=True, null=True)
+    progress_note = models.CharField(max_length=200, blank=True)
+    result = models.JSONField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True, related_name='tasks')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Task'
+        verbose_name_plural = 'Tasks'
+        indexes = [
+            models.Index(fields=['run_after', 'id'], name='task_due', condition=Q(status='queued')),
+            models.Index(fields=['heartbeat_at'], name='task_running', condition=Q(status='running')),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
+
+# Audit trail: field-level history of medical records, written by the signal
+# handlers in accounts.signals through accounts.audit. Rows are never updated
+# or deleted (the migration adds triggers refusing both).
+
+class CompactJSONEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder without the spaces after ',' and ':'."""
+
+    def __init__(self, *args, **kwargs):
+        kwargs['separators'] = (',', ':')
+        super().__init__(*args, **kwargs)
+
+
+class AuditEntry(models.Model):
+    RECORD_CHOICES = (
+        ('visit', 'Visit'),
+        ('prescription', 'Prescription'),
+    )
+    record_type = models.CharField(max_length=12, choices=RECORD_CHOICES)
+    record_id = models.BigIntegerField()
+
+    ACTION_CHOICES = (
+        ('create', 'Created'),
+        ('update', 'Updated'),
+        ('delete', 'Deleted'),
+    )
+    action = models.CharField(max_length=6, choices=ACTION_CHOICES)
+    # Kept as a bare id: deleting a user must neither touch nor lose their entries
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False,
+                             blank=True, null=True, related_name='+')
+    # {field: [old, new]} for updates, {field: value} for creates and deletes
+    changes = models.JSONField(encoder=CompactJSONEncoder)
+    # When the change was made, not when its entry was written
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Audit entry'
+        verbose_name_plural = 'Audit entries'
+        indexes = [
+            models.Index(fields=['record_type', 'record_id', 'created_at'], name='audit_record'),
+            models.Index(fields=['user', 'created_at'], name='audit_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_record_type_display()} {self.record_id} {self.action} by {self.user_id or 'system'}"
@@ -0,0 +1,132 @@
+import smtplib
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from .models import Appointment, Notification
+
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 5
+# A failed send is retried after 1, 2, 4, ... minutes
+RETRY_BASE_SECONDS = 60
+
+SUBJECTS = {
+    'booked': 'Your appointment is booked',
+    'canceled': 'Your appointment was canceled',
+    'checked_in': 'You are checked in',
+    'offered': 'A slot opened up for you',
+    'reminder': 'Reminder: your upcoming appointment',
+}
+
+
+def enqueue(kind, appointment):
+    """
+    Queue a ``kind`` notification to ``appointment``'s patient. Call it inside
+    the transaction that makes the change, so the two commit or roll back
+    together; delivery happens later in send_notifications.
+    """
+    return Notification.objects.create(kind=kind, appointment=appointment, recipient_id=appointment.patient_id)
+
+
+def queue_reminders(day):
+    """
+    One reminder per appointment on ``day`` that still holds its slot, in a
+    single INSERT. Appointments already reminded are left out, so re-running
+    is harmless. Returns the number queued.
+    """
+    reminded = Notification.objects.filter(appointment=OuterRef('pk'), kind='reminder')
+    rows = (Appointment.objects
+            .filter(appointment_date=day, status__in=Appointment.ACTIVE_STATUSES)
+            .exclude(Exists(reminded))
+            .values_list('pk', 'patient_id'))
+    # bulk_create hands back every object, inserted or ignored, so count the
+    # day's reminders on either side of the insert instead
+    queued = Notification.objects.filter(kind='reminder', appointment__appointment_date=day)
+    with transaction.atomic():
+        before = queued.count()
+        Notification.objects.bulk_create(
+            [Notification(kind='reminder', appointment_id=pk, recipient_id=patient_id) for pk, patient_id in rows],
+            ignore_conflicts=True,
+        )
+        return queued.count() - before
+
+
+def is_stale(notification):
+    """Nothing left to announce: the appointment is gone, or a reminder's appointment no longer holds its slot."""
+    appt = notification.appointment
+    if appt is None:
+        return True
+    if notification.kind == 'reminder':
+        return appt.status not in Appointment.ACTIVE_STATUSES or appt.appointment_date < timezone.localdate()
+    return False
+
+
+def compose(notification):
+    """(subject, body) for one notification."""
+    appt = notification.appointment
+    user = notification.recipient
+    when = f"{appt.appointment_date:%A %d %B %Y} at {appt.appointment_time:%H:%M}"
+    doctor = f"Dr. {appt.doctor}"
+    lines = {
+        'booked': f"Your appointment with {doctor} on {when} is booked.",
+        'canceled': f"Your appointment with {doctor} on {when} has been canceled.",
+        'checked_in': f"You are checked in for your appointment with {doctor}. Please wait to be called.",
+        'offered': (f"A slot you were waiting for opened up: you are now booked with {doctor} on {when}. "
+                    f"Cancel from your dashboard if you can no longer make it."),
+        'reminder': (f"This is a reminder of your appointment with {doctor} on {when}. "
+                     f"Cancel from your dashboard if you can no longer make it."),
+    }
+    body = f"Hello {user.get_full_name() or user.username},\n\n{lines[notification.kind]}\n"
+    return SUBJECTS[notification.kind], body
+
+
+def deliver_batch(batch_size=BATCH_SIZE, connection=None):
+    """
+    Send up to ``batch_size`` due notifications over one mail connection,
+    oldest first, then record the outcomes in one transaction. A failed
+    send is retried with exponential backoff and marked failed after
+    MAX_ATTEMPTS. Delivery is at least once: a crash between sending and
+    recording means those messages go out again. Returns (sent, failed,
+    skipped); raises if the mail server cannot be reached at all.
+    """
+    now = timezone.now()
+    batch = list(Notification.objects
+                 .filter(status='pending', available_at__lte=now)
+                 .select_related('recipient', 'appointment__doctor__user')
+                 .order_by('available_at', 'id')[:batch_size])
+    if not batch:
+        return 0, 0, 0
+
+    sent, skipped, failed = [], [], []
+    connection = connection or get_connection()
+    with connection:
+        for n in batch:
+            if not n.recipient.email or is_stale(n):
+                skipped.append(n.pk)
+                continue
+            subject, body = compose(n)
+            try:
+                EmailMessage(subject, body, to=[n.recipient.email], connection=connection).send()
+            except (smtplib.SMTPException, OSError) as e:
+                failed.append((n, str(e) or e.__class__.__name__))
+                # Reconnect for the next message in case this one broke the session
+                connection.close()
+            else:
+                sent.append(n.pk)
+
+    with transaction.atomic():
+        Notification.objects.filter(pk__in=sent).update(
+            status='sent', sent_at=timezone.now(), attempts=F('attempts') + 1,
+        )
+        Notification.objects.filter(pk__in=skipped).update(status='skipped')
+        for n, error in failed:
+            attempts = n.attempts + 1
+            Notification.objects.filter(pk=n.pk).update(
+                attempts=attempts, last_error=error[:255],
+                status='failed' if attempts >= MAX_ATTEMPTS else 'pending',
+                available_at=now + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (attempts - 1)),
+            )
+    return len(sent), len(failed), len(skipped)
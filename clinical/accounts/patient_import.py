@@ -0,0 +1,123 @@
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from . import search
+from .models import GENDER_CHOICE, CustomUser, Patient
+
+USER_COLUMNS = ('username', 'first_name', 'last_name', 'email')
+PATIENT_COLUMNS = ('gender', 'dob', 'blood_group', 'address', 'city', 'state', 'country', 'pincode',
+                   'phone_number', 'height_cm', 'weight_kg', 'allergies', 'chronic_diseases',
+                   'current_medications')
+REQUIRED_COLUMNS = ('username', 'gender', 'dob', 'pincode', 'phone_number')
+
+_GENDERS = {k.lower(): k for k, _ in GENDER_CHOICE} | {v.lower(): k for k, v in GENDER_CHOICE}
+
+
+class InviteTokenGenerator(PasswordResetTokenGenerator):
+    """
+    Set-your-password tokens for imported patients, valid for
+    PASSWORD_RESET_TIMEOUT. Like password-reset tokens they stop working
+    once a password is set; they use their own salt, and also stop when the
+    account is deactivated.
+    """
+    key_salt = 'accounts.patient_import.InviteTokenGenerator'
+
+    def _make_hash_value(self, user, timestamp):
+        return f"{super()._make_hash_value(user, timestamp)}{user.is_active}"
+
+
+invite_tokens = InviteTokenGenerator()
+
+
+def invite_path(user):
+    return reverse('accept_invite', args=[urlsafe_base64_encode(force_bytes(user.pk)), invite_tokens.make_token(user)])
+
+
+def hash_passwords(passwords):
+    """Encoded hashes for a list of raw passwords; runs in the import's worker processes."""
+    return [make_password(p) for p in passwords]
+
+
+def _clean(model, columns, row, errors):
+    """Model-field validation (validators, choices, max_length) without building an instance."""
+    values = {}
+    for name in columns:
+        field = model._meta.get_field(name)
+        raw = (row.get(name) or '').strip()
+        if not raw:
+            if name in REQUIRED_COLUMNS:
+                errors.append(f"{name}: required")
+            elif field.null:
+                values[name] = None
+            elif not field.has_default():
+                values[name] = ''
+            continue
+        try:
+            values[name] = field.clean(raw, None)
+        except ValidationError as e:
+            errors.append(f"{name}: {' '.join(e.messages)}")
+    return values
+
+
+def clean_row(row):
+    """(user values, patient values, raw password or None, [errors]) for one CSV row."""
+    errors = []
+    row = dict(row)
+    if row.get('gender'):
+        row['gender'] = _GENDERS.get(row['gender'].strip().lower(), row['gender'])
+    user = _clean(CustomUser, USER_COLUMNS, row, errors)
+    patient = _clean(Patient, PATIENT_COLUMNS, row, errors)
+    if patient.get('dob') and patient['dob'] > timezone.localdate():
+        errors.append("dob: Date of birth cannot be in the future.")
+    return user, patient, row.get('password') or None, errors
+
+
+def validate_chunk(rows, seen):
+    """
+    Check ``rows`` ([(line number, CSV dict)]) in memory plus one query for
+    usernames already taken. ``seen`` holds the usernames accepted so far in
+    this file and is updated. Returns (records as (line, user values, patient
+    values, password), errors as (line, username, message)).
+    """
+    records, errors = [], []
+    for line, row in rows:
+        user, patient, password, problems = clean_row(row)
+        username = user.get('username')
+        if username and username in seen:
+            problems.append("username: appears earlier in the file")
+        if problems:
+            errors.append((line, row.get('username', ''), '; '.join(problems)))
+            continue
+        seen.add(username)
+        records.append((line, user, patient, password))
+    taken = set(CustomUser.objects.filter(username__in=[r[1]['username'] for r in records])
+                .values_list('username', flat=True))
+    if taken:
+        errors.extend((r[0], r[1]['username'], "username: already exists") for r in records
+                      if r[1]['username'] in taken)
+        records = [r for r in records if r[1]['username'] not in taken]
+    return records, errors
+
+
+def write_chunk(records, hashes):
+    """
+    Insert one chunk of validated records as CustomUser + Patient pairs in a
+    single transaction. ``hashes`` maps line number to an encoded password;
+    everyone else gets an unusable one. Returns the created users.
+    """
+    users = [CustomUser(role='patient', password=hashes.get(line) or make_password(None), **user)
+             for line, user, _, _ in records]
+    with transaction.atomic():
+        CustomUser.objects.bulk_create(users)
+        patients = Patient.objects.bulk_create(
+            [Patient(user=u, **patient) for u, (_, _, patient, _) in zip(users, records)]
+        )
+        # bulk_create skips the signals that index allergy / chronic notes
+        search.index_ids('patients', [p.pk for p in patients])
+    return users
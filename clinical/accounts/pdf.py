@@ -0,0 +1,124 @@
+import zlib
+
+# A small PDF writer: text and rules on A4 pages in the standard Helvetica
+# fonts, which every viewer provides, so nothing is embedded and a page is a
+# few kilobytes. Enough for printed prescriptions; not a layout engine.
+# Positions are in points from the top-left corner of the page.
+
+PAGE_WIDTH = 595.28
+PAGE_HEIGHT = 841.89
+
+FONTS = {'regular': ('F1', 'Helvetica'), 'bold': ('F2', 'Helvetica-Bold')}
+
+# Glyph widths in 1/1000 em for characters 32-126, from the Adobe metrics
+_WIDTHS = {
+    'regular': [
+        278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+        556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+        1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+        667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+        333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+        556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+    ],
+    'bold': [
+        278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+        556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+        975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+        667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+        333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+        611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+    ],
+}
+# Anything outside printable ASCII is measured as a digit
+_DEFAULT_WIDTH = 556
+
+
+def _encode(text):
+    # WinAnsiEncoding is cp1252; characters it lacks print as '?'
+    raw = str(text).replace('\r', '').replace('\n', ' ').replace('\t', ' ').encode('cp1252', 'replace')
+    return raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def text_width(text, size, font='regular'):
+    widths = _WIDTHS[font]
+    units = sum(widths[ord(c) - 32] if 32 <= ord(c) <= 126 else _DEFAULT_WIDTH for c in str(text))
+    return units * size / 1000
+
+
+def wrap(text, width, size, font='regular'):
+    """``text`` broken into lines no wider than ``width`` points, at spaces where possible."""
+    lines = []
+    for paragraph in str(text).splitlines() or ['']:
+        line = ''
+        for word in paragraph.split():
+            candidate = f"{line} {word}" if line else word
+            if text_width(candidate, size, font) <= width:
+                line = candidate
+                continue
+            if line:
+                lines.append(line)
+            # A word longer than the line is cut wherever it has to be
+            while text_width(word, size, font) > width:
+                cut = len(word) - 1
+                while cut > 1 and text_width(word[:cut], size, font) > width:
+                    cut -= 1
+                lines.append(word[:cut])
+                word = word[cut:]
+            line = word
+        lines.append(line)
+    return lines
+
+
+class Document:
+    def __init__(self, title=''):
+        self.title = title
+        self.pages = []
+        self.new_page()
+
+    def new_page(self):
+        self._ops = []
+        self.pages.append(self._ops)
+
+    def text(self, x, y, text, size=10, font='regular'):
+        """Draw ``text`` with its baseline ``y`` points below the top of the page."""
+        name = FONTS[font][0]
+        self._ops.append(b'BT /%s %g Tf %.2f %.2f Td (%s) Tj ET'
+                         % (name.encode(), size, x, PAGE_HEIGHT - y, _encode(text)))
+
+    def line(self, x1, y1, x2, y2, width=0.5):
+        self._ops.append(b'%g w %.2f %.2f m %.2f %.2f l S'
+                         % (width, x1, PAGE_HEIGHT - y1, x2, PAGE_HEIGHT - y2))
+
+    def render(self):
+        """The document as PDF bytes. The same drawing always gives the same bytes."""
+        fonts = list(FONTS.values())
+        # Objects: 1 catalog, 2 page tree, 3 info, then the fonts, then a
+        # page and its content stream for each page
+        first_page = 4 + len(fonts)
+        page_ids = [first_page + 2 * i for i in range(len(self.pages))]
+        objects = [
+            b'<< /Type /Catalog /Pages 2 0 R >>',
+            b'<< /Type /Pages /Kids [%s] /Count %d >>'
+            % (b' '.join(b'%d 0 R' % i for i in page_ids), len(page_ids)),
+            b'<< /Title (%s) /Producer (clinical) >>' % _encode(self.title),
+        ]
+        objects += [b'<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>'
+                    % base.encode() for _, base in fonts]
+        resources = b'<< /Font << %s >> >>' % b' '.join(
+            b'/%s %d 0 R' % (name.encode(), 4 + i) for i, (name, _) in enumerate(fonts))
+        for page_id, ops in zip(page_ids, self.pages):
+            stream = zlib.compress(b'\n'.join(ops))
+            objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] /Resources %s /Contents %d 0 R >>'
+                           % (PAGE_WIDTH, PAGE_HEIGHT, resources, page_id + 1))
+            objects.append(b'<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (len(stream), stream))
+
+        out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        offsets = []
+        for i, body in enumerate(objects, 1):
+            offsets.append(len(out))
+            out += b'%d 0 obj\n%s\nendobj\n' % (i, body)
+        xref = len(out)
+        out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+        out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+        out += b'trailer\n<< /Size %d /Root 1 0 R /Info 3 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+        return bytes(out)
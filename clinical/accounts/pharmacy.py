@@ -0,0 +1,64 @@
+from itertools import groupby
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import audit
+from .models import Prescription
+
+
+def _transition(qs, **changes):
+    """
+    Apply ``changes`` to the prescriptions in ``qs`` with one conditional
+    UPDATE and an audit entry per row. The rows are read in the same
+    transaction, which holds the write lock from its start (IMMEDIATE), so
+    they are exactly the ones updated. Returns the number updated.
+    """
+    fields = [f for f in audit.TRACKED[Prescription][1] if f in changes]
+    with transaction.atomic():
+        rows = list(qs.values('pk', *fields))
+        if not rows:
+            return 0
+        updated = qs.filter(pk__in=[r['pk'] for r in rows]).update(updated_at=timezone.now(), **changes)
+        for r in rows:
+            audit.record(Prescription(pk=r['pk']), 'update',
+                         {f: [r[f], changes[f]] for f in fields if r[f] != changes[f]})
+    return updated
+
+
+def claim_visit(visit_id, user):
+    """
+    Claim every pending prescription of a visit. The status check is part of
+    the UPDATE, so when two pharmacists click at once only one of them gets
+    the rows. Returns the number of prescriptions claimed.
+    """
+    return _transition(Prescription.objects.filter(visit_id=visit_id, dispense_status='pending'),
+                       dispense_status='claimed', claimed_by_id=user.pk, claimed_at=timezone.now())
+
+
+def release_visit(visit_id, user):
+    return _transition(Prescription.objects.filter(visit_id=visit_id, dispense_status='claimed', claimed_by=user),
+                       dispense_status='pending', claimed_by_id=None, claimed_at=None)
+
+
+def dispense_visit(visit_id, user, prescription_ids=None):
+    """Mark the caller's claimed prescriptions of a visit (or some of them) dispensed."""
+    qs = Prescription.objects.filter(visit_id=visit_id, dispense_status='claimed', claimed_by=user)
+    if prescription_ids is not None:
+        qs = qs.filter(pk__in=prescription_ids)
+    return _transition(qs, dispense_status='dispensed', dispensed_by_id=user.pk, dispensed_at=timezone.now())
+
+
+def open_queue(limit=100):
+    """
+    Undispensed prescriptions of the ``limit`` oldest visits that still have
+    some, grouped by visit as [(visit id, [prescriptions])]. Both queries
+    read the partial rx_dispense_queue index, so history never gets scanned.
+    """
+    pending = Prescription.objects.exclude(dispense_status='dispensed')
+    visit_ids = list(pending.order_by('visit__created_at', 'visit_id')
+                     .values_list('visit_id', flat=True).distinct()[:limit])
+    rows = (pending.filter(visit_id__in=visit_ids)
+            .select_related('visit', 'patient__user', 'doctor__user', 'claimed_by')
+            .order_by('visit__created_at', 'visit_id', 'id'))
+    return [(visit_id, list(items)) for visit_id, items in groupby(rows, key=lambda p: p.visit_id)]
@@ -0,0 +1,152 @@
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+
+class StackSampler:
+    """
+    One background thread that periodically snapshots the Python stack of
+    every registered request thread and counts collapsed stacks
+    ("outer;inner;leaf"), the format flamegraph tools read.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+            self._thread.start()
+
+    def register(self, ident):
+        counts = Counter()
+        with self._lock:
+            self._active[ident] = counts
+            self._ensure_started()
+        return counts
+
+    def unregister(self, ident):
+        with self._lock:
+            self._active.pop(ident, None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for ident, counts in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        counts[collapse(frame)] += 1
+
+
+def collapse(frame):
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+        frame = frame.f_back
+    parts.reverse()
+    return ';'.join(parts)
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in request profiler. Enabled with PROFILING_ENABLED; every request is
+    stack-sampled, and the samples are kept only when the request was picked by
+    PROFILING_SAMPLE_RATE or took longer than PROFILING_SLOW_MS. Each capture is
+    written to PROFILING_DIR as a .folded stack file plus a .json file with the
+    view name, timing and the SQL it ran, named by time, process and a
+    per-process sequence number so concurrent captures never share a file. Only the newest PROFILING_MAX_FILES
+    captures are kept.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.01)
+        self.slow_ms = getattr(settings, 'PROFILING_SLOW_MS', 500)
+        self.max_files = getattr(settings, 'PROFILING_MAX_FILES', 200)
+        self.max_queries = getattr(settings, 'PROFILING_MAX_QUERIES', 200)
+        self.out_dir = Path(getattr(settings, 'PROFILING_DIR', settings.BASE_DIR / 'profiles'))
+        self.sampler = StackSampler(getattr(settings, 'PROFILING_INTERVAL_MS', 5) / 1000.0)
+        self.sequence = itertools.count(1)
+
+    def __call__(self, request):
+        ident = threading.get_ident()
+        sampled = random.random() < self.sample_rate
+        queries = []
+
+        def capture_sql(execute, sql, params, many, context):
+            t0 = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                if len(queries) < self.max_queries:
+                    queries.append({'sql': sql, 'ms': round((time.perf_counter() - t0) * 1000, 3)})
+
+        counts = self.sampler.register(ident)
+        wrappers = [conn.execute_wrapper(capture_sql) for conn in connections.all()]
+        started = time.perf_counter()
+        try:
+            for w in wrappers:
+                w.__enter__()
+            response = self.get_response(request)
+        finally:
+            for w in reversed(wrappers):
+                w.__exit__(None, None, None)
+            self.sampler.unregister(ident)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if sampled or elapsed_ms >= self.slow_ms:
+            self.write_capture(request, response, elapsed_ms, sampled, counts, queries)
+        return response
+
+    def write_capture(self, request, response, elapsed_ms, sampled, counts, queries):
+        match = getattr(request, 'resolver_match', None)
+        view_name = (match.view_name if match else '') or 'unresolved'
+        now = time.time()
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now))
+        # next() on a count is atomic under the GIL
+        base = (f"{stamp}-{int(now * 1000) % 1000:03d}-{os.getpid()}-{next(self.sequence)}"
+                f"-{view_name.replace(':', '.')}")
+
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.out_dir / f"{base}.folded", 'w') as fh:
+            for stack, n in counts.most_common():
+                fh.write(f"{stack} {n}\n")
+        meta = {
+            'view': view_name,
+            'path': request.path,
+            'method': request.method,
+            'status': response.status_code,
+            'elapsed_ms': round(elapsed_ms, 3),
+            'reason': 'sampled' if sampled else 'slow',
+            'query_count': len(queries),
+            'queries': queries,
+        }
+        with open(self.out_dir / f"{base}.json", 'w') as fh:
+            json.dump(meta, fh, indent=1)
+        self.rotate()
+
+    def rotate(self):
+        captures = sorted(self.out_dir.glob('*.folded'), key=lambda p: p.stat().st_mtime)
+        for old in captures[:max(len(captures) - self.max_files, 0)]:
+            old.unlink(missing_ok=True)
+            old.with_suffix('.json').unlink(missing_ok=True)
@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DoctorQueue, QueueToken
+
+# Weight of the latest consult in the moving average
+CONSULT_ALPHA = 0.2
+
+
+def get_queue(doctor, day=None):
+    day = day or timezone.localdate()
+    queue, _ = DoctorQueue.objects.get_or_create(
+        doctor=doctor, date=day,
+        defaults={'avg_consult_seconds': (doctor.consultation_duration_min or 15) * 60},
+    )
+    return queue
+
+
+def _bump(queue, **changes):
+    DoctorQueue.objects.filter(pk=queue.pk).update(version=F('version') + 1, updated_at=timezone.now(), **changes)
+
+
+def issue_token(doctor, appointment=None, patient=None, walk_in_name=''):
+    """
+    Give the next token number in today's queue to a checked-in patient or
+    walk-in. A scheduled patient who arrives early is due at their
+    appointment time, so walk-ins arriving in between are called first.
+    """
+    now = timezone.now()
+    due_at = now
+    if appointment is not None:
+        slot = timezone.make_aware(datetime.combine(appointment.appointment_date, appointment.appointment_time))
+        due_at = max(now, slot)
+    with transaction.atomic():
+        queue = get_queue(doctor)
+        _bump(queue, last_token=F('last_token') + 1, waiting=F('waiting') + 1)
+        number = DoctorQueue.objects.filter(pk=queue.pk).values_list('last_token', flat=True).get()
+        return QueueToken.objects.create(
+            queue=queue, number=number, appointment=appointment,
+            patient=patient, walk_in_name=walk_in_name, checked_in_at=now, due_at=due_at,
+        )
+
+
+def _finish_current(queue, now):
+    if queue.serving is None:
+        return False
+    current = QueueToken.objects.filter(queue=queue, number=queue.serving, status='in_consult').first()
+    if current is None:
+        return False
+    QueueToken.objects.filter(pk=current.pk).update(status='done', finished_at=now)
+    took = (now - current.called_at).total_seconds()
+    avg = queue.avg_consult_seconds
+    queue.avg_consult_seconds = max(60, round(avg + CONSULT_ALPHA * (took - avg)))
+    return True
+
+
+def call_next(queue):
+    """Finish whoever is with the doctor and call the waiting token due first."""
+    with transaction.atomic():
+        queue = DoctorQueue.objects.get(pk=queue.pk)
+        now = timezone.now()
+        finished = _finish_current(queue, now)
+        token = (QueueToken.objects.filter(queue=queue, status='waiting')
+                 .order_by('due_at', 'number').first())
+        changes = {'avg_consult_seconds': queue.avg_consult_seconds}
+        if finished:
+            changes['served'] = F('served') + 1
+        if token is None:
+            changes.update(serving=None, consult_started_at=None)
+        else:
+            QueueToken.objects.filter(pk=token.pk).update(status='in_consult', called_at=now)
+            changes.update(serving=token.number, consult_started_at=now, waiting=F('waiting') - 1)
+        _bump(queue, **changes)
+        return token
+
+
+def finish_current(queue):
+    with transaction.atomic():
+        queue = DoctorQueue.objects.get(pk=queue.pk)
+        if _finish_current(queue, timezone.now()):
+            _bump(queue, avg_consult_seconds=queue.avg_consult_seconds, served=F('served') + 1,
+                  serving=None, consult_started_at=None)
+
+
+def mark_left(token):
+    with transaction.atomic():
+        if QueueToken.objects.filter(pk=token.pk, status='waiting').update(status='left'):
+            _bump(token.queue, waiting=F('waiting') - 1)
+
+
+def _eta_start(queue):
+    """When the next waiting token can be called: the end of the running consult, or the last queue event."""
+    if queue.consult_started_at:
+        return queue.consult_started_at + timedelta(seconds=queue.avg_consult_seconds)
+    return queue.updated_at
+
+
+def waiting_with_eta(queue, limit=None, now=None):
+    """
+    Waiting tokens in call order with an estimated call time each. Estimates
+    start from the end of the running consult (or the last queue event when
+    nobody is in), never earlier than now, and add one average consult per
+    token ahead; a scheduled patient is not expected before their
+    appointment time.
+    """
+    now = now or timezone.now()
+    avg = timedelta(seconds=queue.avg_consult_seconds)
+    eta = max(now, _eta_start(queue))
+    tokens = (QueueToken.objects.select_related('patient__user')
+              .filter(queue=queue, status='waiting').order_by('due_at', 'number'))
+    if limit:
+        tokens = tokens[:limit]
+    out = []
+    for t in tokens:
+        eta = max(eta, t.due_at)
+        out.append((t, eta))
+        eta += avg
+    return out
+
+
+def display_etag(queue, now=None):
+    """
+    ETag for the display feed. It is the queue version, plus the minute once
+    the estimates are anchored to the current time (an idle doctor or an
+    overrunning consult), so those ETAs still move forward between events.
+    """
+    now = now or timezone.now()
+    if _eta_start(queue) < now and queue.waiting:
+        return f'"q{queue.pk}-{queue.version}-{int(now.timestamp()) // 60}"'
+    return f'"q{queue.pk}-{queue.version}"'
+
+
+def display_payload(queue, limit=8):
+    """Compact JSON body for the waiting-room screen: token numbers and ETAs only."""
+    return {
+        'v': queue.version,
+        'serving': queue.serving,
+        'waiting': queue.waiting,
+        'avg': queue.avg_consult_seconds,
+        'next': [[t.number, int(eta.timestamp())] for t, eta in waiting_with_eta(queue, limit)],
+    }
@@ -0,0 +1,91 @@
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_ALIAS = 'replica'
+PIN_COOKIE = 'pin_primary'
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+@contextmanager
+def read_from_replica():
+    """Route reads inside the block to the replica, e.g. for reports and exports."""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Sends reads of clinical data to the replica only while replica reads are
+    switched on (by ReplicaRoutingMiddleware or read_from_replica()).
+    Users, sessions and everything written always use the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if (_replica_reads.get() and replica_configured()
+                and model._meta.app_label == 'accounts'
+                and model._meta.model_name != 'customuser'):
+            return REPLICA_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA_ALIAS}
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica only ever receives snapshots of the primary
+        if db == REPLICA_ALIAS:
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Serves read-only dashboard and admin changelist requests from the replica.
+
+    Any unsafe request (booking, cancel, check-in, login...) pins the browser
+    to the primary for REPLICA_STICKY_SECONDS, so e.g. the redirect to
+    patient_dashboard after a booking shows the new appointment even before
+    the next replica snapshot.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sticky_seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 60)
+        self.view_patterns = [re.compile(p) for p in getattr(settings, 'REPLICA_READ_VIEWS', [])]
+
+    def __call__(self, request):
+        request.use_replica = False
+        try:
+            response = self.get_response(request)
+        finally:
+            if request.use_replica:
+                _replica_reads.reset(request._replica_token)
+
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and replica_configured():
+            response.set_cookie(PIN_COOKIE, '1', max_age=self.sticky_seconds, httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not replica_configured() or request.method not in ('GET', 'HEAD'):
+            return None
+        if request.COOKIES.get(PIN_COOKIE):
+            return None
+        view_name = request.resolver_match.view_name if request.resolver_match else ''
+        if any(p.fullmatch(view_name) for p in self.view_patterns):
+            request.use_replica = True
+            request._replica_token = _replica_reads.set(True)
+        return None
@@ -0,0 +1,121 @@
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Exists, Max, Min, OuterRef
+from django.utils import timezone
+
+from . import stats
+from .models import ACTIVE_APPOINTMENT, Appointment, DoctorWorkingHours, DoctorUnavailability, PatientVisit
+
+
+def compute_slots(doctor, day):
+    """
+    Bookable slots for a doctor on a given day, built from their active
+    working-hour blocks. Each slot is flagged booked/blocked so the booking
+    page can grey it out.
+    """
+    weekday = day.weekday()
+    blocks = DoctorWorkingHours.objects.filter(
+        doctor=doctor, weekdays=weekday, is_active=True
+    ).order_by('start_time')
+
+    if not blocks.exists():
+        return []
+
+    appt_qs = Appointment.objects.filter(
+        doctor=doctor, appointment_date=day
+    ).exclude(status='canceled')
+
+    if doctor.max_daily_appointments and appt_qs.count() >= doctor.max_daily_appointments:
+        return []
+
+    already = set(appt_qs.values_list('appointment_time', flat=True))
+
+    unavail = list(DoctorUnavailability.objects.filter(doctor=doctor, date=day))
+
+    def is_blocked(t):
+        for u in unavail:
+            if u.start_time is None and u.end_time is None:
+                return True
+
+            if u.start_time and u.end_time and u.start_time <= t <= u.end_time:
+                return True
+        return False
+
+    step = doctor.consultation_duration_min or 15
+    out = []
+    now_local_time = timezone.localtime().time() if day == timezone.localdate() else None
+
+    for b in blocks:
+        cur_dt = datetime.combine(day, b.start_time)
+        end_dt = datetime.combine(day, b.end_time)
+        while cur_dt < end_dt:
+            t = cur_dt.time()
+
+            if now_local_time and t <= now_local_time:
+                cur_dt += timedelta(minutes=step)
+                continue
+
+            booked = t in already
+            blocked = is_blocked(t)
+
+            out.append({
+                "time_value": t.strftime('%H:%M'),
+                "time_display": t.strftime('%H:%M'),
+                "booked": booked,
+                "blocked": blocked,
+            })
+            cur_dt += timedelta(minutes=step)
+
+    seen, slots = set(), []
+    for s in sorted(out, key=lambda x: x["time_value"]):
+        if s["time_value"] in seen:
+            continue
+        seen.add(s["time_value"])
+        slots.append(s)
+    return slots
+
+
+def book_slot(doctor, patient_user, day, appt_time, notes=None):
+    """
+    Validate and insert a pending appointment in one write transaction.
+    With the IMMEDIATE transaction mode the write lock is taken before the
+    availability checks run, so concurrent bookings queue on busy_timeout
+    instead of failing to upgrade a read lock. Raises ValidationError or
+    IntegrityError (slot taken by a concurrent booking).
+    """
+    appt = Appointment(
+        doctor=doctor,
+        patient=patient_user,
+        appointment_date=day,
+        appointment_time=appt_time,
+        status='pending',
+        notes=notes,
+    )
+    with transaction.atomic():
+        appt.clean()
+        appt.save()
+    return appt
+
+
+def close_out(before):
+    """
+    Move every appointment dated before ``before`` that still holds its slot
+    to completed (a visit was recorded) or no_show, with two UPDATE
+    statements in one transaction and no rows loaded into Python. Queryset
+    updates bypass the stats signals, so the rollup is then rebuilt for the
+    days touched, one transaction per window; should that be interrupted,
+    `manage.py rebuild_daily_stats` catches it up. Returns (completed, no_show).
+    """
+    with transaction.atomic():
+        open_appts = Appointment.objects.filter(ACTIVE_APPOINTMENT, appointment_date__lt=before)
+        span = open_appts.aggregate(first=Min('appointment_date'), last=Max('appointment_date'))
+        if span['first'] is None:
+            return 0, 0
+        now = timezone.now()
+        completed = (open_appts
+                     .filter(Exists(PatientVisit.objects.filter(appointment=OuterRef('pk'))))
+                     .update(status='completed', updated_at=now))
+        no_show = open_appts.update(status='no_show', updated_at=now)
+    stats.rebuild_windows(span['first'], span['last'])
+    return completed, no_show
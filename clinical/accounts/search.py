@@ -0,0 +1,280 @@
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, time, timedelta
+
+from django.db import connections, router
+from django.utils import timezone
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import (
+    ArchivedPatientVisit, ArchivedPrescription, ClinicalText, Patient, PatientVisit, Prescription,
+)
+
+FTS_TABLE = 'clinical_text_fts'
+SNIPPET_OPEN, SNIPPET_CLOSE = '\x02', '\x03'
+SNIPPET_TOKENS = 16
+# bm25 ranks only the newest this-many matches (by index order), so common
+# words cost the same as rare ones
+SEARCH_CANDIDATES = 2000
+# Date filters longer than this skip the month tokens and rely on the join
+MAX_SCOPE_MONTHS = 36
+
+_retained = ContextVar('search_retained', default=False)
+
+
+@contextmanager
+def retained():
+    """Keep index rows when sources are deleted, e.g. while archival moves them."""
+    token = _retained.set(True)
+    try:
+        yield
+    finally:
+        _retained.reset(token)
+
+
+def is_retained():
+    return _retained.get()
+
+
+def _join(*parts):
+    return '\n'.join(p.strip() for p in parts if p and p.strip())
+
+
+def visit_body(v):
+    return _join(v.symptoms, v.notes)
+
+
+def prescription_body(p):
+    return _join(p.medicine_name, p.notes)
+
+
+def patient_body(p):
+    return _join(p.allergies, p.chronic_diseases)
+
+
+def _month(value):
+    return 'm' + timezone.localtime(value).strftime('%Y%m')
+
+
+def scope_tokens(kind, doctor_id, recorded_at):
+    tokens = ['k' + kind]
+    if doctor_id:
+        tokens.append(f'd{doctor_id}')
+    tokens.append(_month(recorded_at))
+    return ' '.join(tokens)
+
+
+def _entry(kind, object_id, patient_id, doctor_id, recorded_at, body):
+    return ClinicalText(kind=kind, object_id=object_id, patient_id=patient_id, doctor_id=doctor_id,
+                        recorded_at=recorded_at, body=body,
+                        scope=scope_tokens(kind, doctor_id, recorded_at))
+
+
+def sync(kind, object_id, patient_id, doctor_id, recorded_at, body):
+    """Create, update or drop the index row for one source record."""
+    rows = ClinicalText.objects.filter(kind=kind, object_id=object_id)
+    if not body:
+        rows.delete()
+        return
+    current = rows.first()
+    if current is None:
+        _entry(kind, object_id, patient_id, doctor_id, recorded_at, body).save()
+        return
+    fields = {}
+    if current.doctor_id != doctor_id or current.recorded_at != recorded_at:
+        fields.update(doctor_id=doctor_id, recorded_at=recorded_at)
+    # Rewriting unchanged text would still re-index it through the trigger
+    if current.body != body:
+        fields['body'] = body
+    scope = scope_tokens(kind, doctor_id, recorded_at)
+    if current.scope != scope:
+        fields['scope'] = scope
+    if fields:
+        rows.update(**fields)
+
+
+def remove(kind, object_id):
+    if not is_retained():
+        ClinicalText.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+# Rebuilding: source name -> (model, columns, values row -> index row). Hot
+# and archived tables share ids, so each source only fills in what is missing.
+
+def _visit_row(v):
+    return _entry('visit', v['id'], v['patient_id'], v['doctor_id'], v['created_at'],
+                  _join(v['symptoms'], v['notes']))
+
+
+def _prescription_row(p):
+    return _entry('prescription', p['id'], p['patient_id'], p['doctor_id'], p['created_at'],
+                  _join(p['medicine_name'], p['notes']))
+
+
+def _patient_row(p):
+    return _entry('patient', p['id'], p['id'], None, p['updated_at'],
+                  _join(p['allergies'], p['chronic_diseases']))
+
+
+VISIT_COLUMNS = ['id', 'patient_id', 'doctor_id', 'created_at', 'symptoms', 'notes']
+PRESCRIPTION_COLUMNS = ['id', 'patient_id', 'doctor_id', 'created_at', 'medicine_name', 'notes']
+
+SOURCES = {
+    'visits': (PatientVisit, VISIT_COLUMNS, _visit_row),
+    'archived_visits': (ArchivedPatientVisit, VISIT_COLUMNS, _visit_row),
+    'prescriptions': (Prescription, PRESCRIPTION_COLUMNS, _prescription_row),
+    'archived_prescriptions': (ArchivedPrescription, PRESCRIPTION_COLUMNS, _prescription_row),
+    'patients': (Patient, ['id', 'updated_at', 'allergies', 'chronic_diseases'], _patient_row),
+}
+
+
+def backfill_batch(source, after_id, batch_size):
+    """
+    Index one keyset batch of ``source`` (a SOURCES key). Rows already in the
+    index are left alone. Returns (last id or None when done, rows added).
+    """
+    model, columns, to_row = SOURCES[source]
+    rows = list(model.objects.filter(pk__gt=after_id).order_by('pk').values(*columns)[:batch_size])
+    if not rows:
+        return None, 0
+    entries = [e for e in map(to_row, rows) if e.body]
+    if entries:
+        # bulk_create(ignore_conflicts=True) returns every object it was given,
+        # so the ones already indexed are dropped here to count what is added;
+        # ignore_conflicts still covers a signal indexing one meanwhile
+        indexed = set(ClinicalText.objects
+                      .filter(kind=entries[0].kind, object_id__range=(rows[0]['id'], rows[-1]['id']))
+                      .values_list('object_id', flat=True))
+        entries = [e for e in entries if e.object_id not in indexed]
+        ClinicalText.objects.bulk_create(entries, ignore_conflicts=True)
+    return rows[-1]['id'], len(entries)
+
+
+def index_ids(source, ids):
+    """
+    Index the ``source`` rows with these primary keys, e.g. rows just written
+    by bulk_create, which skips the signals. Returns how many had text.
+    """
+    model, columns, to_row = SOURCES[source]
+    entries = [e for e in map(to_row, model.objects.filter(pk__in=ids).values(*columns)) if e.body]
+    ClinicalText.objects.bulk_create(entries, ignore_conflicts=True)
+    return len(entries)
+
+
+def optimize():
+    """Merge the FTS b-trees after a large backfill so queries touch fewer pages."""
+    with connections[router.db_for_write(ClinicalText)].cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+
+# Querying
+
+TERM_PATTERN = re.compile(r'"([^"]*)"|(\w+)(\*?)')
+
+
+def match_expression(text):
+    """
+    Turn what a user typed into a safe FTS5 query: every word and "quoted
+    phrase" must appear, and a trailing * makes a word a prefix search.
+    FTS5 operators and column filters in the input are treated as text.
+    """
+    terms = []
+    for phrase, word, star in TERM_PATTERN.findall(text or ''):
+        if phrase.strip():
+            terms.append('"%s"' % phrase.strip().replace('"', '""'))
+        elif word:
+            terms.append('"%s"%s' % (word, star))
+    return ' '.join(terms)
+
+
+def _months(start, end):
+    """Month tokens covering [start, end], or None when that is too many to list."""
+    first, last = start.year * 12 + start.month - 1, end.year * 12 + end.month - 1
+    if last < first or last - first >= MAX_SCOPE_MONTHS:
+        return None
+    return ['m%04d%02d' % (m // 12, m % 12 + 1) for m in range(first, last + 1)]
+
+
+def search(query, doctor_id=None, start=None, end=None, kinds=None, limit=20, offset=0):
+    """
+    Index rows matching ``query``, optionally only those recorded by
+    ``doctor_id``, on dates in [start, end] and/or of the given kinds, best
+    bm25 rank first among the newest SEARCH_CANDIDATES matches. Returns
+    ClinicalText objects with ``rank`` and a ``snippet`` whose matches are
+    wrapped in SNIPPET_OPEN / SNIPPET_CLOSE.
+
+    Doctor, kind and month filters are scope tokens ANDed into the FTS query,
+    so they narrow the match inside the index; exact date bounds are then
+    checked on the joined row.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return []
+    connection = connections[router.db_for_read(ClinicalText)]
+
+    def day_start(day):
+        value = timezone.make_aware(datetime.combine(day, time.min))
+        return connection.ops.adapt_datetimefield_value(value)
+
+    fts_query = [f'body : ({expression})']
+    if doctor_id is not None:
+        fts_query.append(f'scope : "d{int(doctor_id)}"')
+    if kinds:
+        kinds = [k for k in kinds if k in dict(ClinicalText.KIND_CHOICES)]
+        if not kinds:
+            return []
+        fts_query.append('scope : (%s)' % ' OR '.join(f'"k{k}"' for k in kinds))
+    if start is not None:
+        months = _months(start, end or timezone.localdate())
+        if months:
+            fts_query.append('scope : (%s)' % ' OR '.join(f'"{m}"' for m in months))
+    fts_query = ' AND '.join(fts_query)
+
+    table = ClinicalText._meta.db_table
+    join, where, params = '', [f'{FTS_TABLE} MATCH %s'], [fts_query]
+    if start is not None or end is not None:
+        join = f'JOIN {table} t ON t.id = {FTS_TABLE}.rowid'
+        if start is not None:
+            where.append('t.recorded_at >= %s')
+            params.append(day_start(start))
+        if end is not None:
+            where.append('t.recorded_at < %s')
+            params.append(day_start(end + timedelta(days=1)))
+
+    with connection.cursor() as cursor:
+        # Walking matches newest-first is cheap and only those candidates get
+        # scored; snippets are then built for the page of results only
+        cursor.execute(
+            f"SELECT rowid, rank FROM (SELECT {FTS_TABLE}.rowid, {FTS_TABLE}.rank FROM {FTS_TABLE} {join} "
+            f"WHERE {' AND '.join(where)} ORDER BY {FTS_TABLE}.rowid DESC LIMIT %s) "
+            f"ORDER BY rank, rowid DESC LIMIT %s OFFSET %s",
+            params + [SEARCH_CANDIDATES, limit, offset],
+        )
+        ranked = cursor.fetchall()
+        if not ranked:
+            return []
+        # No rank here: asking for it per rowid would redo bm25's setup per row
+        cursor.execute(
+            f"SELECT rowid, snippet({FTS_TABLE}, 0, %s, %s, '…', %s) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid IN ({', '.join(['%s'] * len(ranked))})",
+            [SNIPPET_OPEN, SNIPPET_CLOSE, SNIPPET_TOKENS, fts_query] + [pk for pk, _ in ranked],
+        )
+        snippets = dict(cursor.fetchall())
+
+    entries = (ClinicalText.objects.using(connection.alias)
+               .select_related('patient__user', 'doctor__user')
+               .in_bulk([pk for pk, _ in ranked]))
+    results = []
+    for pk, rank in ranked:
+        if pk in entries and pk in snippets:
+            entry = entries[pk]
+            entry.snippet, entry.rank = snippets[pk], rank
+            results.append(entry)
+    return results
+
+
+def highlight(snippet):
+    """HTML for a snippet: text escaped, matches in <mark>."""
+    return mark_safe(escape(snippet).replace(SNIPPET_OPEN, '<mark>').replace(SNIPPET_CLOSE, '</mark>'))
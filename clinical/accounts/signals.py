@@ -0,0 +1,276 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import allergies, audit, charts, search, stats, vitals
+from .models import (
+    Appointment, DoctorUnavailability, DoctorWorkingHours, DrugTerm, Patient, PatientVisit, Prescription,
+)
+
+
+_bulk = ContextVar('bulk_maintenance', default=False)
+
+
+@contextmanager
+def bulk_maintenance():
+    """
+    Skip the @unless_bulk handlers below (daily rollup, chart summaries,
+    audit trail) inside the block, for bulk moves such as archival that
+    leave those as they are or catch them up themselves.
+    """
+    token = _bulk.set(True)
+    try:
+        yield
+    finally:
+        _bulk.reset(token)
+
+
+def unless_bulk(handler):
+    @wraps(handler)
+    def inner(sender, instance, raw=False, **kwargs):
+        if raw or _bulk.get():
+            return
+        return handler(sender, instance, **kwargs)
+    return inner
+
+
+# DoctorDailyStats maintenance. Bulk operations (bulk_create, queryset.update)
+# bypass these; run `manage.py rebuild_daily_stats` after them.
+
+
+@receiver(pre_save, sender=Appointment)
+@unless_bulk
+def remember_appointment_state(sender, instance, **kwargs):
+    instance._stats_before = None
+    if instance.pk:
+        instance._stats_before = (Appointment.objects
+                                  .filter(pk=instance.pk)
+                                  .values_list('doctor_id', 'appointment_date', 'status')
+                                  .first())
+
+
+@receiver(post_save, sender=Appointment)
+@unless_bulk
+def appointment_stats(sender, instance, **kwargs):
+    before = getattr(instance, '_stats_before', None)
+    after = (instance.doctor_id, instance.appointment_date, instance.status)
+    if before == after:
+        return
+    deltas = defaultdict(int, {'booked': 1, instance.status: 1})
+    if before:
+        doctor_id, day, status = before
+        old = {'booked': -1, status: -1}
+        if (doctor_id, day) == after[:2]:
+            # One bump for the row, so a rebuilt missing row isn't adjusted twice
+            for field, delta in old.items():
+                deltas[field] += delta
+        else:
+            stats.bump(doctor_id, day, **old)
+    stats.bump(instance.doctor_id, instance.appointment_date, **deltas)
+
+
+@receiver(post_delete, sender=Appointment)
+@unless_bulk
+def appointment_deleted_stats(sender, instance, **kwargs):
+    stats.bump(instance.doctor_id, instance.appointment_date, **{'booked': -1, instance.status: -1})
+
+
+@receiver(post_save, sender=PatientVisit)
+@unless_bulk
+def visit_stats(sender, instance, created, **kwargs):
+    if created:
+        stats.bump(instance.doctor_id, stats.visit_day(instance), visits=1)
+
+
+@receiver(post_delete, sender=PatientVisit)
+@unless_bulk
+def visit_deleted_stats(sender, instance, **kwargs):
+    stats.bump(instance.doctor_id, stats.visit_day(instance), visits=-1)
+
+
+@receiver(post_save, sender=Prescription)
+@unless_bulk
+def prescription_stats(sender, instance, created, **kwargs):
+    if created:
+        stats.bump(instance.doctor_id, stats.visit_day(instance.visit), prescriptions=1)
+
+
+@receiver(post_delete, sender=Prescription)
+@unless_bulk
+def prescription_deleted_stats(sender, instance, **kwargs):
+    visit = PatientVisit.objects.filter(pk=instance.visit_id).first()
+    if visit:
+        stats.bump(instance.doctor_id, stats.visit_day(visit), prescriptions=-1)
+
+
+@receiver([post_save, post_delete], sender=DoctorUnavailability)
+@unless_bulk
+def unavailability_capacity(sender, instance, **kwargs):
+    stats.refresh_capacity(instance.doctor_id, instance.date)
+
+
+@receiver([post_save, post_delete], sender=DoctorWorkingHours)
+@unless_bulk
+def working_hours_capacity(sender, instance, **kwargs):
+    stats.refresh_future_capacity(instance.doctor_id)
+
+
+# Structured vitals: keep bp_systolic / bp_diastolic in step with the
+# free-text blood_pressure, and the patient's latest reading current.
+
+@receiver(pre_save, sender=PatientVisit)
+def parse_visit_vitals(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance.bp_systolic, instance.bp_diastolic = vitals.parse_blood_pressure(instance.blood_pressure)
+
+
+@receiver(post_save, sender=PatientVisit)
+def latest_patient_vitals(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if instance.bp_systolic is None:
+        # A cleared reading may have been the patient's latest
+        vitals.reading_removed(instance.patient_id, instance.created_at)
+        return
+    # Only move the patient's reading forward in time
+    Patient.objects.filter(pk=instance.patient_id).filter(
+        Q(last_vitals_at__isnull=True) | Q(last_vitals_at__lte=instance.created_at)
+    ).update(
+        last_systolic=instance.bp_systolic,
+        last_diastolic=instance.bp_diastolic,
+        last_vitals_at=instance.created_at,
+    )
+
+
+@receiver(post_delete, sender=PatientVisit)
+@unless_bulk
+def deleted_patient_vitals(sender, instance, **kwargs):
+    if instance.bp_systolic is not None:
+        vitals.reading_removed(instance.patient_id, instance.created_at)
+
+
+# Clinical text search: keep each record's ClinicalText row (and through its
+# triggers the FTS index) in step. bulk_create bypasses these; run
+# `manage.py index_clinical_text` after bulk loads.
+
+@receiver(post_save, sender=PatientVisit)
+def index_visit_text(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.sync('visit', instance.pk, instance.patient_id, instance.doctor_id,
+                instance.created_at, search.visit_body(instance))
+
+
+@receiver(post_save, sender=Prescription)
+def index_prescription_text(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.sync('prescription', instance.pk, instance.patient_id, instance.doctor_id,
+                instance.created_at, search.prescription_body(instance))
+
+
+@receiver(post_save, sender=Patient)
+def index_patient_text(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.sync('patient', instance.pk, instance.pk, None, instance.updated_at, search.patient_body(instance))
+
+
+@receiver(post_delete, sender=PatientVisit)
+def unindex_visit_text(sender, instance, **kwargs):
+    search.remove('visit', instance.pk)
+
+
+@receiver(post_delete, sender=Prescription)
+def unindex_prescription_text(sender, instance, **kwargs):
+    search.remove('prescription', instance.pk)
+
+
+# Prescription conflict check against the patient's allergies and current
+# medications; the compiled drug dictionary is dropped when it is edited.
+
+@receiver(pre_save, sender=Prescription)
+def prescription_conflicts(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # PrescriptionForm has already checked this medicine for this patient
+    checked = instance.__dict__.pop('_conflicts', None)
+    if checked and checked[:2] == (instance.medicine_name, instance.patient_id):
+        instance.conflict_warning = checked[2]
+    else:
+        instance.conflict_warning = allergies.check_prescription(instance)
+
+
+@receiver([post_save, post_delete], sender=DrugTerm)
+def drug_dictionary_changed(sender, **kwargs):
+    allergies.invalidate()
+
+
+# Patient chart summaries. Archival leaves them alone like the daily rollup
+# (counts include archived visits); run `manage.py rebuild_chart_summaries`
+# after bulk loads.
+
+@receiver(post_save, sender=PatientVisit)
+@unless_bulk
+def chart_visit_saved(sender, instance, created, **kwargs):
+    charts.visit_saved(instance, created)
+
+
+@receiver(post_delete, sender=PatientVisit)
+@unless_bulk
+def chart_visit_deleted(sender, instance, **kwargs):
+    charts.visit_deleted(instance)
+
+
+@receiver(pre_save, sender=Prescription)
+def prescription_end_date(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # created_at is still unset on the first save; auto_now_add fills it in later
+    instance.end_date = charts.course_end(instance.created_at or timezone.now(), instance.duration_days)
+
+
+@receiver([post_save, post_delete], sender=Prescription)
+@unless_bulk
+def chart_medications(sender, instance, **kwargs):
+    charts.medications_changed(instance.patient_id)
+
+
+@receiver(post_save, sender=Patient)
+@unless_bulk
+def chart_patient_saved(sender, instance, **kwargs):
+    charts.patient_saved(instance)
+
+
+# Audit trail for visits and prescriptions. Archival moves rows rather than
+# changing them, so it is skipped like the rollup maintenance above.
+
+@receiver(pre_save, sender=PatientVisit)
+@receiver(pre_save, sender=Prescription)
+@unless_bulk
+def audit_snapshot(sender, instance, **kwargs):
+    instance._audit_before = audit.snapshot(instance)
+
+
+@receiver(post_save, sender=PatientVisit)
+@receiver(post_save, sender=Prescription)
+@unless_bulk
+def audit_saved(sender, instance, created, **kwargs):
+    before = getattr(instance, '_audit_before', None)
+    changes = audit.diff(instance, before)
+    if changes or created:
+        audit.record(instance, 'create' if created else 'update', changes)
+
+
+@receiver(post_delete, sender=PatientVisit)
+@receiver(post_delete, sender=Prescription)
+@unless_bulk
+def audit_deleted(sender, instance, **kwargs):
+    audit.record(instance, 'delete', audit.diff(instance, None))
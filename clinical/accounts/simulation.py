@@ -0,0 +1,193 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from .models import Appointment, DoctorUnavailability
+
+# Replays historical booking demand for one doctor against proposed schedules.
+# A schedule is a plain dict so it can be shipped to worker processes:
+#   {'name': str, 'consultation_duration_min': int, 'max_daily_appointments': int,
+#    'blocks': {weekday: [(start_minute, end_minute), ...]}}
+
+
+def schedule_for(doctor, name='current'):
+    blocks = {}
+    for wd, s, e in doctor.working_hours.filter(is_active=True).values_list('weekdays', 'start_time', 'end_time'):
+        blocks.setdefault(wd, []).append((s.hour * 60 + s.minute, e.hour * 60 + e.minute))
+    return {
+        'name': name,
+        'consultation_duration_min': doctor.consultation_duration_min or 15,
+        'max_daily_appointments': doctor.max_daily_appointments,
+        'blocks': blocks,
+    }
+
+
+def load_demand(doctor, start, end):
+    """
+    Booking requests made between ``start`` and ``end``: the local day each
+    request was made and the day the patient asked for, as ordinal arrays
+    sorted by request time. Canceled bookings still count as demand.
+    """
+    tz = timezone.get_current_timezone()
+    rows = (Appointment.objects
+            .filter(doctor=doctor, created_at__date__range=(start, end))
+            .order_by('created_at')
+            .values_list('created_at', 'appointment_date'))
+    requested, wanted = [], []
+    for created, day in rows.iterator(chunk_size=20000):
+        requested.append(created.astimezone(tz).date().toordinal())
+        wanted.append(day.toordinal())
+    closed, partial = [], []
+    for day, s, e in (DoctorUnavailability.objects.filter(doctor=doctor, date__gte=start)
+                      .values_list('date', 'start_time', 'end_time')):
+        if s is None and e is None:
+            closed.append(day.toordinal())
+        elif s is not None and e is not None:
+            partial.append((day.toordinal(), s.hour * 60 + s.minute, e.hour * 60 + e.minute))
+    return {
+        'requested': np.array(requested, dtype=np.int64),
+        'wanted': np.maximum(np.array(wanted, dtype=np.int64), np.array(requested, dtype=np.int64)),
+        'closed': np.array(closed, dtype=np.int64),
+        # (day, start_minute, end_minute) of time off within a day
+        'partial': np.array(partial, dtype=np.int64).reshape(-1, 3),
+    }
+
+
+def daily_capacity(schedule, first_day, n_days, closed, partial=()):
+    """
+    Slots per day for ``n_days`` starting at ordinal ``first_day``. Slots
+    starting inside a ``partial`` window are taken out, as compute_slots
+    blocks them (both ends inclusive); ``closed`` days have none.
+    """
+    step = schedule['consultation_duration_min']
+    per_weekday = np.zeros(7, dtype=np.int64)
+    for wd, blocks in schedule['blocks'].items():
+        per_weekday[int(wd)] = sum(len(range(s, e, step)) for s, e in blocks)
+    days = first_day + np.arange(n_days)
+    cap = per_weekday[(days + 6) % 7]
+    for day, us, ue in partial:
+        i = int(day) - first_day
+        if 0 <= i < n_days:
+            for s, e in schedule['blocks'].get((int(day) + 6) % 7, []):
+                cap[i] -= sum(1 for t in range(s, e, step) if us <= t <= ue)
+    idx = closed - first_day
+    cap[idx[(idx >= 0) & (idx < n_days)]] = 0
+    if schedule.get('max_daily_appointments'):
+        cap = np.minimum(cap, schedule['max_daily_appointments'])
+    return cap
+
+
+def simulate(demand, schedule, horizon_days=30):
+    """
+    Give every request, in the order it was made, the first day on or after
+    the day it wanted that still has a free slot, looking at most
+    ``horizon_days`` past the wanted day. Free days are found with a
+    union-find "next open day" pointer, so each request is near O(1).
+    """
+    requested, wanted = demand['requested'], demand['wanted']
+    n = len(requested)
+    if n == 0:
+        return {'name': schedule['name'], 'requests': 0}
+
+    first_day = int(requested.min())
+    n_days = int(wanted.max() + horizon_days - first_day + 2)
+    remaining = daily_capacity(schedule, first_day, n_days, demand['closed'], demand.get('partial', ()))
+    total_capacity = int(remaining[:n_days - 1].sum())
+
+    parent = np.arange(n_days + 1)
+    parent[:n_days][remaining == 0] += 1
+    parent = parent.tolist()
+    remaining = remaining.tolist()
+
+    def find(d):
+        root = d
+        while parent[root] != root:
+            root = parent[root]
+        while parent[d] != root:
+            parent[d], d = root, parent[d]
+        return root
+
+    got = np.full(n, -1, dtype=np.int64)
+    want_idx = (wanted - first_day).tolist()
+    for i in range(n):
+        day = find(want_idx[i])
+        if day >= n_days or day > want_idx[i] + horizon_days:
+            continue
+        got[i] = day
+        remaining[day] -= 1
+        if remaining[day] == 0:
+            parent[day] = day + 1
+
+    served = got >= 0
+    wait = got[served] - (requested[served] - first_day)
+    delay = got[served] - (wanted[served] - first_day)
+    moved = served & (got != (wanted - first_day))
+    return {
+        'name': schedule['name'],
+        'requests': n,
+        'served': int(served.sum()),
+        'lost': int((~served).sum()),
+        'moved': int(moved.sum()),
+        'turn_away_days': int(len(np.unique(wanted[moved | ~served]))),
+        'fill_rate': float(served.sum() / total_capacity) if total_capacity else 0.0,
+        'mean_wait_days': float(wait.mean()) if len(wait) else None,
+        'p90_wait_days': float(np.percentile(wait, 90)) if len(wait) else None,
+        'mean_delay_days': float(delay.mean()) if len(delay) else None,
+    }
+
+
+def _simulate_args(args):
+    return simulate(*args)
+
+
+def sweep(demand, schedules, horizon_days=30, workers=None):
+    """Simulate many schedule variants, in parallel when workers > 1."""
+    jobs = [(demand, s, horizon_days) for s in schedules]
+    if workers == 1 or len(jobs) < 2:
+        return [simulate(*j) for j in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_simulate_args, jobs, chunksize=max(1, len(jobs) // 32)))
+
+
+def variants(base, durations=(), extra_weekdays=(), extend_minutes=()):
+    """
+    Cartesian sweep of duration, added working days and longer blocks,
+    leaving out the combination that reproduces ``base``.
+    """
+    out = []
+    durations = durations or [base['consultation_duration_min']]
+    extra_options = [()] + [(wd,) for wd in extra_weekdays]
+    extend_options = [0] + list(extend_minutes)
+    template = next(iter(base['blocks'].values()), [(9 * 60, 13 * 60)])
+    for duration in durations:
+        for extra in extra_options:
+            if extra and extra[0] in base['blocks']:
+                continue
+            for extend in extend_options:
+                blocks = {wd: list(b) for wd, b in base['blocks'].items()}
+                for wd in extra:
+                    blocks[wd] = list(template)
+                if extend:
+                    blocks = {wd: b[:-1] + [(b[-1][0], min(b[-1][1] + extend, 24 * 60))] for wd, b in blocks.items()}
+                if duration == base['consultation_duration_min'] and not extra and not extend:
+                    # The current schedule itself, already simulated as the base row
+                    continue
+                name = f"{duration}min"
+                if extra:
+                    name += f" +day{extra[0]}"
+                if extend:
+                    name += f" +{extend}m"
+                out.append({
+                    'name': name,
+                    'consultation_duration_min': duration,
+                    'max_daily_appointments': base['max_daily_appointments'],
+                    'blocks': blocks,
+                })
+    return out
+
+
+def default_window():
+    end = timezone.localdate()
+    return end - timedelta(days=180), end
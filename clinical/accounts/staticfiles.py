@@ -0,0 +1,166 @@
+import gzip
+import json
+import mimetypes
+import os
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.http import http_date
+
+# Static asset pipeline. collectstatic (through CompressedManifestStaticFilesStorage)
+# names every file after a hash of its content and writes .gz and .br copies
+# of the text ones next to it; StaticFilesMiddleware serves STATIC_ROOT from
+# an in-memory index, picking the smallest encoding the client accepts and
+# letting browsers cache hashed names for a year. Downscaled copies of the
+# large background images are source files, made by `manage.py
+# build_image_variants` from STATIC_IMAGE_VARIANTS and picked by media
+# queries in the stylesheets.
+
+COMPRESSIBLE = re.compile(r'\.(css|js|mjs|svg|json|txt|html|xml|ico|map)$')
+# Below this the encoded copy saves less than its extra lookup costs
+MIN_COMPRESS_SIZE = 512
+# One year, the longest cache lifetime browsers honour
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def compress_file(path):
+    """
+    Write ``path``.gz, and ``path``.br when the brotli package is installed,
+    keeping only copies that come out smaller. Returns the encodings written.
+    """
+    data = Path(path).read_bytes()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return []
+    # mtime=0 so the same input always gives the same .gz
+    encoded = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    brotli = _brotli()
+    if brotli is not None:
+        encoded['.br'] = brotli.compress(data, quality=11)
+    written = []
+    for suffix, body in encoded.items():
+        if len(body) < len(data):
+            Path(f"{path}{suffix}").write_bytes(body)
+            written.append(suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also precompresses the hashed text files."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            path = self.path(name)
+            # A hashed name pins the content, so existing copies are still right
+            if COMPRESSIBLE.search(name) and not os.path.exists(f"{path}.gz"):
+                compress_file(path)
+
+
+def variant_name(name, width):
+    """'Home/images/bg.jpg', 640 -> 'Home/images/bg-640w.jpg'."""
+    stem, ext = os.path.splitext(name)
+    return f"{stem}-{width}w{ext}"
+
+
+def build_variants(source, widths, quality=80):
+    """
+    Save ``source`` scaled down to each of ``widths`` as a progressive JPEG
+    beside it (see variant_name()); a width at or above the original's
+    re-encodes it at full size. Needs Pillow. Returns [(path, bytes)].
+    """
+    from PIL import Image
+
+    source = Path(source)
+    written = []
+    with Image.open(source) as image:
+        image = image.convert('RGB')
+        for width in widths:
+            target = source.with_name(variant_name(source.name, width))
+            scaled = image
+            if width < image.width:
+                scaled = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            scaled.save(target, 'JPEG', quality=quality, optimize=True, progressive=True)
+            written.append((target, target.stat().st_size))
+    return written
+
+
+class StaticFilesMiddleware:
+    """
+    Serves STATIC_URL from the collected STATIC_ROOT ahead of the rest of
+    the stack (no session or user lookups). Files are indexed once at
+    startup, so a request costs a dict lookup and a FileResponse, which
+    hands the file to the server's sendfile where it has one. Clients that
+    accept br or gzip get the precompressed copy. Hashed names are cached
+    for a year; anything else is revalidated after STATIC_MAX_AGE seconds.
+    Not used while DEBUG is on, where `runserver` serves the source files
+    (a stale collected copy would otherwise shadow them), nor until
+    collectstatic has written a manifest.
+    """
+
+    def __init__(self, get_response):
+        if settings.DEBUG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        root = Path(settings.STATIC_ROOT) if settings.STATIC_ROOT else None
+        manifest = root / 'staticfiles.json' if root else None
+        if manifest is None or not manifest.exists():
+            raise MiddlewareNotUsed
+        self.prefix = settings.STATIC_URL
+        self.max_age = getattr(settings, 'STATIC_MAX_AGE', 60)
+        hashed = set(json.loads(manifest.read_text())['paths'].values())
+        self.files = {}
+        for path in root.rglob('*'):
+            name = path.relative_to(root).as_posix()
+            if not path.is_file() or name.endswith(('.gz', '.br')):
+                continue
+            self.files[self.prefix + name] = self._entry(path, name in hashed)
+
+    def _entry(self, path, immutable):
+        stat = path.stat()
+        content_type, _ = mimetypes.guess_type(path.name)
+        return {
+            'path': path,
+            'content_type': content_type or 'application/octet-stream',
+            'encoded': [(encoding, Path(f"{path}{suffix}")) for encoding, suffix in ENCODINGS
+                        if os.path.exists(f"{path}{suffix}")],
+            'vary': bool(COMPRESSIBLE.search(path.name)),
+            'etag': f"{stat.st_size:x}-{int(stat.st_mtime):x}",
+            'last_modified': http_date(stat.st_mtime),
+            'cache_control': (f'public, max-age={IMMUTABLE_MAX_AGE}, immutable' if immutable
+                              else f'public, max-age={self.max_age}'),
+        }
+
+    def __call__(self, request):
+        entry = self.files.get(request.path_info) if request.method in ('GET', 'HEAD') else None
+        if entry is None:
+            return self.get_response(request)
+
+        path, etag = entry['path'], entry['etag']
+        headers = {'Last-Modified': entry['last_modified'], 'Cache-Control': entry['cache_control']}
+        accepted = {token.split(';')[0].strip() for token in request.headers.get('Accept-Encoding', '').split(',')}
+        for encoding, encoded_path in entry['encoded']:
+            if encoding in accepted:
+                headers['Content-Encoding'] = encoding
+                path, etag = encoded_path, f"{etag}-{encoding}"
+                break
+        if entry['vary']:
+            headers['Vary'] = 'Accept-Encoding'
+        headers['ETag'] = f'"{etag}"'
+        if request.headers.get('If-None-Match') == headers['ETag']:
+            return HttpResponseNotModified(headers=headers)
+        return FileResponse(open(path, 'rb'), content_type=entry['content_type'], headers=headers)
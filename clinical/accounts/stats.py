@@ -0,0 +1,179 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import (
+    Appointment, Doctor, DoctorDailyStats, DoctorUnavailability, DoctorWorkingHours,
+    PatientVisit, Prescription,
+)
+
+# Every appointment status has a counter of the same name
+STATUSES = [status for status, _ in Appointment.STATUS_CHOICES]
+
+
+def _minutes(start, end):
+    return (end.hour * 60 + end.minute) - (start.hour * 60 + start.minute)
+
+
+def capacity_from(blocks, unavail):
+    """
+    Working minutes in ``blocks`` [(start, end)] after removing ``unavail``
+    [(start, end)], where (None, None) means the whole day is off.
+    """
+    if any(s is None and e is None for s, e in unavail):
+        return 0
+    total = 0
+    for bs, be in blocks:
+        minutes = _minutes(bs, be)
+        for us, ue in unavail:
+            if us is None or ue is None:
+                continue
+            lo, hi = max(bs, us), min(be, ue)
+            if lo < hi:
+                minutes -= _minutes(lo, hi)
+        total += max(minutes, 0)
+    return total
+
+
+def capacity_minutes(doctor_id, day):
+    blocks = DoctorWorkingHours.objects.filter(
+        doctor_id=doctor_id, weekdays=day.weekday(), is_active=True
+    ).values_list('start_time', 'end_time')
+    unavail = DoctorUnavailability.objects.filter(
+        doctor_id=doctor_id, date=day
+    ).values_list('start_time', 'end_time')
+    return capacity_from(list(blocks), list(unavail))
+
+
+def visit_day(visit):
+    if visit.appointment_id:
+        return Appointment.objects.filter(pk=visit.appointment_id).values_list('appointment_date', flat=True).first()
+    return timezone.localtime(visit.created_at).date()
+
+
+def bump(doctor_id, day, **deltas):
+    """
+    Apply counter deltas to one rollup row. Called after the change is
+    saved, so a missing row (first use, or history from before the rollup)
+    is rebuilt from the source tables instead, which already counts it;
+    applying a -1 to a zero-created row would break the counters' CHECKs.
+    """
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas or day is None:
+        return
+    with transaction.atomic():
+        updated = DoctorDailyStats.objects.filter(doctor_id=doctor_id, date=day).update(
+            **{k: F(k) + v for k, v in deltas.items()}
+        )
+        if not updated:
+            rebuild(day, day, [doctor_id])
+
+
+def refresh_capacity(doctor_id, day):
+    DoctorDailyStats.objects.filter(doctor_id=doctor_id, date=day).update(
+        capacity_minutes=capacity_minutes(doctor_id, day)
+    )
+
+
+def refresh_future_capacity(doctor_id):
+    for day in (DoctorDailyStats.objects
+                .filter(doctor_id=doctor_id, date__gte=timezone.localdate())
+                .values_list('date', flat=True)):
+        refresh_capacity(doctor_id, day)
+
+
+def rebuild(start, end, doctor_ids=None):
+    """
+    Recompute every rollup row between ``start`` and ``end`` (inclusive) from
+    the source tables with grouped queries, replacing what is stored.
+    Returns the number of rows written.
+    """
+    rows = defaultdict(lambda: defaultdict(int))
+
+    appts = Appointment.objects.filter(appointment_date__range=(start, end))
+    if doctor_ids:
+        appts = appts.filter(doctor_id__in=doctor_ids)
+    counts = {'booked': Count('id')}
+    for status in STATUSES:
+        counts[status] = Count('id', filter=Q(status=status))
+    for r in appts.values('doctor_id', 'appointment_date').annotate(**counts):
+        key = (r['doctor_id'], r['appointment_date'])
+        for field in counts:
+            rows[key][field] = r[field]
+
+    def by_visit_day(qs, field, appt_path, created_path):
+        # Visits count on their appointment's day, walk-ins on the day they were created
+        qs = qs.filter(Q(**{f"{appt_path}__appointment_date__range": (start, end)})
+                       | Q(**{f"{appt_path}__isnull": True, f"{created_path}__date__range": (start, end)}))
+        if doctor_ids:
+            qs = qs.filter(doctor_id__in=doctor_ids)
+        grouped = (qs.annotate(day=Coalesce(f"{appt_path}__appointment_date", f"{created_path}__date"))
+                   .values('doctor_id', 'day').annotate(n=Count('id')))
+        for r in grouped:
+            rows[(r['doctor_id'], r['day'])][field] = r['n']
+
+    by_visit_day(PatientVisit.objects.all(), 'visits', 'appointment', 'created_at')
+    by_visit_day(Prescription.objects.all(), 'prescriptions', 'visit__appointment', 'visit__created_at')
+
+    # Capacity for every working day in range, even days with no bookings
+    doctors = Doctor.objects.all()
+    if doctor_ids:
+        doctors = doctors.filter(id__in=doctor_ids)
+    blocks = defaultdict(list)
+    for doc_id, wd, s, e in (DoctorWorkingHours.objects.filter(doctor__in=doctors, is_active=True)
+                             .values_list('doctor_id', 'weekdays', 'start_time', 'end_time')):
+        blocks[(doc_id, wd)].append((s, e))
+    unavail = defaultdict(list)
+    for doc_id, day, s, e in (DoctorUnavailability.objects.filter(doctor__in=doctors, date__range=(start, end))
+                              .values_list('doctor_id', 'date', 'start_time', 'end_time')):
+        unavail[(doc_id, day)].append((s, e))
+
+    doctor_list = list(doctors.values_list('id', flat=True))
+    day = start
+    while day <= end:
+        for doc_id in doctor_list:
+            b = blocks.get((doc_id, day.weekday()))
+            if b:
+                rows[(doc_id, day)]['capacity_minutes'] = capacity_from(b, unavail.get((doc_id, day), []))
+        day += timedelta(days=1)
+
+    with transaction.atomic():
+        existing = DoctorDailyStats.objects.filter(date__range=(start, end))
+        if doctor_ids:
+            existing = existing.filter(doctor_id__in=doctor_ids)
+        existing.delete()
+        DoctorDailyStats.objects.bulk_create(
+            [DoctorDailyStats(doctor_id=doc_id, date=day, **values) for (doc_id, day), values in rows.items()],
+            batch_size=2000,
+        )
+    return len(rows)
+
+
+def rebuild_windows(start, end, doctor_ids=None, window_days=31):
+    """rebuild() in windows of ``window_days``, one transaction each."""
+    written = 0
+    window = timedelta(days=window_days)
+    cur = start
+    while cur <= end:
+        stop = min(cur + window - timedelta(days=1), end)
+        written += rebuild(cur, stop, doctor_ids)
+        cur = stop + timedelta(days=1)
+    return written
+
+
+def totals(start, end, doctor_ids):
+    """
+    Counter totals per doctor over [start, end], read from the rollup:
+    {doctor_id: {'booked': ..., 'canceled': ..., 'no_show': ...}}. Doctors
+    with no rows in range are left out.
+    """
+    fields = ['booked', *STATUSES, 'visits', 'prescriptions']
+    rows = (DoctorDailyStats.objects
+            .filter(doctor_id__in=doctor_ids, date__range=(start, end))
+            .values('doctor_id')
+            .annotate(**{f: Sum(f) for f in fields}))
+    return {r.pop('doctor_id'): r for r in rows}
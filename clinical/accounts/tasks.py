@@ -0,0 +1,130 @@
+import time
+import traceback
+from datetime import timedelta
+
+from django.db import connections, router
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Task
+
+# Seconds before a failed task runs again: 30, 60, 120, ...
+RETRY_BASE_SECONDS = 30
+# A running task whose worker has not been heard from for this long is
+# assumed lost with its worker and queued again
+STALE_SECONDS = 300
+# Progress is written at most this often however often a job reports it
+PROGRESS_INTERVAL_SECONDS = 1.0
+
+_registry = {}
+
+
+def register(name=None):
+    """Decorator making ``fn(task, **args)`` runnable as a task called ``name`` (default: its own name)."""
+    def decorator(fn):
+        _registry[name or fn.__name__] = fn
+        return fn
+    return decorator
+
+
+def registered():
+    return sorted(_registry)
+
+
+def enqueue(name, args=None, run_after=None, max_attempts=3, created_by=None):
+    if name not in _registry:
+        raise ValueError(f"No task registered as {name!r}")
+    return Task.objects.create(name=name, args=args or {}, run_after=run_after or timezone.now(),
+                               max_attempts=max_attempts, created_by=created_by)
+
+
+def claim(worker, limit=1):
+    """
+    Mark up to ``limit`` due tasks as running for ``worker`` and return their
+    ids, oldest first. The pick and the claim are one UPDATE ... RETURNING,
+    so concurrent workers can never both get a task; the subquery walks the
+    partial task_due index, which is why its status test is a literal.
+    """
+    connection = connections[router.db_for_write(Task)]
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    table = Task._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE "{table}" SET "status" = \'running\', "worker" = %s, "attempts" = "attempts" + 1, '
+            f'"started_at" = %s, "heartbeat_at" = %s, "finished_at" = NULL '
+            f'WHERE "id" IN (SELECT "id" FROM "{table}" WHERE "status" = \'queued\' AND "run_after" <= %s '
+            f'ORDER BY "run_after", "id" LIMIT %s) RETURNING "id"',
+            [worker, now, now, now, limit],
+        )
+        return sorted(pk for pk, in cursor.fetchall())
+
+
+def heartbeat(worker, task_ids):
+    """Tell requeue_stale() that ``worker`` is still running these tasks."""
+    if task_ids:
+        Task.objects.filter(pk__in=task_ids, worker=worker, status='running').update(heartbeat_at=timezone.now())
+
+
+def report(task, done, total=None, note=None):
+    """
+    Record a job's progress for the admin; calls within
+    PROGRESS_INTERVAL_SECONDS of the last write are dropped, except the final one.
+    """
+    now = time.monotonic()
+    if now - getattr(task, '_reported_at', 0.0) < PROGRESS_INTERVAL_SECONDS and (total is None or done < total):
+        return
+    task._reported_at = now
+    # A job that reports progress is plainly alive, whatever its worker's heartbeat
+    fields = {'progress_done': done, 'heartbeat_at': timezone.now()}
+    if total is not None:
+        fields['progress_total'] = total
+    if note is not None:
+        fields['progress_note'] = note[:200]
+    Task.objects.filter(pk=task.pk).update(**fields)
+
+
+def record_failure(task_id, error):
+    """Queue the task again with exponential backoff, or mark it failed once attempts run out."""
+    task = Task.objects.only('attempts', 'max_attempts').get(pk=task_id)
+    now = timezone.now()
+    if task.attempts < task.max_attempts:
+        delay = timedelta(seconds=RETRY_BASE_SECONDS * 2 ** max(task.attempts - 1, 0))
+        Task.objects.filter(pk=task_id).update(status='queued', run_after=now + delay, last_error=error)
+        return 'retrying'
+    Task.objects.filter(pk=task_id).update(status='failed', finished_at=now, last_error=error)
+    return 'failed'
+
+
+def execute(task_id):
+    """
+    Run one claimed task and record the outcome ('done', 'retrying' or
+    'failed'). Called in a worker thread or process, so it leaves no
+    database connection open behind it.
+    """
+    try:
+        task = Task.objects.get(pk=task_id)
+        fn = _registry.get(task.name)
+        try:
+            if fn is None:
+                raise LookupError(f"No task registered as {task.name!r}")
+            result = fn(task, **task.args)
+        except Exception:
+            return record_failure(task_id, traceback.format_exc())
+        Task.objects.filter(pk=task_id).update(status='done', result=result, finished_at=timezone.now(),
+                                               last_error='')
+        return 'done'
+    finally:
+        connections.close_all()
+
+
+def requeue_stale(stale_seconds=STALE_SECONDS):
+    """
+    Running tasks whose worker stopped sending heartbeats go back to the
+    queue, or fail if that was their last attempt. Returns (requeued, failed).
+    """
+    now = timezone.now()
+    stale = Task.objects.filter(status='running', heartbeat_at__lt=now - timedelta(seconds=stale_seconds))
+    error = 'Worker stopped responding'
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(status='failed', finished_at=now, last_error=error)
+    requeued = stale.update(status='queued', run_after=now, last_error=error)
+    return requeued, failed
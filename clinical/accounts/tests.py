@@ -1,3 +1,1512 @@
-from django.test import TestCase
+import json
+import re
+import smtplib
+import tempfile
+import zlib
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.core import mail
+from django.core.exceptions import MiddlewareNotUsed, ValidationError
+from django.core.management import call_command
+from django.db import connection, router
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from . import (
+    allergies, analytics, archive, audit, billing, charts, documents, notifications, patient_import, pharmacy,
+    queues, scheduling, search, simulation, stats, tasks, vitals, waitlist,
+)
+from .forms import PrescriptionForm
+from .models import (
+    ACTIVE_APPOINTMENT, Appointment, ArchivedPatientVisit, ArchivedPrescription, ClinicalText, CustomUser, Doctor, DoctorDailyStats,
+    DoctorQueue, DoctorWorkingHours, Invoice, LedgerEntry, Notification, Patient, PatientChartSummary, PatientVisit,
+    Prescription, QueueToken, Staff, Task, WaitlistEntry,
+)
+from .profiling import ProfilingMiddleware
+from .routers import PIN_COOKIE, REPLICA_ALIAS, ReplicaRoutingMiddleware, read_from_replica
+from .signals import bulk_maintenance
+from .staticfiles import StaticFilesMiddleware
+
+# Pages render without a collectstatic manifest
+PLAIN_STATIC = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+COUNTERS = ['booked', 'pending', 'confirmed', 'canceled', 'completed', 'no_show',
+            'visits', 'prescriptions', 'capacity_minutes']
+
+
+def make_doctor(username='drtest'):
+    user = CustomUser.objects.create_user(username, password='x', role='doctor', first_name='Test', last_name='Doctor')
+    return Doctor.objects.create(user=user, specialization='General')
+
+
+def make_patient(username='pttest'):
+    user = CustomUser.objects.create_user(username, password='x', role='patient', first_name='Test', last_name='Patient')
+    return Patient.objects.create(user=user, gender='F', dob=date(1980, 5, 17), pincode='682001',
+                                  phone_number='9876543210')
+
+
+class DailyStatsTests(TestCase):
+    """Incremental DoctorDailyStats maintenance must agree with stats.rebuild()."""
+
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patient = make_patient()
+        self.day = date.today() + timedelta(days=7)
+        DoctorWorkingHours.objects.create(doctor=self.doctor, weekdays=self.day.weekday(),
+                                          start_time=time(9), end_time=time(13))
+
+    def book(self, at=time(9), status='confirmed'):
+        return Appointment.objects.create(doctor=self.doctor, patient=self.patient.user,
+                                          appointment_date=self.day, appointment_time=at, status=status)
+
+    def counters(self):
+        return DoctorDailyStats.objects.filter(doctor=self.doctor, date=self.day).values(*COUNTERS).first()
+
+    def assertMatchesRebuild(self):
+        incremental = self.counters()
+        stats.rebuild(self.day, self.day, [self.doctor.pk])
+        self.assertEqual(incremental, self.counters())
+
+    def test_create(self):
+        self.book()
+        self.book(time(9, 15), status='pending')
+        self.assertEqual(self.counters()['booked'], 2)
+        self.assertEqual(self.counters()['capacity_minutes'], 240)
+        self.assertMatchesRebuild()
+
+    def test_status_change(self):
+        appt = self.book()
+        appt.status = 'canceled'
+        appt.save()
+        self.assertEqual(self.counters()['confirmed'], 0)
+        self.assertEqual(self.counters()['canceled'], 1)
+        self.assertMatchesRebuild()
+
+    def test_reschedule_to_missing_row(self):
+        appt = self.book()
+        appt.appointment_date = self.day + timedelta(days=1)
+        appt.save()
+        self.assertEqual(self.counters()['booked'], 0)
+        moved = DoctorDailyStats.objects.get(doctor=self.doctor, date=appt.appointment_date)
+        self.assertEqual((moved.booked, moved.confirmed), (1, 1))
+        self.assertMatchesRebuild()
+
+    def test_delete(self):
+        self.book()
+        self.book(time(9, 15)).delete()
+        self.assertEqual(self.counters()['booked'], 1)
+        self.assertMatchesRebuild()
+
+    def test_visit_and_prescription(self):
+        appt = self.book()
+        visit = PatientVisit.objects.create(patient=self.patient, doctor=self.doctor, appointment=appt)
+        Prescription.objects.create(visit=visit, patient=self.patient, doctor=self.doctor, medicine_name='Paracetamol')
+        self.assertEqual(self.counters()['visits'], 1)
+        self.assertEqual(self.counters()['prescriptions'], 1)
+        self.assertMatchesRebuild()
+
+    def test_missing_row_is_rebuilt(self):
+        # History from before the rollup, or drift: the row is gone, and a
+        # -1 applied to a zero-created row would fail the counters' CHECKs
+        appt = self.book()
+        DoctorDailyStats.objects.all().delete()
+        appt.status = 'canceled'
+        appt.save()
+        self.assertEqual(self.counters()['booked'], 1)
+        self.assertEqual(self.counters()['canceled'], 1)
+        self.assertMatchesRebuild()
+
+    def test_bulk_maintenance_skips_rollup(self):
+        with bulk_maintenance():
+            self.book()
+        self.assertIsNone(self.counters())
+
+    def test_report_reads_rollup(self):
+        self.book(status='completed')
+        self.book(time(9, 15), status='no_show')
+        self.book(time(9, 30), status='canceled')
+        self.book(time(10), status='pending')
+        report = analytics.utilization_report(self.day, self.day, [self.doctor])
+        self.assertEqual((report['canceled'][0], report['attended'][0], report['no_show'][0]), (1, 1, 1))
+        self.assertEqual(report['booked'][0].sum(), 3)
+        self.assertEqual(report['booked'][0, self.day.weekday(), 9], 2)
+        # Counts come from the rollup, not the appointments
+        DoctorDailyStats.objects.update(canceled=5)
+        self.assertEqual(analytics.utilization_report(self.day, self.day, [self.doctor])['canceled'][0], 5)
+
+    @override_settings(STORAGES=PLAIN_STATIC)
+    def test_booked_heatmap(self):
+        other = make_doctor('drother')
+        next_day = self.day + timedelta(days=1)
+        self.book(time(9, 15))
+        Appointment.objects.create(doctor=other, patient=self.patient.user, appointment_date=next_day,
+                                   appointment_time=time(14, 45))
+        report = analytics.utilization_report(self.day, next_day, [other, self.doctor])
+        self.assertEqual([d.pk for d in report['doctors']], [self.doctor.pk, other.pk])
+        self.assertEqual(report['booked'][0, self.day.weekday(), 9], 1)
+        self.assertEqual(report['booked'][1, next_day.weekday(), 14], 1)
+        self.assertEqual(report['booked'].sum(), 2)
+        empty = analytics.utilization_report(self.day - timedelta(days=30), self.day - timedelta(days=1))
+        self.assertEqual(empty['booked'].sum(), 0)
+
+        self.client.force_login(CustomUser.objects.create_user('stafftest', password='x', role='staff'))
+        response = self.client.get(reverse('staff_utilization_report'),
+                                   {'start': self.day.isoformat(), 'end': next_day.isoformat()})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class StaffCheckInTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patient = make_patient()
+        staff = CustomUser.objects.create_user('stafftest', password='x', role='staff')
+        self.client.force_login(staff)
+
+    def check_in(self, status):
+        taken = Appointment.objects.count()
+        appt = Appointment.objects.create(doctor=self.doctor, patient=self.patient.user,
+                                          appointment_date=date.today() - timedelta(days=1),
+                                          appointment_time=time(10, 15 * taken), status=status)
+        response = self.client.post(reverse('staff_appointment_detail', args=[appt.pk]),
+                                    {'height_cm': '160', 'weight_kg': '60', 'blood_pressure': '120/80'})
+        appt.refresh_from_db()
+        return response, appt
+
+    def test_status_transitions(self):
+        for before, after in [('pending', 'confirmed'), ('confirmed', 'confirmed'),
+                              ('no_show', 'completed'), ('completed', 'completed')]:
+            with self.subTest(before=before):
+                response, appt = self.check_in(before)
+                self.assertRedirects(response, reverse('staff_dashboard'), fetch_redirect_response=False)
+                self.assertEqual(appt.status, after)
+                self.assertTrue(PatientVisit.objects.filter(appointment=appt).exists())
+
+    def test_canceled_is_refused(self):
+        response, appt = self.check_in('canceled')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(appt.status, 'canceled')
+        self.assertFalse(PatientVisit.objects.filter(appointment=appt).exists())
+
+
+class CloseOutTests(TestCase):
+    def test_close_out(self):
+        doctor, patient = make_doctor(), make_patient()
+        day = date.today() - timedelta(days=2)
+        appts = {status: Appointment.objects.create(doctor=doctor, patient=patient.user, appointment_date=day,
+                                                    appointment_time=time(9, 15 * n), status=status)
+                 for n, status in enumerate(['pending', 'confirmed', 'canceled'])}
+        PatientVisit.objects.create(patient=patient, doctor=doctor, appointment=appts['pending'])
+        self.assertEqual(scheduling.close_out(date.today()), (1, 1))
+        self.assertEqual(scheduling.close_out(date.today()), (0, 0))
+        statuses = {before: Appointment.objects.get(pk=a.pk).status for before, a in appts.items()}
+        self.assertEqual(statuses, {'pending': 'completed', 'confirmed': 'no_show', 'canceled': 'canceled'})
+        row = DoctorDailyStats.objects.get(doctor=doctor, date=day)
+        self.assertEqual((row.pending, row.confirmed, row.completed, row.no_show), (0, 0, 1, 1))
+
+    def test_active_filter_uses_partial_index(self):
+        active = Appointment.objects.filter(ACTIVE_APPOINTMENT, appointment_date__lt=date.today())
+        sql, params = active.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('appt_active_date', plan)
+
+
+
+class ImmediateWriteTests(TransactionTestCase):
+    """Bookings and check-ins take the SQLite write lock when their transaction opens."""
+
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patient = make_patient()
+        self.day = date.today() + timedelta(days=7)
+        DoctorWorkingHours.objects.create(doctor=self.doctor, weekdays=self.day.weekday(),
+                                          start_time=time(9), end_time=time(13))
+
+    def begins(self, queries):
+        return [q['sql'] for q in queries if q['sql'].startswith('BEGIN')]
+
+    def test_transaction_mode(self):
+        self.assertEqual(connection.settings_dict['OPTIONS'].get('transaction_mode'), 'IMMEDIATE')
+
+    def test_booking(self):
+        self.client.force_login(self.patient.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('book_appointment'), {
+                'action': 'book', 'doctor_id': self.doctor.pk, 'date': self.day.isoformat(), 'time': '09:30',
+            })
+        self.assertRedirects(response, reverse('patient_dashboard'), fetch_redirect_response=False)
+        sql = [q['sql'] for q in ctx.captured_queries]
+        self.assertEqual(self.begins(ctx.captured_queries), ['BEGIN IMMEDIATE'])
+        # The lock is held before the availability checks read anything
+        checks = next(i for i, q in enumerate(sql) if 'accounts_doctorworkinghours' in q)
+        self.assertLess(sql.index('BEGIN IMMEDIATE'), checks)
+        self.assertTrue(Appointment.objects.filter(patient=self.patient.user, appointment_time=time(9, 30)).exists())
+
+    def test_check_in(self):
+        appt = Appointment.objects.create(doctor=self.doctor, patient=self.patient.user,
+                                          appointment_date=date.today(), appointment_time=time(9), status='confirmed')
+        self.client.force_login(CustomUser.objects.create_user('stafftest', password='x', role='staff'))
+        # Committed audit entries are append-only and would stop the table flush
+        with CaptureQueriesContext(connection) as ctx, mock.patch.object(audit, 'record'):
+            self.client.post(reverse('staff_appointment_detail', args=[appt.pk]),
+                             {'height_cm': '160', 'weight_kg': '60', 'blood_pressure': '120/80'})
+        self.assertTrue(PatientVisit.objects.filter(appointment=appt).exists())
+        begins = self.begins(ctx.captured_queries)
+        self.assertTrue(begins)
+        self.assertEqual(set(begins), {'BEGIN IMMEDIATE'})
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class BillingTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.doctor.consultation_fee = Decimal('500.00')
+        self.doctor.save()
+        self.patient = make_patient()
+        self.day = date.today() - timedelta(days=1)
+        for minute in (0, 15):
+            appt = Appointment.objects.create(doctor=self.doctor, patient=self.patient.user, appointment_date=self.day,
+                                              appointment_time=time(10, minute), status='completed')
+            PatientVisit.objects.create(patient=self.patient, doctor=self.doctor, appointment=appt)
+
+    def balance(self):
+        self.patient.refresh_from_db()
+        return self.patient.balance
+
+    def test_generate_invoices_is_idempotent(self):
+        invoices = billing.generate_invoices(self.day)
+        self.assertEqual(len(invoices), 2)
+        self.assertEqual(billing.generate_invoices(self.day), [])
+        self.assertEqual(Invoice.objects.count(), 2)
+        self.assertEqual(LedgerEntry.objects.filter(kind='charge').count(), 2)
+        self.assertEqual(self.balance(), Decimal('1000.00'))
+
+    def test_post_entry_keeps_running_balance(self):
+        invoice = billing.generate_invoices(self.day)[0]
+        billing.post_entry(self.patient, 'payment', Decimal('200.00'), invoice=invoice)
+        self.assertEqual(self.balance(), Decimal('800.00'))
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.status, 'open')
+        entry = billing.post_entry(self.patient, 'payment', Decimal('500.00'), invoice=invoice)
+        self.assertEqual(entry.amount, Decimal('-500.00'))
+        billing.post_entry(self.patient, 'adjustment', Decimal('25.50'))
+        self.assertEqual(self.balance(), Decimal('325.50'))
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.status, 'paid')
+        last = LedgerEntry.objects.latest('id')
+        self.assertEqual(last.balance_after, self.balance())
+
+    def test_split_payments_settle_invoice(self):
+        invoice = billing.generate_invoices(self.day)[0]
+        for amount in ('200.00', '300.00'):
+            billing.post_entry(self.patient, 'payment', Decimal(amount), invoice=invoice)
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.status, 'paid')
+        self.assertEqual(self.balance(), Decimal('500.00'))
+
+    def test_overpayment_settles_invoice(self):
+        first, second = billing.generate_invoices(self.day)
+        billing.post_entry(self.patient, 'payment', Decimal('650.00'), invoice=first)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, second.status), ('paid', 'open'))
+        self.assertEqual(self.balance(), Decimal('350.00'))
+
+    def test_desk_posts_credit(self):
+        user = CustomUser.objects.create_user('billtest', password='x', role='staff')
+        Staff.objects.create(user=user, staff_role='billing')
+        self.client.force_login(user)
+        self.client.post(reverse('billing_dashboard'),
+                         {'patient_id': self.patient.pk, 'amount': '40', 'action': 'credit', 'note': 'Write-off'})
+        entry = LedgerEntry.objects.get()
+        self.assertEqual((entry.kind, entry.amount), ('adjustment', Decimal('-40.00')))
+        self.assertEqual(self.balance(), Decimal('-40.00'))
+
+    def test_desk_rejects_non_finite_amounts(self):
+        user = CustomUser.objects.create_user('billtest', password='x', role='staff')
+        Staff.objects.create(user=user, staff_role='billing')
+        self.client.force_login(user)
+        url = reverse('billing_dashboard')
+        for amount in ['NaN', 'Infinity', '-Infinity', '0', '-5', '1.005', 'abc']:
+            with self.subTest(amount=amount):
+                response = self.client.post(url, {'patient_id': self.patient.pk, 'amount': amount})
+                self.assertEqual(response.status_code, 302)
+        self.assertFalse(LedgerEntry.objects.exists())
+        self.client.post(url, {'patient_id': self.patient.pk, 'amount': '12.5', 'action': 'adjust'})
+        self.assertEqual(self.balance(), Decimal('12.50'))
+
+
+@override_settings(REPLICA_STICKY_SECONDS=30, REPLICA_READ_VIEWS=['staff_dashboard'])
+@mock.patch('accounts.routers.replica_configured', return_value=True)
+class ReplicaRoutingTests(SimpleTestCase):
+    def handle(self, request):
+        """Run ``request`` through the middleware; returns (response, db the view read from)."""
+        seen = {}
+
+        def view(request):
+            seen['db'] = router.db_for_read(Appointment)
+            seen['users'] = router.db_for_read(CustomUser)
+            return HttpResponse()
+
+        def get_response(request):
+            request.resolver_match = resolve(request.path)
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        response = middleware(request)
+        self.assertEqual(router.db_for_read(Appointment), 'default')
+        return response, seen
+
+    def test_reads_from_replica(self, _):
+        response, seen = self.handle(RequestFactory().get(reverse('staff_dashboard')))
+        self.assertEqual(seen, {'db': REPLICA_ALIAS, 'users': 'default'})
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_write_pins_to_primary(self, _):
+        response, seen = self.handle(RequestFactory().post(reverse('staff_dashboard')))
+        self.assertEqual(seen['db'], 'default')
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 30)
+
+        request = RequestFactory().get(reverse('staff_dashboard'))
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        _, seen = self.handle(request)
+        self.assertEqual(seen['db'], 'default')
+
+    def test_other_views_use_primary(self, _):
+        _, seen = self.handle(RequestFactory().get(reverse('staff_utilization_report')))
+        self.assertEqual(seen['db'], 'default')
+
+    def test_read_from_replica(self, _):
+        with read_from_replica():
+            self.assertEqual(router.db_for_read(Appointment), REPLICA_ALIAS)
+            self.assertEqual(router.db_for_write(Appointment), 'default')
+        self.assertEqual(router.db_for_read(Appointment), 'default')
+
+
+class PharmacyTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patient = make_patient()
+        self.visit = PatientVisit.objects.create(patient=self.patient, doctor=self.doctor)
+        for name in ('Amoxicillin 500 mg', 'Paracetamol 650 mg'):
+            Prescription.objects.create(visit=self.visit, patient=self.patient, doctor=self.doctor, medicine_name=name)
+        self.first = CustomUser.objects.create_user('pharm1', password='x', role='staff')
+        self.second = CustomUser.objects.create_user('pharm2', password='x', role='staff')
+
+    def test_claim_is_exclusive(self):
+        self.assertEqual(pharmacy.claim_visit(self.visit.pk, self.first), 2)
+        self.assertEqual(pharmacy.claim_visit(self.visit.pk, self.second), 0)
+        self.assertEqual(pharmacy.claim_visit(self.visit.pk, self.first), 0)
+        self.assertEqual(pharmacy.release_visit(self.visit.pk, self.second), 0)
+        self.assertEqual(pharmacy.dispense_visit(self.visit.pk, self.second), 0)
+        self.assertEqual(set(Prescription.objects.values_list('claimed_by', flat=True)), {self.first.pk})
+
+    def test_dispense_leaves_queue(self):
+        pharmacy.claim_visit(self.visit.pk, self.first)
+        self.assertEqual(pharmacy.dispense_visit(self.visit.pk, self.first), 2)
+        self.assertEqual(pharmacy.open_queue(), [])
+        self.assertEqual(pharmacy.claim_visit(self.visit.pk, self.second), 0)
+
+    def test_queue_reads_partial_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            pharmacy.open_queue()
+        sql = queries[0]['sql']
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('rx_dispense_queue', plan)
+        # Visits are only looked up by key; the sort covers undispensed rows alone
+        self.assertNotIn('SCAN accounts_patientvisit', plan)
+
+    def test_queue_by_visit_age_and_whole_visits(self):
+        newer = self.visit
+        older = PatientVisit.objects.create(patient=self.patient, doctor=self.doctor)
+        PatientVisit.objects.filter(pk=older.pk).update(created_at=newer.created_at - timedelta(hours=1))
+        Prescription.objects.create(visit=older, patient=self.patient, doctor=self.doctor, medicine_name='Cetirizine')
+        queue = pharmacy.open_queue()
+        self.assertEqual([(visit_id, len(items)) for visit_id, items in queue], [(older.pk, 1), (newer.pk, 2)])
+        # The limit counts visits, so a visit's prescriptions are never split
+        self.assertEqual([(visit_id, len(items)) for visit_id, items in pharmacy.open_queue(limit=1)], [(older.pk, 1)])
+        Prescription.objects.filter(visit=older).update(dispense_status='dispensed')
+        self.assertEqual([(visit_id, len(items)) for visit_id, items in pharmacy.open_queue(limit=1)], [(newer.pk, 2)])
+
+    def test_claim_and_dispense_are_audited(self):
+        request = RequestFactory().post('/')
+        request.user = self.first
+        middleware = audit.AuditMiddleware(lambda r: (pharmacy.claim_visit(self.visit.pk, r.user),
+                                                       pharmacy.dispense_visit(self.visit.pk, r.user)))
+        with self.captureOnCommitCallbacks(execute=True):
+            middleware(request)
+        rx = Prescription.objects.filter(visit=self.visit).first()
+        entries = list(audit.history(rx))
+        self.assertEqual([e.changes for e in entries], [
+            {'dispense_status': ['claimed', 'dispensed'], 'dispensed_by_id': [None, self.first.pk]},
+            {'dispense_status': ['pending', 'claimed'], 'claimed_by_id': [None, self.first.pk]},
+        ])
+        self.assertEqual({e.user_id for e in entries}, {self.first.pk})
+
+
+class TaskQueueTests(TestCase):
+    def test_claim_is_exclusive(self):
+        due = [Task.objects.create(name='noop').pk for _ in range(3)]
+        Task.objects.create(name='noop', run_after=timezone.now() + timedelta(hours=1))
+        first = tasks.claim('worker-1', limit=2)
+        second = tasks.claim('worker-2', limit=5)
+        self.assertEqual(first, due[:2])
+        self.assertEqual(second, due[2:])
+        self.assertEqual(tasks.claim('worker-3', limit=5), [])
+        self.assertEqual(Task.objects.filter(status='running', attempts=1).count(), 3)
+
+    def test_record_failure_backs_off_then_fails(self):
+        task = Task.objects.create(name='noop', max_attempts=3)
+        for attempt, delay in [(1, 30), (2, 60)]:
+            Task.objects.filter(pk=task.pk).update(run_after=timezone.now())
+            self.assertEqual(tasks.claim('worker'), [task.pk])
+            before = timezone.now()
+            self.assertEqual(tasks.record_failure(task.pk, 'boom'), 'retrying')
+            task.refresh_from_db()
+            self.assertEqual((task.status, task.attempts), ('queued', attempt))
+            self.assertAlmostEqual((task.run_after - before).total_seconds(), delay, delta=5)
+            self.assertEqual(tasks.claim('worker'), [])
+        Task.objects.filter(pk=task.pk).update(run_after=timezone.now())
+        tasks.claim('worker')
+        self.assertEqual(tasks.record_failure(task.pk, 'boom'), 'failed')
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.last_error), ('failed', 'boom'))
+        self.assertIsNotNone(task.finished_at)
+
+    def test_requeue_stale(self):
+        long_ago = timezone.now() - timedelta(seconds=tasks.STALE_SECONDS + 60)
+        lost = Task.objects.create(name='noop', status='running', attempts=1, heartbeat_at=long_ago)
+        spent = Task.objects.create(name='noop', status='running', attempts=3, heartbeat_at=long_ago)
+        alive = Task.objects.create(name='noop', status='running', attempts=1, heartbeat_at=long_ago)
+        tasks.report(alive, 5, 10)
+        self.assertEqual(tasks.requeue_stale(), (1, 1))
+        statuses = dict(Task.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {lost.pk: 'queued', spent.pk: 'failed', alive.pk: 'running'})
+
+
+class AuditTests(TestCase):
+    def setUp(self):
+        self.visit = PatientVisit.objects.create(patient=make_patient(), doctor=make_doctor(),
+                                                 weight_kg=Decimal('65'), blood_pressure='120/80')
+
+    def save(self, **values):
+        with self.captureOnCommitCallbacks(execute=True):
+            for name, value in values.items():
+                setattr(self.visit, name, value)
+            self.visit.save()
+        return audit.history(self.visit).first()
+
+    def test_changes_are_type_consistent(self):
+        entry = self.save(weight_kg=71, blood_pressure='130/85')
+        entry.refresh_from_db()
+        self.assertEqual(entry.action, 'update')
+        self.assertEqual(entry.changes, {'weight_kg': ['65.00', '71.00'], 'blood_pressure': ['120/80', '130/85']})
+
+    def test_equal_values_are_not_changes(self):
+        before = audit.history(self.visit).count()
+        self.save(weight_kg=65.0)
+        self.save(weight_kg='65.000')
+        self.assertEqual(audit.history(self.visit).count(), before)
+
+
+class SearchBackfillTests(TestCase):
+    def test_counts_only_added_rows(self):
+        patient, doctor = make_patient(), make_doctor()
+        visits = [PatientVisit.objects.create(patient=patient, doctor=doctor, symptoms=f"cough day {n}")
+                  for n in range(3)]
+        PatientVisit.objects.create(patient=patient, doctor=doctor)
+        self.assertEqual(search.backfill_batch('visits', 0, 10), (visits[-1].pk + 1, 0))
+        ClinicalText.objects.filter(kind='visit', object_id=visits[1].pk).delete()
+        self.assertEqual(search.backfill_batch('visits', 0, 10)[1], 1)
+        self.assertEqual(ClinicalText.objects.filter(kind='visit').count(), 3)
+
+
+
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.out_dir = Path(tmp.name)
+
+    def middleware(self, **options):
+        options = {'PROFILING_ENABLED': True, 'PROFILING_DIR': self.out_dir, 'PROFILING_SAMPLE_RATE': 1.0,
+                   **options}
+
+        def view(request):
+            CustomUser.objects.count()
+            return HttpResponse('ok')
+
+        with self.settings(**options):
+            return ProfilingMiddleware(view)
+
+    def request(self):
+        request = RequestFactory().get('/doctor/dashboard/')
+        request.resolver_match = resolve(reverse('doctor_dashboard'))
+        return request
+
+    def test_captures_in_the_same_millisecond_are_kept_apart(self):
+        middleware = self.middleware()
+        with mock.patch('accounts.profiling.time.time', return_value=1767225600.25):
+            middleware(self.request())
+            middleware(self.request())
+        captures = sorted(self.out_dir.glob('*.json'))
+        self.assertEqual(len(captures), 2)
+        self.assertEqual(len(list(self.out_dir.glob('*.folded'))), 2)
+        meta = json.loads(captures[0].read_text())
+        self.assertEqual((meta['view'], meta['status'], meta['reason']), ('doctor_dashboard', 200, 'sampled'))
+        self.assertTrue(any('accounts_customuser' in q['sql'] for q in meta['queries']))
+
+    def test_keeps_slow_requests_and_rotates(self):
+        middleware = self.middleware(PROFILING_SAMPLE_RATE=0, PROFILING_SLOW_MS=0, PROFILING_MAX_FILES=3)
+        for _ in range(5):
+            middleware(self.request())
+        self.assertEqual(len(list(self.out_dir.glob('*.folded'))), 3)
+        self.assertEqual(len(list(self.out_dir.glob('*.json'))), 3)
+        meta = json.loads(next(self.out_dir.glob('*.json')).read_text())
+        self.assertEqual(meta['reason'], 'slow')
+
+    def test_not_used_unless_enabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            self.middleware(PROFILING_ENABLED=False)
+
+
+class StaticFilesMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        (self.root / 'site.css').write_text('body{}')
+        (self.root / 'site.0123456789ab.css').write_text('body{}')
+        (self.root / 'staticfiles.json').write_text(json.dumps({'paths': {'site.css': 'site.0123456789ab.css'}}))
+
+    def middleware(self):
+        with self.settings(STATIC_ROOT=self.root, STATIC_URL='/static/'):
+            return StaticFilesMiddleware(lambda request: HttpResponse('app'))
+
+    def test_serves_collected_files(self):
+        middleware = self.middleware()
+        response = middleware(RequestFactory().get('/static/site.0123456789ab.css'))
+        self.assertEqual(b''.join(response.streaming_content), b'body{}')
+        self.assertIn('immutable', response['Cache-Control'])
+        response.close()
+        response = middleware(RequestFactory().get('/static/site.css'))
+        self.assertNotIn('immutable', response['Cache-Control'])
+        response.close()
+        self.assertEqual(middleware(RequestFactory().get('/static/missing.css')).content, b'app')
+
+    def test_not_used_in_debug(self):
+        with self.settings(DEBUG=True), self.assertRaises(MiddlewareNotUsed):
+            self.middleware()
+
+
+class PrescriptionPdfTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.enterContext(self.settings(DOCUMENT_CACHE_DIR=Path(tmp.name)))
+        doctor = make_doctor()
+        self.visit = PatientVisit.objects.create(patient=make_patient(), doctor=doctor)
+        Prescription.objects.create(visit=self.visit, patient=self.visit.patient, doctor=doctor,
+                                    medicine_name='Amoxicillin 500 mg')
+        self.client.force_login(doctor.user)
+        self.url = reverse('prescription_pdf', args=[self.visit.pk])
+
+    def fetch(self, **headers):
+        return self.client.get(self.url, headers=headers)
+
+    def test_served_then_not_modified(self):
+        response = self.fetch()
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response.getvalue().startswith(b'%PDF-'))
+        self.assertEqual(self.fetch(If_None_Match=response['ETag']).status_code, 304)
+
+    def test_document_dropped_before_open(self):
+        # get() hands out a version that a concurrent render then unlinks
+        real_get = documents.get
+        calls = []
+
+        def racing_get(visit_id):
+            path, key = real_get(visit_id)
+            if not calls:
+                path.unlink()
+            calls.append(key)
+            return path, key
+
+        with mock.patch.object(documents, 'get', racing_get):
+            response = self.fetch()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(calls), 2)
+        self.assertTrue(response.getvalue().startswith(b'%PDF-'))
+
+    def test_open_current_gives_up_after_one_retry(self):
+        real_get = documents.get
+
+        def always_dropped(visit_id):
+            path, key = real_get(visit_id)
+            path.unlink()
+            return path, key
+
+        with mock.patch.object(documents, 'get', always_dropped), self.assertRaises(FileNotFoundError):
+            documents.open_current(self.visit.pk)
+        self.assertIsNone(documents.open_current(self.visit.pk + 100))
+
+    def test_only_the_treating_doctor(self):
+        self.client.force_login(make_doctor('drother').user)
+        self.assertEqual(self.fetch().status_code, 404)
+        self.client.force_login(self.visit.patient.user)
+        self.assertEqual(self.fetch().status_code, 200)
+        self.client.force_login(make_patient('ptother').user)
+        self.assertEqual(self.fetch().status_code, 404)
+        pharmacist = CustomUser.objects.create_user('rxpdf', password='x', role='staff')
+        Staff.objects.create(user=pharmacist, staff_role='pharmacist')
+        self.client.force_login(pharmacist)
+        self.assertEqual(self.fetch().status_code, 200)
+
+    def test_cache_key(self):
+        key = documents.cache_key(self.visit.pk)
+        self.assertEqual(documents.cache_key(self.visit.pk), key)
+        self.assertIsNone(documents.cache_key(self.visit.pk + 100))
+
+        rx = self.visit.prescriptions.get()
+        rx.dosage = '1 tablet'
+        rx.save()
+        edited = documents.cache_key(self.visit.pk)
+        self.assertNotEqual(edited, key)
+        # Names live on CustomUser, which has no timestamp
+        CustomUser.objects.filter(pk=self.visit.doctor.user_id).update(last_name='Renamed')
+        renamed = documents.cache_key(self.visit.pk)
+        self.assertNotEqual(renamed, edited)
+        with mock.patch.object(documents, 'LAYOUT_VERSION', documents.LAYOUT_VERSION + 1):
+            self.assertNotEqual(documents.cache_key(self.visit.pk), renamed)
+
+    def test_render_replaces_superseded_versions(self):
+        first, old_key = documents.get(self.visit.pk)
+        Prescription.objects.create(visit=self.visit, patient=self.visit.patient, doctor=self.visit.doctor,
+                                    medicine_name='Cetirizine')
+        second, new_key = documents.get(self.visit.pk)
+        self.assertNotEqual(new_key, old_key)
+        self.assertFalse(first.exists())
+        self.assertEqual(list(second.parent.glob('*')), [second])
+
+    def test_build(self):
+        visit = PatientVisit.objects.select_related('patient__user', 'doctor__user').get(pk=self.visit.pk)
+        visit.blood_pressure = '120/80'
+        visit.symptoms = 'Fever (3 days)'
+        prescriptions = [Prescription(medicine_name=f"Medicine {n}", dosage='1 tablet', duration_days=5,
+                                      notes='After food. ' * 20) for n in range(12)]
+        body = documents.build(visit, prescriptions)
+        self.assertEqual(body, documents.build(visit, prescriptions))
+        self.assertIn(b'/Count 2', body)
+        text = b''.join(zlib.decompress(stream)
+                        for stream in re.findall(rb'stream\n(.*?)\nendstream', body, re.S))
+        for expected in (b'(PRESCRIPTION)', b'(BP 120/80)', b'Fever \\(3 days\\)', b'(Medicine 11)',
+                         b'(1 tablet, for 5 days)', b'(Dr. Test Doctor)'):
+            self.assertIn(expected, text)
+        self.assertIn(b'No medicines prescribed.', zlib.decompress(
+            re.search(rb'stream\n(.*?)\nendstream', documents.build(visit, []), re.S).group(1)))
+
+
+class WaitlistTests(TestCase):
+    """A canceled slot is booked, pending, for the first waitlist entry that accepts it."""
+
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.day = date.today() + timedelta(days=7)
+        DoctorWorkingHours.objects.create(doctor=self.doctor, weekdays=self.day.weekday(),
+                                          start_time=time(9), end_time=time(13))
+        self.owner = make_patient()
+        self.appt = Appointment.objects.create(doctor=self.doctor, patient=self.owner.user, appointment_date=self.day,
+                                               appointment_time=time(10), status='confirmed')
+
+    def join(self, username, **window):
+        user = make_patient(username).user
+        window.setdefault('doctor', self.doctor)
+        window.setdefault('earliest_date', self.day - timedelta(days=3))
+        window.setdefault('latest_date', self.day + timedelta(days=3))
+        return WaitlistEntry.objects.create(patient=user, **window)
+
+    def cancel(self):
+        self.client.force_login(self.owner.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('cancel_appointment', args=[self.appt.pk]))
+        self.appt.refresh_from_db()
+        self.assertEqual(self.appt.status, 'canceled')
+
+    def test_cancel_books_longest_waiting(self):
+        later = self.join('ptlater', earliest_date=self.day - timedelta(days=1))
+        first = self.join('ptfirst')
+        self.cancel()
+        first.refresh_from_db()
+        later.refresh_from_db()
+        self.assertEqual(first.status, 'offered')
+        self.assertEqual(later.status, 'waiting')
+        self.assertEqual((first.appointment.patient, first.appointment.status), (first.patient, 'pending'))
+        self.assertEqual((first.appointment.appointment_date, first.appointment.appointment_time), (self.day, time(10)))
+        self.assertTrue(Notification.objects.filter(kind='offered', recipient=first.patient,
+                                                    appointment=first.appointment).exists())
+
+    def test_doctor_entries_before_specialization(self):
+        anyone = self.join('ptanyone', doctor=None, specialization='General',
+                           earliest_date=self.day - timedelta(days=10))
+        named = self.join('ptnamed')
+        self.assertEqual(waitlist.candidates(self.appt), [named, anyone])
+
+    def test_window_and_busy_patients_skipped(self):
+        self.join('ptmorning', latest_time=time(9, 30))
+        self.join('ptexpired', earliest_date=self.day - timedelta(days=5), latest_date=self.day - timedelta(days=1))
+        busy = self.join('ptbusy')
+        Appointment.objects.create(doctor=self.doctor, patient=busy.patient, appointment_date=self.day,
+                                   appointment_time=time(11))
+        self.assertEqual(waitlist.candidates(self.appt), [])
+        self.cancel()
+        self.assertFalse(WaitlistEntry.objects.exclude(status='waiting').exists())
+
+    def test_withdrawn_entry_not_offered(self):
+        entry = self.join('ptgone')
+        self.client.force_login(entry.patient)
+        self.client.post(reverse('withdraw_waitlist', args=[entry.pk]))
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'withdrawn')
+        self.cancel()
+        self.assertEqual(Appointment.objects.filter(patient=entry.patient).count(), 0)
+
+    def test_past_slot_not_offered(self):
+        entry = self.join('ptlate')
+        Appointment.objects.filter(pk=self.appt.pk).update(status='canceled',
+                                                           appointment_date=date.today() - timedelta(days=1))
+        self.assertIsNone(waitlist.offer_slot(self.appt.pk))
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'waiting')
+
+    def test_failed_booking_moves_to_next_candidate(self):
+        first, second = self.join('ptone'), self.join('pttwo', earliest_date=self.day)
+        real_book = waitlist.book_slot
+
+        def refuse_first(doctor, patient_user, *args, **kwargs):
+            if patient_user == first.patient:
+                raise ValidationError('not bookable')
+            return real_book(doctor, patient_user, *args, **kwargs)
+
+        with mock.patch.object(waitlist, 'book_slot', refuse_first):
+            self.cancel()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, first.appointment), ('waiting', None))
+        self.assertEqual(second.status, 'offered')
+        self.assertEqual(second.appointment.patient, second.patient)
+
+    def test_slot_taken_again(self):
+        entry = self.join('ptslow')
+        Appointment.objects.filter(pk=self.appt.pk).update(status='canceled')
+        Appointment.objects.create(doctor=self.doctor, patient=make_patient('ptfast').user,
+                                   appointment_date=self.day, appointment_time=time(10))
+        with mock.patch.object(Appointment, 'clean'):
+            self.assertIsNone(waitlist.offer_slot(self.appt.pk))
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'waiting')
+
+
+class RefusingConnection:
+    """Mail connection whose every send fails."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def send_messages(self, messages):
+        raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+
+    def close(self):
+        pass
+
+
+class NotificationTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patient = make_patient()
+        self.patient.user.email = 'patient@example.com'
+        self.patient.user.save()
+        self.day = date.today() + timedelta(days=3)
+
+    def book(self, at=time(9), status='confirmed', patient=None):
+        return Appointment.objects.create(doctor=self.doctor, patient=(patient or self.patient).user,
+                                          appointment_date=self.day, appointment_time=at, status=status)
+
+    def test_outbox_delivery(self):
+        n = notifications.enqueue('booked', self.book())
+        self.assertEqual(notifications.deliver_batch(), (1, 0, 0))
+        n.refresh_from_db()
+        self.assertEqual((n.status, n.attempts), ('sent', 1))
+        self.assertEqual(mail.outbox[0].to, ['patient@example.com'])
+        self.assertEqual(notifications.deliver_batch(), (0, 0, 0))
+
+    def test_skips_without_email_or_appointment(self):
+        no_email = make_patient('ptnomail')
+        notifications.enqueue('booked', self.book(patient=no_email))
+        gone = notifications.enqueue('booked', self.book(at=time(10)))
+        Appointment.objects.filter(pk=gone.appointment_id).delete()
+        self.assertEqual(notifications.deliver_batch(), (0, 0, 2))
+        self.assertEqual(mail.outbox, [])
+
+    def test_retry_backoff(self):
+        n = notifications.enqueue('booked', self.book())
+        for attempt in range(1, notifications.MAX_ATTEMPTS + 1):
+            started = timezone.now()
+            self.assertEqual(notifications.deliver_batch(connection=RefusingConnection()), (0, 1, 0))
+            n.refresh_from_db()
+            self.assertEqual(n.attempts, attempt)
+            delay = n.available_at - started
+            self.assertGreaterEqual(delay, timedelta(seconds=notifications.RETRY_BASE_SECONDS * 2 ** (attempt - 1)))
+            self.assertLess(delay, timedelta(seconds=notifications.RETRY_BASE_SECONDS * 2 ** (attempt - 1) + 5))
+            # Not due until the backoff has passed
+            self.assertEqual(notifications.deliver_batch(connection=RefusingConnection()), (0, 0, 0))
+            Notification.objects.filter(pk=n.pk).update(available_at=timezone.now())
+        self.assertEqual((n.status, n.last_error), ('failed', 'Connection unexpectedly closed'))
+
+    def test_reminders_queued_once(self):
+        reminded = self.book()
+        self.book(at=time(10), status='canceled')
+        self.book(at=time(11), status='pending', patient=make_patient('ptother'))
+        self.assertEqual(notifications.queue_reminders(self.day), 2)
+        self.assertEqual(notifications.queue_reminders(self.day), 0)
+        self.book(at=time(12), patient=make_patient('ptlate'))
+        self.assertEqual(notifications.queue_reminders(self.day), 1)
+        self.assertEqual(Notification.objects.filter(kind='reminder').count(), 3)
+
+        subject, body = notifications.compose(Notification.objects.get(appointment=reminded))
+        self.assertNotIn('tomorrow', subject + body)
+        self.assertIn(f"{self.day:%A %d %B %Y} at 09:00", body)
+
+
+class SimulationTests(TestCase):
+    # Mondays 9:00-10:00, four 15-minute slots
+    BASE = {'name': 'current', 'consultation_duration_min': 15, 'max_daily_appointments': None,
+            'blocks': {0: [(9 * 60, 10 * 60)]}}
+    MONDAY = date(2026, 10, 5).toordinal()
+
+    def test_capacity_with_time_off(self):
+        closed = np.array([self.MONDAY + 7], dtype=np.int64)
+        # 9:15-9:30 blocks the 9:15 and 9:30 slots, as compute_slots does
+        partial = np.array([(self.MONDAY, 9 * 60 + 15, 9 * 60 + 30)], dtype=np.int64)
+        cap = simulation.daily_capacity(self.BASE, self.MONDAY, 15, closed, partial)
+        self.assertEqual(cap.tolist(), [2, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 4])
+        capped = dict(self.BASE, max_daily_appointments=3)
+        self.assertEqual(simulation.daily_capacity(capped, self.MONDAY, 1, closed, partial).tolist(), [2])
+        self.assertEqual(simulation.daily_capacity(capped, self.MONDAY, 1, closed[:0]).tolist(), [3])
+
+    def test_moved_and_lost(self):
+        # Six requests for one Monday: four fit, one moves to the next Monday (where
+        # time off leaves a single slot) and one is lost
+        demand = {
+            'requested': np.full(6, self.MONDAY - 1, dtype=np.int64),
+            'wanted': np.full(6, self.MONDAY, dtype=np.int64),
+            'closed': np.array([], dtype=np.int64),
+            'partial': np.array([(self.MONDAY + 7, 9 * 60, 9 * 60 + 40)], dtype=np.int64),
+        }
+        r = simulation.simulate(demand, self.BASE, horizon_days=7)
+        self.assertEqual((r['served'], r['moved'], r['lost'], r['turn_away_days']), (5, 1, 1, 1))
+
+    def test_variants_skip_base(self):
+        self.assertEqual(simulation.variants(self.BASE), [])
+        names = [v['name'] for v in simulation.variants(self.BASE, durations=[15, 20], extend_minutes=[30])]
+        self.assertEqual(names, ['15min +30m', '20min', '20min +30m'])
+
+    def test_command(self):
+        doctor, patient = make_doctor(), make_patient()
+        DoctorWorkingHours.objects.create(doctor=doctor, weekdays=0, start_time=time(9), end_time=time(10))
+        day = date.today() + timedelta(days=7 - date.today().weekday())
+        for n in range(5):
+            Appointment.objects.create(doctor=doctor, patient=patient.user, appointment_date=day,
+                                       appointment_time=time(9, 10 * n))
+        out = StringIO()
+        call_command('simulate_capacity', doctor.pk, durations='10', workers=1, stdout=out)
+        rows = {line.split()[0]: line.split() for line in out.getvalue().splitlines()[2:]}
+        self.assertEqual(set(rows), {'current', '10min'})
+        # served, lost, moved
+        self.assertEqual(rows['current'][2:5], ['5', '0', '1'])
+        self.assertEqual(rows['10min'][2:5], ['5', '0', '0'])
+
+
+class QueueTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.doctor.consultation_duration_min = 10
+        self.doctor.save()
+        # 10:00 local today, so appointment times are predictable
+        self.now = timezone.make_aware(datetime.combine(date.today(), time(10)))
+        patcher = mock.patch('django.utils.timezone.now', return_value=self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def advance(self, minutes):
+        self.now += timedelta(minutes=minutes)
+        timezone.now.return_value = self.now
+
+    def scheduled(self, at, username):
+        patient = make_patient(username)
+        appt = Appointment.objects.create(doctor=self.doctor, patient=patient.user, appointment_date=date.today(),
+                                          appointment_time=at, status='confirmed')
+        return queues.issue_token(self.doctor, appointment=appt, patient=patient)
+
+    def queue(self):
+        return DoctorQueue.objects.get(doctor=self.doctor, date=date.today())
+
+    def test_issue_and_call_next(self):
+        first = queues.issue_token(self.doctor, walk_in_name='A')
+        second = queues.issue_token(self.doctor, walk_in_name='B')
+        self.assertEqual((first.number, second.number), (1, 2))
+        self.assertEqual((self.queue().waiting, self.queue().last_token), (2, 2))
+
+        self.assertEqual(queues.call_next(self.queue()), first)
+        self.advance(20)
+        self.assertEqual(queues.call_next(self.queue()), second)
+        queue = self.queue()
+        self.assertEqual((queue.serving, queue.waiting, queue.served), (2, 0, 1))
+        # 600s moved a fifth of the way towards the 1200s consult
+        self.assertEqual(queue.avg_consult_seconds, 720)
+        self.assertEqual(QueueToken.objects.get(pk=first.pk).status, 'done')
+        self.assertIsNone(queues.call_next(self.queue()))
+        self.assertEqual(self.queue().served, 2)
+
+    def test_scheduled_merged_by_appointment_time(self):
+        early = self.scheduled(time(10, 30), 'ptearly')
+        late = self.scheduled(time(9, 30), 'ptlate')
+        self.advance(5)
+        walk_in = queues.issue_token(self.doctor, walk_in_name='C')
+        self.assertEqual(early.due_at, self.now - timedelta(minutes=5) + timedelta(minutes=30))
+        self.assertEqual(late.due_at, late.checked_in_at)
+        # Late arrival and walk-in in arrival order, then the 10:30 appointment
+        etas = queues.waiting_with_eta(self.queue())
+        self.assertEqual([t for t, _ in etas], [late, walk_in, early])
+        self.assertEqual([eta - self.now for _, eta in etas],
+                         [timedelta(0), timedelta(minutes=10), timedelta(minutes=25)])
+        self.assertEqual(queues.call_next(self.queue()), late)
+
+    def test_idle_eta_starts_now(self):
+        queues.issue_token(self.doctor, walk_in_name='A')
+        self.advance(30)
+        [(_, eta)] = queues.waiting_with_eta(self.queue())
+        self.assertEqual(eta, self.now)
+
+    @override_settings(STORAGES=PLAIN_STATIC)
+    def test_display_feed_not_modified(self):
+        url = reverse('queue_display_data', args=[self.doctor.pk])
+        self.assertEqual(self.client.get(url).json()['next'], [])
+        queues.issue_token(self.doctor, walk_in_name='A')
+        queues.call_next(self.queue())
+        queues.issue_token(self.doctor, walk_in_name='B')
+
+        response = self.client.get(url)
+        payload = response.json()
+        self.assertEqual((payload['serving'], payload['waiting']), (1, 1))
+        self.assertEqual(payload['next'], [[2, int((self.now + timedelta(minutes=10)).timestamp())]])
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+
+        # An overrunning consult anchors the ETAs to now, so they refresh each minute
+        self.advance(15)
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['next'], [[2, int(self.now.timestamp())]])
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': response['ETag']}).status_code, 304)
+
+        queues.call_next(self.queue())
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': response['ETag']}).status_code, 200)
+
+
+class PatientImportTests(TestCase):
+    HEADER = 'username,password,first_name,email,gender,dob,pincode,phone_number,allergies\n'
+
+    def run_import(self, lines, *args):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'patients.csv'
+            path.write_text(self.HEADER + ''.join(lines))
+            invites = Path(tmp) / 'invites.csv'
+            out, err = StringIO(), StringIO()
+            call_command('import_patients', str(path), '--workers', '1', '--invites', str(invites), *args,
+                         stdout=out, stderr=err)
+            return out.getvalue(), err.getvalue(), invites.read_text().splitlines()[1:]
+
+    def test_import(self):
+        CustomUser.objects.create_user('taken', password='x', role='patient')
+        out, err, invites = self.run_import([
+            'anna,S3cret-pass,Anna,anna@example.com,Female,1990-02-03,682001,9876543210,Penicillin\n',
+            'ben,,Ben,ben@example.com,M,1985-07-08,682002,9876543211,\n',
+            'taken,,T,,F,1985-07-08,682002,9876543212,\n',
+            'anna,,A,,F,1985-07-08,682002,9876543213,\n',
+            'cara,,C,,X,2999-01-01,682002,9876543214,\n',
+        ])
+        self.assertIn('Imported 2 patients (1 invited), rejected 3 rows', out)
+        self.assertIn('line 4 (taken): username: already exists', err)
+        self.assertIn('line 5 (anna): username: appears earlier in the file', err)
+        anna = CustomUser.objects.get(username='anna')
+        self.assertTrue(anna.check_password('S3cret-pass'))
+        self.assertEqual(anna.patient.gender, 'F')
+        self.assertFalse(CustomUser.objects.get(username='ben').has_usable_password())
+        self.assertEqual([row.split(',')[0] for row in invites], ['ben'])
+        # bulk_create skips signals; the allergy note is indexed by primary key
+        self.assertEqual(list(ClinicalText.objects.filter(kind='patient').values_list('object_id', flat=True)),
+                         [anna.patient.pk])
+
+    def test_dry_run_writes_nothing(self):
+        with mock.patch('accounts.management.commands.import_patients.ProcessPoolExecutor') as pool:
+            out, _, invites = self.run_import(
+                ['anna,S3cret-pass,Anna,,F,1990-02-03,682001,9876543210,\n'], '--dry-run')
+        pool.assert_not_called()
+        self.assertIn('Validated 1 patients', out)
+        self.assertEqual(invites, [])
+        self.assertFalse(CustomUser.objects.filter(username='anna').exists())
+
+    def test_index_ids_skips_other_rows(self):
+        other = make_patient('ptother')
+        mine = make_patient('ptmine')
+        # update() skips the signals, so neither is indexed yet
+        Patient.objects.filter(pk=other.pk).update(allergies='Latex')
+        Patient.objects.filter(pk=mine.pk).update(allergies='Sulfa')
+        self.assertEqual(search.index_ids('patients', [mine.pk]), 1)
+        self.assertEqual(list(ClinicalText.objects.values_list('object_id', flat=True)), [mine.pk])
+
+    def test_invite_token(self):
+        user = CustomUser.objects.create_user('invited', role='patient')
+        user.set_unusable_password()
+        user.save()
+        path = patient_import.invite_path(user)
+        self.assertEqual(resolve(path).url_name, 'accept_invite')
+        token = resolve(path).kwargs['token']
+        tokens = patient_import.invite_tokens
+        self.assertTrue(tokens.check_token(user, token))
+        # Another generator's tokens (password reset) are not invites
+        self.assertFalse(tokens.check_token(user, PasswordResetTokenGenerator().make_token(user)))
+
+        later = tokens._now() + timedelta(seconds=settings.PASSWORD_RESET_TIMEOUT + 60)
+        with mock.patch.object(tokens, '_now', return_value=later):
+            self.assertFalse(tokens.check_token(user, token))
+
+        user.is_active = False
+        self.assertFalse(tokens.check_token(user, token))
+        user.is_active = True
+        user.set_password('Chosen-pass-1')
+        self.assertFalse(tokens.check_token(user, token))
+
+    @override_settings(STORAGES=PLAIN_STATIC)
+    def test_accept_invite(self):
+        user = CustomUser.objects.create_user('invited', role='patient')
+        user.set_unusable_password()
+        user.save()
+        path = patient_import.invite_path(user)
+        response = self.client.post(path, {'new_password1': 'Chosen-pass-1', 'new_password2': 'Chosen-pass-1'})
+        self.assertRedirects(response, reverse('patient_dashboard'), fetch_redirect_response=False)
+        user.refresh_from_db()
+        self.assertTrue(user.check_password('Chosen-pass-1'))
+        self.assertIsNone(self.client.get(path).context['form'])
+
+
+class VitalsTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patient = make_patient()
+
+    def visit(self, bp, days_ago, **fields):
+        v = PatientVisit.objects.create(patient=self.patient, doctor=self.doctor, blood_pressure=bp, **fields)
+        PatientVisit.objects.filter(pk=v.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        v.refresh_from_db()
+        return v
+
+    def latest(self):
+        p = Patient.objects.get(pk=self.patient.pk)
+        return p.last_systolic, p.last_diastolic, p.last_vitals_at
+
+    def test_parse_blood_pressure(self):
+        for text, expected in [('120/80', (120, 80)), (' 135 / 85 mmHg', (135, 85)), ('140-90', (140, 90)),
+                               ('120\\80', (120, 80)), ('80/120', (None, None)), ('400/80', (None, None)),
+                               ('high', (None, None)), ('', (None, None)), (None, (None, None))]:
+            with self.subTest(text=text):
+                self.assertEqual(vitals.parse_blood_pressure(text), expected)
+
+    def test_latest_follows_edits_and_deletes(self):
+        older = self.visit('130/85', 10)
+        newer = self.visit('150/95', 1)
+        # The created_at updates above skip the signals; start from the real state
+        vitals.refresh_latest()
+        self.assertEqual(self.latest(), (150, 95, newer.created_at))
+
+        newer.blood_pressure = ''
+        newer.save()
+        self.assertEqual(self.latest(), (130, 85, older.created_at))
+        newer.blood_pressure = '155/97'
+        newer.save()
+        self.assertEqual(self.latest(), (155, 97, newer.created_at))
+
+        newer.delete()
+        self.assertEqual(self.latest(), (130, 85, older.created_at))
+        older.delete()
+        self.assertEqual(self.latest(), (None, None, None))
+
+    def test_archiving_refreshes_latest(self):
+        horizon = archive.archive_horizon()
+        self.visit('130/85', 10)
+        old = self.visit('150/95', 1)
+        PatientVisit.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=(date.today() - horizon).days + 5))
+        vitals.refresh_latest()
+        archive.archive_orphan_visit_batch(horizon, 0, 100)
+        self.assertEqual(self.latest()[:2], (130, 85))
+
+    def test_backfill(self):
+        visits = [self.visit(bp, n) for n, bp in enumerate(['120/80', 'n/a', '110/70'])]
+        PatientVisit.objects.update(bp_systolic=None, bp_diastolic=None)
+        last_id, parsed, skipped = vitals.backfill_batch(0, 10)
+        self.assertEqual((last_id, parsed, skipped), (visits[-1].pk, 2, 1))
+        self.assertEqual(list(PatientVisit.objects.order_by('pk').values_list('bp_systolic', 'bp_diastolic')),
+                         [(120, 80), (None, None), (110, 70)])
+        self.assertEqual(vitals.backfill_batch(last_id, 10), (None, 0, 0))
+
+    def test_cohort(self):
+        other = make_patient('ptother')
+        Patient.objects.filter(pk=self.patient.pk).update(last_systolic=150, last_diastolic=85)
+        Patient.objects.filter(pk=other.pk).update(last_systolic=125, last_diastolic=95)
+        self.assertEqual(list(vitals.cohort(systolic_above=140)), [self.patient])
+        self.assertEqual(list(vitals.cohort(diastolic_above=90)), [other])
+        self.assertEqual(list(vitals.cohort(systolic_above=140, diastolic_above=90)), [])
+
+    def test_trend(self):
+        start = timezone.now()
+        rows = [{'created_at': start + timedelta(days=n), 'height_cm': 160, 'weight_kg': 64 + n % 2,
+                 'bp_systolic': 120 if n % 3 else None, 'bp_diastolic': 80, 'sugar_level': None}
+                for n in range(10)]
+        series = vitals.trend(reversed(rows))
+        self.assertEqual(len(series['t']), 10)
+        self.assertAlmostEqual(series['bmi'][0], 25.0)
+        self.assertTrue(np.isnan(series['bp_systolic'][0]))
+
+        bucketed = vitals.trend(rows, points=5)
+        self.assertEqual(len(bucketed['t']), 5)
+        # Each bucket averages two days; missing readings do not count
+        self.assertEqual(bucketed['weight_kg'].tolist(), [64.5] * 5)
+        self.assertEqual(bucketed['bp_systolic'].tolist()[:2], [120.0, 120.0])
+        self.assertTrue(np.isnan(bucketed['sugar_level']).all())
+        self.assertEqual(len(vitals.trend([])['t']), 0)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patient = make_patient()
+        self.pharmacist = CustomUser.objects.create_user('rxarch', password='x', role='pharmacist')
+        self.horizon = archive.archive_horizon()
+        self.day = self.horizon - timedelta(days=3)
+        self.appt = Appointment.objects.create(doctor=self.doctor, patient=self.patient.user, appointment_date=self.day,
+                                               appointment_time=time(10, 0), status='completed')
+        self.visit = PatientVisit.objects.create(patient=self.patient, doctor=self.doctor, appointment=self.appt)
+        self.rx = Prescription.objects.create(visit=self.visit, patient=self.patient, doctor=self.doctor,
+                                              medicine_name='Paracetamol', claimed_by=self.pharmacist,
+                                              claimed_at=timezone.now())
+
+    def test_references_keep_archived_ids(self):
+        invoice = Invoice.objects.create(patient=self.patient, doctor=self.doctor, visit=self.visit,
+                                         appointment=self.appt, service_date=self.day, amount=Decimal('500'))
+        note = Notification.objects.create(kind='reminder', recipient=self.patient.user, appointment=self.appt)
+        queue = queues.get_queue(self.doctor, self.day)
+        token = QueueToken.objects.create(queue=queue, number=1, appointment=self.appt, patient=self.patient,
+                                          status='done')
+        entry = WaitlistEntry.objects.create(patient=self.patient.user, doctor=self.doctor, status='offered',
+                                             earliest_date=self.day, latest_date=self.day, appointment=self.appt)
+
+        last_id, counts = archive.archive_appointment_batch(self.horizon, 0, 100)
+        self.assertEqual((last_id, counts), (self.appt.pk, {'appointments': 1, 'visits': 1, 'prescriptions': 1}))
+        self.assertFalse(Appointment.objects.filter(pk=self.appt.pk).exists())
+        for row in (invoice, note, token, entry):
+            row.refresh_from_db()
+            self.assertIsNone(row.appointment_id)
+            self.assertEqual(row.archived_appointment_id, self.appt.pk)
+        self.assertIsNone(invoice.visit_id)
+        self.assertEqual(invoice.archived_visit_id, self.visit.pk)
+        self.assertEqual(archive.ArchivedPatientVisit.objects.get(pk=invoice.archived_visit_id).appointment_id,
+                         invoice.archived_appointment_id)
+
+        self.assertEqual(archive.archive_appointment_batch(self.horizon, last_id, 100)[0], None)
+
+    def test_prescription_claim_is_archived(self):
+        archive.archive_appointment_batch(self.horizon, 0, 100)
+        rx = archive.ArchivedPrescription.objects.get(pk=self.rx.pk)
+        self.assertEqual((rx.claimed_by_id, rx.claimed_at), (self.pharmacist.pk, self.rx.claimed_at))
+
+    def test_recent_rows_stay_hot(self):
+        Appointment.objects.filter(pk=self.appt.pk).update(appointment_date=self.horizon)
+        self.assertEqual(archive.archive_appointment_batch(self.horizon, 0, 100)[0], None)
+        self.assertTrue(PatientVisit.objects.filter(pk=self.visit.pk).exists())
+
+    def test_walk_in_visits_keep_invoice_reference(self):
+        walk_in = PatientVisit.objects.create(patient=self.patient, doctor=self.doctor)
+        PatientVisit.objects.filter(pk=walk_in.pk).update(created_at=timezone.now() - timedelta(days=800))
+        invoice = Invoice.objects.create(patient=self.patient, doctor=self.doctor, visit=walk_in,
+                                         service_date=self.day, amount=Decimal('200'))
+        self.assertEqual(archive.archive_orphan_visit_batch(self.horizon, 0, 100), (walk_in.pk, (1, 0)))
+        invoice.refresh_from_db()
+        self.assertEqual((invoice.visit_id, invoice.archived_visit_id), (None, walk_in.pk))
+
+    def test_visit_history_unions_archive(self):
+        archive.archive_appointment_batch(self.horizon, 0, 100)
+        recent = PatientVisit.objects.create(patient=self.patient, doctor=self.doctor)
+        rows = archive.visit_history(self.patient, fields=['id', 'created_at'])
+        self.assertEqual([(r['id'], r['archived']) for r in rows], [(recent.pk, False), (self.visit.pk, True)])
+        rows = archive.visit_history(self.patient, since=self.horizon, fields=['id', 'created_at'])
+        self.assertEqual([(r['id'], r['archived']) for r in rows], [(recent.pk, False)])
+
+
+class GenerateHospitalDataTests(TestCase):
+    """Generated rows skip the signals; the command must leave the derived tables as the rebuilds would."""
+
+    def test_derived_tables_are_built(self):
+        call_command('generate_hospital_data', doctors=2, patients=30, years=0.1, future_days=3, chunk_size=40,
+                     stdout=StringIO())
+        self.assertTrue(PatientVisit.objects.exists())
+
+        def snapshot():
+            return (list(DoctorDailyStats.objects.order_by('doctor_id', 'date').values()),
+                    list(PatientChartSummary.objects.order_by('patient_id').values()),
+                    list(Patient.objects.order_by('pk').values_list('last_systolic', 'last_diastolic',
+                                                                    'last_vitals_at')))
+
+        before = snapshot()
+        self.assertTrue(before[0])
+        self.assertEqual(len(before[1]), Patient.objects.count())
+        self.assertTrue(any(row[0] for row in before[2]))
+
+        today = timezone.localdate()
+        stats.rebuild(today - timedelta(days=36), today + timedelta(days=3))
+        charts.rebuild(Patient.objects.values_list('pk', flat=True))
+        vitals.refresh_latest()
+        after = snapshot()
+        # Row ids and write times differ after a rebuild
+        for rows in (*before[:2], *after[:2]):
+            for row in rows:
+                row.pop('id', None)
+                row.pop('updated_at', None)
+        self.assertEqual(after, before)
+        for source in ('patients', 'visits', 'prescriptions'):
+            self.assertEqual(search.backfill_batch(source, 0, 10000)[1], 0)
+        self.assertTrue(ClinicalText.objects.filter(kind='visit').exists())
+
+
+class MatcherTests(SimpleTestCase):
+    def test_whole_words_only(self):
+        matcher = allergies.Matcher([(t, t) for t in ('amox', 'amoxicillin', 'sulfa', 'sulfa drugs', '', '  ')])
+        self.assertEqual(list(matcher.find('Allergic to SULFA-drugs, amoxicillin')),
+                         ['sulfa', 'sulfa drugs', 'amoxicillin'])
+        self.assertEqual(list(matcher.find('ferrous sulfate; amoxil')), [])
+        self.assertEqual(list(matcher.find('')), [])
+
+    def test_follows_failure_links(self):
+        matcher = allergies.Matcher([('ab ab c', 1), ('ab c', 2), ('b', 3)])
+        # The first "ab ab " path fails on the third "a" and resumes from "ab "
+        self.assertEqual(list(matcher.find('ab ab ab c')), [1, 2])
+        self.assertEqual(list(matcher.find('ab/b')), [3])
+
+    def test_concepts(self):
+        matcher = allergies.Matcher([(t, (t, i, c)) for t, i, c in (
+            ('amoxil', 'amoxicillin', 'penicillin'), ('penicillins', '', 'penicillin'),
+            ('co trimoxazole', 'sulfamethoxazole', 'sulfonamide'),
+        )])
+        self.assertEqual(matcher.concepts('Amoxil 500 / penicillins'),
+                         {('ingredient', 'amoxicillin'): 'amoxil', ('class', 'penicillin'): 'amoxil'})
+        self.assertEqual(matcher.concepts('Co-Trimoxazole DS'),
+                         {('ingredient', 'sulfamethoxazole'): 'co trimoxazole',
+                          ('class', 'sulfonamide'): 'co trimoxazole'})
+        self.assertIs(matcher.concepts('Co-Trimoxazole DS'), matcher.concepts('Co-Trimoxazole DS'))
+        self.assertEqual(matcher.concepts(None), {})
+
+
+class PrescriptionConflictTests(TestCase):
+    def setUp(self):
+        allergies.invalidate()
+        self.doctor = make_doctor()
+        self.patient = make_patient()
+        Patient.objects.filter(pk=self.patient.pk).update(allergies='Penicillins', current_medications='Brufen 400')
+        self.patient.refresh_from_db()
+        self.visit = PatientVisit.objects.create(patient=self.patient, doctor=self.doctor)
+
+    def test_find_conflicts(self):
+        self.assertEqual(allergies.find_conflicts('Augmentin 625', 'penicillins', ''),
+                         [('allergy', 'penicillin', 'penicillins')])
+        self.assertEqual(allergies.find_conflicts('Ibuprofen 200', '', 'Brufen 400'),
+                         [('duplicate', 'ibuprofen', 'brufen')])
+        self.assertEqual(allergies.find_conflicts('Diclofenac 50', '', 'Brufen 400'),
+                         [('same_class', 'nsaid', 'brufen')])
+        self.assertEqual(allergies.find_conflicts('Paracetamol 500', 'penicillins', 'Brufen 400'), [])
+
+    def form(self, **data):
+        return PrescriptionForm({'medicine_name': 'Amoxil 500', 'duration_days': 5, **data}, patient=self.patient)
+
+    def test_form_requires_confirmation(self):
+        form = self.form()
+        self.assertFalse(form.is_valid())
+        self.assertIn("Prescribe anyway", form.non_field_errors()[0])
+        self.assertTrue(self.form(prescribe_anyway='on').is_valid())
+
+    def test_checked_once_when_saved_through_the_form(self):
+        form = self.form(prescribe_anyway='on')
+        self.assertTrue(form.is_valid())
+        rx = form.save(commit=False)
+        rx.visit, rx.doctor, rx.patient = self.visit, self.doctor, self.patient
+        with mock.patch.object(allergies, 'check_prescription', wraps=allergies.check_prescription) as check:
+            rx.save()
+            self.assertEqual(check.call_count, 0)
+            self.assertEqual(rx.conflict_warning, form.conflict_warning)
+            self.assertTrue(rx.conflict_warning.startswith('Allergy: penicillin'))
+
+            # Later saves, or a medicine changed after validation, are checked again
+            rx.medicine_name = 'Paracetamol 500'
+            rx.save()
+            self.assertEqual(check.call_count, 1)
+            self.assertEqual(rx.conflict_warning, '')
+
+
+class ChartSummaryTests(TestCase):
+    """Signal-maintained chart summaries must agree with charts.rebuild()."""
+
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patient = make_patient()
+
+    def visit(self, days_ago=0, **fields):
+        v = PatientVisit.objects.create(patient=self.patient, doctor=self.doctor, **fields)
+        if days_ago:
+            PatientVisit.objects.filter(pk=v.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+            v.refresh_from_db()
+        return v
+
+    def prescribe(self, visit, name, **fields):
+        return Prescription.objects.create(visit=visit, patient=self.patient, doctor=self.doctor,
+                                           medicine_name=name, **fields)
+
+    def chart(self):
+        return PatientChartSummary.objects.values().get(patient_id=self.patient.pk)
+
+    def assert_matches_rebuild(self):
+        chart = self.chart()
+        charts.rebuild([self.patient.pk])
+        rebuilt = self.chart()
+        chart.pop('updated_at'), rebuilt.pop('updated_at')
+        self.assertEqual(chart, rebuilt)
+
+    def test_rebuild(self):
+        other = make_doctor('drother')
+        ArchivedPatientVisit.objects.create(id=10 ** 6, patient=self.patient, doctor=other,
+                                            created_at=timezone.now() - timedelta(days=900),
+                                            updated_at=timezone.now() - timedelta(days=900))
+        measured = self.visit(days_ago=20, weight_kg=Decimal('70.5'), blood_pressure='130/85')
+        latest = self.visit(days_ago=2)
+        self.prescribe(measured, 'Metformin 500 mg', duration_days=90)
+        ended = self.prescribe(measured, 'Cetirizine 10 mg', duration_days=5)
+        Prescription.objects.filter(pk=ended.pk).update(end_date=timezone.localdate() - timedelta(days=1))
+        Patient.objects.filter(pk=self.patient.pk).update(allergies='Sulfa', chronic_diseases='Asthma')
+        PatientChartSummary.objects.all().delete()
+
+        self.assertEqual(charts.rebuild([self.patient.pk]), 1)
+        chart = charts.get_chart(self.patient.pk)
+        self.assertEqual(chart.visit_count, 3)
+        self.assertEqual((chart.last_visit_at, chart.last_doctor_id), (latest.created_at, self.doctor.pk))
+        self.assertEqual((chart.vitals_at, chart.weight_kg, chart.blood_pressure),
+                         (measured.created_at, Decimal('70.5'), '130/85'))
+        self.assertEqual([m['medicine_name'] for m in chart.current_medications], ['Metformin 500 mg'])
+        self.assertEqual((chart.allergies, chart.chronic_diseases), ('Sulfa', 'Asthma'))
+        self.assertEqual(charts.rebuild([]), 0)
+
+    def test_visit_saves_update_the_summary(self):
+        charts.get_chart(self.patient.pk)
+        first = self.visit(weight_kg=Decimal('70'))
+        chart = self.chart()
+        self.assertEqual((chart['visit_count'], chart['last_visit_at'], chart['vitals_at']),
+                         (1, first.created_at, first.created_at))
+
+        second = self.visit(blood_pressure='120/80')
+        self.assertEqual(self.chart()['blood_pressure'], '120/80')
+        self.assertIsNone(self.chart()['weight_kg'])
+        # Editing an older visit's vitals does not move them back in time
+        first.blood_pressure = '140/90'
+        first.save()
+        self.assertEqual(self.chart()['vitals_at'], second.created_at)
+        self.assert_matches_rebuild()
+
+        second.delete()
+        chart = self.chart()
+        self.assertEqual((chart['visit_count'], chart['blood_pressure']), (1, '140/90'))
+        self.assert_matches_rebuild()
+
+    def test_prescription_saves_update_the_summary(self):
+        visit = self.visit()
+        self.assertEqual(self.chart()['active_medications'], [])
+        rx = self.prescribe(visit, 'Amlodipine 5 mg', dosage='1 tablet', duration_days=30)
+        [med] = self.chart()['active_medications']
+        self.assertEqual((med['id'], med['medicine_name'], med['until']),
+                         (rx.pk, 'Amlodipine 5 mg', (timezone.localdate() + timedelta(days=29)).isoformat()))
+
+        rx.duration_days = 10
+        rx.save()
+        self.assertEqual(self.chart()['active_medications'][0]['until'],
+                         (timezone.localdate() + timedelta(days=9)).isoformat())
+        self.assert_matches_rebuild()
+        rx.delete()
+        self.assertEqual(self.chart()['active_medications'], [])
+
+    def test_patient_saves_update_the_summary(self):
+        charts.get_chart(self.patient.pk)
+        self.patient.allergies = 'Penicillin'
+        self.patient.save()
+        self.assertEqual(self.chart()['allergies'], 'Penicillin')
+
+
+class PrescriptionEndDateBackfillTests(TestCase):
+    """Migration 0024 fills end_date the way charts.course_end does."""
+
+    def test_backfill_matches_course_end(self):
+        migration = import_module('accounts.migrations.0024_backfill_prescription_end_dates')
+        doctor, patient = make_doctor(), make_patient()
+        visit = PatientVisit.objects.create(patient=patient, doctor=doctor)
+        archived_visit = ArchivedPatientVisit.objects.create(id=10 ** 6, patient=patient, doctor=doctor,
+                                                             created_at=timezone.now(), updated_at=timezone.now())
+        # 18:45 UTC is already the next day in Asia/Kolkata
+        late = datetime(2026, 3, 31, 18, 45, tzinfo=dt_timezone.utc)
+        rows = []
+        for n, days in enumerate([5, 1, None, 90]):
+            created = late + timedelta(days=n * 40)
+            rx = Prescription.objects.create(visit=visit, patient=patient, doctor=doctor,
+                                             medicine_name='Paracetamol', duration_days=days)
+            Prescription.objects.filter(pk=rx.pk).update(created_at=created)
+            rows.append((Prescription, rx.pk, created, days))
+            ArchivedPrescription.objects.create(id=rx.pk, visit=archived_visit, patient=patient, doctor=doctor,
+                                                medicine_name='Paracetamol', duration_days=days,
+                                                created_at=created, updated_at=created)
+            rows.append((ArchivedPrescription, rx.pk, created, days))
+        kept = date(2030, 1, 1)
+        Prescription.objects.update(end_date=None)
+        Prescription.objects.filter(pk=rows[0][1]).update(end_date=kept)
+
+        with CaptureQueriesContext(connection) as ctx:
+            migration.backfill_end_dates(apps, None)
+        self.assertEqual(len(ctx.captured_queries), 2)
+        for model, pk, created, days in rows[1:]:
+            with self.subTest(model=model.__name__, days=days):
+                self.assertEqual(model.objects.get(pk=pk).end_date, charts.course_end(created, days))
+        self.assertEqual(Prescription.objects.get(pk=rows[0][1]).end_date, kept)
+        self.assertEqual(charts.course_end(late, 1), date(2026, 4, 1))
@@ -2,15 +2,22 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import login, logout, update_session_auth_hash, login as auth_login,authenticate
 from django.utils import timezone
 from django.db.models import Q
-from django.utils.http import url_has_allowed_host_and_scheme
-from django.contrib.auth.forms import PasswordChangeForm
+from django.utils.http import url_has_allowed_host_and_scheme, urlsafe_base64_decode
+from django.contrib.auth.forms import PasswordChangeForm, SetPasswordForm
 from django.contrib.auth.forms import AuthenticationForm
-from .forms import SignUpForm, PatientEditForm, UserEditForm,StaffCheckInForm,PrescriptionForm,VisitSymptomsForm
-from .models import Patient, Appointment, PatientVisit, Prescription,Doctor, DoctorWorkingHours, DoctorUnavailability,Appointment,Staff
-from django.db import IntegrityError
+from .forms import SignUpForm, PatientEditForm, UserEditForm,StaffCheckInForm,PrescriptionForm,VisitSymptomsForm,WaitlistForm,LedgerEntryForm
+from .models import CustomUser, Patient, Appointment, PatientVisit, Prescription,Doctor,Appointment,Staff,WaitlistEntry,DoctorQueue,QueueToken,Invoice,ClinicalText
+from django.db import IntegrityError, transaction
 from datetime import datetime, timedelta
 from django.core.exceptions import ValidationError
 from django.shortcuts import get_object_or_404
+from .scheduling import compute_slots, book_slot
+from . import waitlist, queues, pharmacy, billing, vitals, search, charts, patient_import, notifications, documents
+from .analytics import default_range, utilization_report
+from .archive import visit_history
+from .routers import read_from_replica
+from django.http import FileResponse, Http404, JsonResponse, HttpResponseNotModified
+from django.contrib import messages
 
 def HomePage(request):
     return render(request,"Home/Home_Page.html")
@@ -71,6 +78,15 @@ def patient_dashboard(request):
         .order_by('-created_at')[:10]
         if patient_profile else []
     )
+    current_medications = (
+        charts.active_prescriptions([patient_profile.pk], today).select_related('doctor__user')
+        if patient_profile else []
+    )
+    waitlist_entries = (
+        WaitlistEntry.objects.select_related('doctor__user')
+        .filter(patient=request.user, status='waiting', latest_date__gte=today)
+        .order_by('earliest_date')
+    )
     return render(
         request,
         "Patient/Patient_dashboard.html",
@@ -78,6 +94,8 @@ def patient_dashboard(request):
             "upcoming_appointments": upcoming_appointments,
             "visits": visits,
             "prescriptions": prescriptions,
+            "current_medications": current_medications,
+            "waitlist_entries": waitlist_entries,
         },
     )
 
@@ -139,6 +157,26 @@ def change_password(request):
 
     return render(request,"Patient/change_password.html",{"form":form})
 
+def accept_invite(request, uidb64, token):
+    """Imported patients choose their first password from the link they were sent."""
+    try:
+        user = CustomUser.objects.get(pk=urlsafe_base64_decode(uidb64).decode(), role='patient')
+    except (ValueError, CustomUser.DoesNotExist):
+        user = None
+    if user is None or not patient_import.invite_tokens.check_token(user, token):
+        return render(request, "Patient/accept_invite.html", {"form": None})
+
+    if request.method == 'POST':
+        form = SetPasswordForm(user, request.POST)
+        if form.is_valid():
+            user = form.save()
+            auth_login(request, user)
+            return redirect('patient_dashboard')
+    else:
+        form = SetPasswordForm(user)
+
+    return render(request, "Patient/accept_invite.html", {"form": form})
+
 def login_view(request):
     if request.user.is_authenticated:
         return redirect('patient_dashboard')
@@ -169,67 +207,6 @@ def book_appointment(request):
         "selected_date": None,
         "slots": [],
     }
-    def compute_slots(doctor, day):
-        weekday = day.weekday()
-        blocks = DoctorWorkingHours.objects.filter(
-            doctor=doctor, weekdays=weekday, is_active=True
-        ).order_by('start_time')
-
-        if not blocks.exists():
-            return []
-
-        appt_qs = Appointment.objects.filter(
-            doctor=doctor, appointment_date=day
-        ).exclude(status='canceled')
-
-        if doctor.max_daily_appointments and appt_qs.count() >= doctor.max_daily_appointments:
-            return []
-
-        already = set(appt_qs.values_list('appointment_time', flat=True))
-
-        unavail = list(DoctorUnavailability.objects.filter(doctor=doctor, date=day))
-
-        def is_blocked(t):
-            for u in unavail:
-                if u.start_time is None and u.end_time is None:
-                    return True
-
-                if u.start_time and u.end_time and u.start_time <= t <= u.end_time:
-                    return True
-            return False
-
-        step = doctor.consultation_duration_min or 15
-        out = []
-        now_local_time = timezone.localtime().time() if day == timezone.localdate() else None
-
-        for b in blocks:
-            cur_dt = datetime.combine(day, b.start_time)
-            end_dt = datetime.combine(day, b.end_time)
-            while cur_dt < end_dt:
-                t = cur_dt.time()
-
-                if now_local_time and t <= now_local_time:
-                    cur_dt += timedelta(minutes=step)
-                    continue
-
-                booked = t in already
-                blocked = is_blocked(t)
-
-                out.append({
-                    "time_value": t.strftime('%H:%M'),
-                    "time_display": t.strftime('%H:%M'),
-                    "booked": booked,
-                    "blocked": blocked,
-                })
-                cur_dt += timedelta(minutes=step)
-
-        seen, slots = set(), []
-        for s in sorted(out, key=lambda x: x["time_value"]):
-            if s["time_value"] in seen:
-                continue
-            seen.add(s["time_value"])
-            slots.append(s)
-        return slots
 
     if request.method == "POST":
         action = request.POST.get("action")
@@ -260,6 +237,11 @@ def book_appointment(request):
             if not slots:
                 context["error_message"] = "No slots available for the selected date."
             context["slots"] = slots
+            context["waitlist_form"] = WaitlistForm(initial={
+                "doctor": doctor.id,
+                "earliest_date": selected_date,
+                "latest_date": selected_date + timedelta(days=6),
+            })
             return render(request, "Patient/appointment_book.html", context)
 
         elif action == "book":
@@ -275,22 +257,14 @@ def book_appointment(request):
                 context["slots"] = compute_slots(doctor, selected_date)
                 return render(request, "Patient/appointment_book.html", context)
 
-            appt = Appointment(
-                doctor=doctor,
-                patient=request.user,
-                appointment_date=selected_date,
-                appointment_time=appt_time,
-                status='pending',
-            )
             try:
-                appt.clean()
+                with transaction.atomic():
+                    appt = book_slot(doctor, request.user, selected_date, appt_time)
+                    notifications.enqueue('booked', appt)
             except ValidationError as e:
                 context["error_message"] = "; ".join(e.messages)
                 context["slots"] = compute_slots(doctor, selected_date)
                 return render(request, "Patient/appointment_book.html", context)
-
-            try:
-                appt.save()
             except IntegrityError:
                 context["error_message"] = "That slot was just taken. Please pick another."
                 context["slots"] = compute_slots(doctor, selected_date)
@@ -321,12 +295,58 @@ def cancel_appointment(request, pk):
         return redirect('patient_dashboard')
 
     if appt.status != 'canceled':
-        appt.status = 'canceled'
-        appt.save()
+        with transaction.atomic():
+            appt.status = 'canceled'
+            appt.save()
+            notifications.enqueue('canceled', appt)
+            waitlist.slot_freed(appt)
 
     return redirect('patient_dashboard')
 
 
+def join_waitlist(request):
+    if not request.user.is_authenticated:
+        return redirect('patient_register')
+    if getattr(request.user, 'role', '') != 'patient':
+        return redirect('/admin/')
+    if request.method != 'POST':
+        return redirect('book_appointment')
+
+    form = WaitlistForm(request.POST)
+    if form.is_valid():
+        entry = form.save(commit=False)
+        entry.patient = request.user
+        if form.cleaned_data.get('any_doctor'):
+            entry.specialization = entry.doctor.specialization
+            entry.doctor = None
+        try:
+            entry.full_clean()
+        except ValidationError as e:
+            form.add_error(None, e)
+        else:
+            entry.save()
+            return redirect('patient_dashboard')
+
+    doctors = Doctor.objects.select_related('user').order_by('user__first_name', 'user__last_name')
+    context = {
+        "doctors": doctors,
+        "selected_doctor_id": request.POST.get("doctor"),
+        "selected_date": request.POST.get("earliest_date"),
+        "slots": [],
+        "waitlist_form": form,
+        "error_message": "; ".join(m for errs in form.errors.values() for m in errs),
+    }
+    return render(request, "Patient/appointment_book.html", context)
+
+
+def withdraw_waitlist(request, pk):
+    if not request.user.is_authenticated:
+        return redirect('patient_register')
+    if request.method == 'POST':
+        WaitlistEntry.objects.filter(pk=pk, patient=request.user, status='waiting').update(status='withdrawn')
+    return redirect('patient_dashboard')
+
+
 def staff_login(request):
     if request.user.is_authenticated:
         role = getattr(request.user, 'role', '')
@@ -414,6 +434,11 @@ def _ensure_staff(request):
         return False
     return True
 
+
+# Appointment status after staff record a visit for it
+CHECK_IN_STATUS = {"pending": "confirmed", "confirmed": "confirmed", "no_show": "completed"}
+
+
 def staff_appointment_detail(request, pk):
     if not _ensure_staff(request):
         return redirect("staff_login")
@@ -425,20 +450,34 @@ def staff_appointment_detail(request, pk):
     if request.method == "POST":
         action = request.POST.get("action", "save")
         if action == "cancel":
-            appt.status = "canceled"
-            appt.save()
+            if appt.status != "canceled":
+                with transaction.atomic():
+                    appt.status = "canceled"
+                    appt.save()
+                    notifications.enqueue("canceled", appt)
+                    waitlist.slot_freed(appt)
             return redirect("staff_dashboard")
 
         form = StaffCheckInForm(request.POST, instance=visit)
+        if appt.status == "canceled":
+            form.add_error(None, "This appointment was canceled and can't be checked in.")
         if form.is_valid():
             v = form.save(commit=False)
             v.doctor = appt.doctor
             v.patient = appt.patient.patient
             v.appointment = appt
-            v.save()
-
-            appt.status = "confirmed"
-            appt.save()
+            with transaction.atomic():
+                v.save()
+                # A visit recorded after close-out turns a no-show into completed;
+                # completed stays as it is
+                status = CHECK_IN_STATUS.get(appt.status, appt.status)
+                if status != appt.status:
+                    appt.status = status
+                    appt.save()
+                if visit is None:
+                    notifications.enqueue("checked_in", appt)
+                if appt.appointment_date == timezone.localdate() and not QueueToken.objects.filter(appointment=appt).exists():
+                    queues.issue_token(appt.doctor, appointment=appt, patient=v.patient)
             return redirect("staff_dashboard")
     else:
         initial = {}
@@ -538,7 +577,9 @@ def doctor_appointment_detail(request, pk):
         defaults={"doctor": appt.doctor, "patient": appt.patient.patient}
     )
 
-    can_edit = (appt.status == "confirmed")
+    can_edit = appt.status in ("confirmed", "completed")
+    sym_form = VisitSymptomsForm(instance=visit) if can_edit else None
+    form = PrescriptionForm(patient=visit.patient) if can_edit else None
 
     if request.method == "POST":
         action = request.POST.get("action", "")
@@ -556,7 +597,7 @@ def doctor_appointment_detail(request, pk):
         if action == "add_prescription":
             if not can_edit:
                 return redirect("doctor_appointment_detail", pk=appt.pk)
-            form = PrescriptionForm(request.POST)
+            form = PrescriptionForm(request.POST, patient=visit.patient)
             if form.is_valid():
                 p = form.save(commit=False)
                 p.visit = visit
@@ -565,17 +606,379 @@ def doctor_appointment_detail(request, pk):
                 p.save()
                 return redirect("doctor_appointment_detail", pk=appt.pk)
 
-    else:
-        sym_form = VisitSymptomsForm(instance=visit) if can_edit else None
-        form = PrescriptionForm() if can_edit else None
-
     prescriptions = visit.prescriptions.select_related("doctor__user").order_by("-created_at")
 
     return render(request, "Doctor/appointment_prescribe.html", {
         "appointment": appt,
         "visit": visit,
+        "chart": charts.get_chart(visit.patient_id),
         "form": form,
         "sym_form": sym_form,
         "prescriptions": prescriptions,
         "can_prescribe": can_edit, 
-    })
\ No newline at end of file
+    })
+
+SEARCH_PAGE_SIZE = 25
+
+def clinical_search(request):
+    """Full-text search over visit notes/symptoms, prescriptions and patient allergy/chronic history."""
+    if not request.user.is_authenticated or getattr(request.user, "role", "") != "doctor":
+        return redirect("doctor_login")
+    doctor_profile = getattr(request.user, "doctor", None)
+
+    query = (request.GET.get("q") or "").strip()
+    kind = request.GET.get("kind") or ""
+    mine = bool(request.GET.get("mine"))
+
+    def parse_date(name):
+        try:
+            return datetime.fromisoformat(request.GET.get(name) or "").date()
+        except ValueError:
+            return None
+    start, end = parse_date("start"), parse_date("end")
+    try:
+        page = max(1, int(request.GET.get("page", 1)))
+    except ValueError:
+        page = 1
+
+    results = []
+    if query:
+        results = search.search(
+            query,
+            doctor_id=doctor_profile.pk if mine and doctor_profile else None,
+            start=start, end=end,
+            kinds=[kind] if kind else None,
+            limit=SEARCH_PAGE_SIZE + 1, offset=(page - 1) * SEARCH_PAGE_SIZE,
+        )
+        for r in results:
+            r.snippet_html = search.highlight(r.snippet)
+
+    params = request.GET.copy()
+    params.pop("page", None)
+    return render(request, "Doctor/clinical_search.html", {
+        "q": query,
+        "kind": kind,
+        "kinds": ClinicalText.KIND_CHOICES,
+        "mine": mine,
+        "start": start.isoformat() if start else "",
+        "end": end.isoformat() if end else "",
+        "results": results[:SEARCH_PAGE_SIZE],
+        "page": page,
+        "has_next": len(results) > SEARCH_PAGE_SIZE,
+        "base_query": params.urlencode(),
+    })
+
+def staff_utilization_report(request):
+    if not _ensure_staff(request):
+        return redirect("staff_login")
+
+    start, end = default_range()
+    try:
+        if request.GET.get('start'):
+            start = datetime.strptime(request.GET['start'], "%Y-%m-%d").date()
+        if request.GET.get('end'):
+            end = datetime.strptime(request.GET['end'], "%Y-%m-%d").date()
+    except ValueError:
+        pass
+    if start > end:
+        start, end = end, start
+
+    doctor_id = request.GET.get('doctor_id', '')
+    # A read-only aggregate over months of bookings: keep it off the primary
+    with read_from_replica():
+        doctors = list(Doctor.objects.select_related('user').order_by('user__first_name', 'user__last_name'))
+        report = utilization_report(start, end, doctors)
+
+    def pct(x):
+        return None if x != x else round(100 * float(x), 1)  # NaN -> None
+
+    rows = []
+    for i, d in enumerate(report['doctors']):
+        rows.append({
+            'doctor': d,
+            'booked': int(report['booked'][i].sum()),
+            'capacity': int(report['capacity'][i].sum()),
+            'utilization': pct(report['doctor_utilization'][i]),
+            'canceled': int(report['canceled'][i]),
+            'cancel_rate': pct(report['cancel_rate'][i]),
+            'no_show': int(report['no_show'][i]),
+            'no_show_rate': pct(report['no_show_rate'][i]),
+        })
+
+    # Heatmap for one doctor, or the whole clinic
+    selected = [i for i, d in enumerate(report['doctors']) if str(d.id) == doctor_id]
+    booked = report['booked'][selected].sum(axis=0) if selected else report['booked'].sum(axis=0)
+    capacity = report['capacity'][selected].sum(axis=0) if selected else report['capacity'].sum(axis=0)
+    open_hours = [h for h in range(24) if capacity[:, h].any() or booked[:, h].any()]
+    weekday_names = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+    heatmap = []
+    for wd in range(7):
+        cells = []
+        for h in open_hours:
+            cap = int(capacity[wd, h])
+            util = pct(booked[wd, h] / cap) if cap else None
+            cells.append({'util': util, 'alpha': min(util or 0, 100) / 100.0})
+        heatmap.append({'day': weekday_names[wd], 'cells': cells})
+
+    ctx = {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'doctors': doctors,
+        'selected_doctor_id': int(doctor_id) if doctor_id.isdigit() else '',
+        'rows': rows,
+        'hours': open_hours,
+        'heatmap': heatmap,
+    }
+    return render(request, "Staff/utilization_report.html", ctx)
+
+
+def staff_queue(request):
+    if not _ensure_staff(request):
+        return redirect("staff_login")
+
+    doctors = Doctor.objects.select_related('user').order_by('user__first_name', 'user__last_name')
+    doctor_id = request.GET.get('doctor_id') or request.POST.get('doctor_id') or ''
+    doctor = doctors.filter(pk=doctor_id).first() if doctor_id.isdigit() else None
+
+    if request.method == "POST" and doctor:
+        queue = queues.get_queue(doctor)
+        action = request.POST.get("action", "")
+        if action == "walk_in":
+            name = (request.POST.get("walk_in_name") or "").strip()
+            if name:
+                queues.issue_token(doctor, walk_in_name=name[:120])
+        elif action == "call_next":
+            queues.call_next(queue)
+        elif action == "finish":
+            queues.finish_current(queue)
+        elif action == "left":
+            token = QueueToken.objects.filter(pk=request.POST.get("token_id"), queue=queue).first()
+            if token:
+                queues.mark_left(token)
+        return redirect(f"{request.path}?doctor_id={doctor.id}")
+
+    ctx = {
+        'doctors': doctors,
+        'selected_doctor_id': doctor.id if doctor else '',
+    }
+    if doctor:
+        queue = queues.get_queue(doctor)
+        ctx['queue'] = queue
+        ctx['current'] = (QueueToken.objects.select_related('patient__user')
+                          .filter(queue=queue, number=queue.serving, status='in_consult').first()
+                          if queue.serving else None)
+        ctx['waiting'] = queues.waiting_with_eta(queue)
+        ctx['avg_minutes'] = round(queue.avg_consult_seconds / 60, 1)
+    return render(request, "Staff/queue.html", ctx)
+
+
+def queue_display(request, doctor_id):
+    doctor = get_object_or_404(Doctor.objects.select_related('user'), pk=doctor_id)
+    return render(request, "Staff/queue_display.html", {"doctor": doctor})
+
+
+def queue_display_data(request, doctor_id):
+    """
+    Polled by the waiting-room screen. The ETag follows the queue version
+    (see queues.display_etag), so an unchanged queue costs one indexed read
+    and an empty 304.
+    """
+    queue = DoctorQueue.objects.filter(doctor_id=doctor_id, date=timezone.localdate()).first()
+    if queue is None:
+        return JsonResponse({'v': 0, 'serving': None, 'waiting': 0, 'next': []})
+    etag = queues.display_etag(queue)
+    if request.headers.get('If-None-Match') == etag:
+        return HttpResponseNotModified(headers={'ETag': etag})
+    response = JsonResponse(queues.display_payload(queue))
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _ensure_pharmacist(request):
+    if not _ensure_staff(request):
+        return False
+    staff = getattr(request.user, "staff", None)
+    return staff is not None and staff.staff_role == "pharmacist"
+
+def pharmacy_queue(request):
+    if not _ensure_pharmacist(request):
+        return redirect("staff_login")
+
+    if request.method == "POST":
+        action = request.POST.get("action", "")
+        visit_id = request.POST.get("visit_id", "")
+        if visit_id.isdigit():
+            if action == "claim":
+                if not pharmacy.claim_visit(int(visit_id), request.user):
+                    messages.error(request, "Someone else already claimed that visit.")
+            elif action == "release":
+                pharmacy.release_visit(int(visit_id), request.user)
+            elif action == "dispense":
+                ids = [int(x) for x in request.POST.getlist("prescription_ids") if x.isdigit()]
+                pharmacy.dispense_visit(int(visit_id), request.user, ids or None)
+        return redirect("pharmacy_queue")
+
+    queue = pharmacy.open_queue()
+    # What each patient is already taking from earlier visits, in one query
+    taking = {}
+    for p in charts.active_prescriptions({items[0].patient_id for _, items in queue}):
+        taking.setdefault(p.patient_id, []).append(p)
+
+    groups = []
+    for visit_id, items in queue:
+        first = items[0]
+        claimed_by = next((p.claimed_by for p in items if p.claimed_by_id), None)
+        groups.append({
+            "visit_id": visit_id,
+            "visit": first.visit,
+            "patient": first.patient,
+            "doctor": first.doctor,
+            "prescriptions": items,
+            "also_taking": [p for p in taking.get(first.patient_id, []) if p.visit_id != visit_id],
+            "claimed_by": claimed_by,
+            "mine": claimed_by is not None and claimed_by.pk == request.user.pk,
+            "has_pending": any(p.dispense_status == "pending" for p in items),
+        })
+    groups.sort(key=lambda g: not g["mine"])
+
+    return render(request, "Staff/pharmacy_queue.html", {"groups": groups})
+
+
+def prescription_pdf(request, visit_id):
+    """
+    The visit's printable prescription, for its patient, its doctor and
+    pharmacists. Served from the document cache (see accounts.documents);
+    the ETag is the content key, so a reprint of an unchanged document is
+    an empty 304.
+    """
+    if not request.user.is_authenticated:
+        return redirect("login")
+    role = getattr(request.user, "role", "")
+    if role == "patient":
+        if not PatientVisit.objects.filter(pk=visit_id, patient__user=request.user).exists():
+            raise Http404
+    elif role == "doctor":
+        if not PatientVisit.objects.filter(pk=visit_id, doctor__user=request.user).exists():
+            raise Http404
+    elif not _ensure_pharmacist(request):
+        return redirect("login")
+
+    found = documents.open_current(visit_id)
+    if found is None:
+        raise Http404
+    document, key = found
+    etag = f'"{key}"'
+    if request.headers.get("If-None-Match") == etag:
+        document.close()
+        return HttpResponseNotModified(headers={"ETag": etag})
+    response = FileResponse(document, content_type="application/pdf",
+                            filename=f"prescription-{visit_id}.pdf")
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def _ensure_billing(request):
+    if not _ensure_staff(request):
+        return False
+    staff = getattr(request.user, "staff", None)
+    return staff is not None and staff.staff_role == "billing"
+
+def billing_dashboard(request):
+    if not _ensure_billing(request):
+        return redirect("staff_login")
+
+    query = (request.GET.get("q") or request.POST.get("q") or "").strip()
+    patient_id = request.GET.get("patient_id") or request.POST.get("patient_id") or ""
+    patient = (Patient.objects.select_related("user").filter(pk=patient_id).first()
+               if patient_id.isdigit() else None)
+
+    if request.method == "POST" and patient:
+        # DecimalField turns away NaN, Infinity and more than two decimal places
+        form = LedgerEntryForm(request.POST)
+        if not form.is_valid():
+            messages.error(request, "Enter a positive amount with at most two decimal places.")
+        else:
+            invoice = Invoice.objects.filter(pk=request.POST.get("invoice_id") or None, patient=patient).first()
+            kind, amount = form.entry()
+            billing.post_entry(patient, kind, amount, invoice=invoice,
+                               note=form.cleaned_data["note"], user=request.user)
+        return redirect(f"{request.path}?patient_id={patient.pk}")
+
+    ctx = {"q": query, "patient": patient}
+    if query and not patient:
+        ctx["matches"] = (Patient.objects.select_related("user")
+                          .filter(Q(user__username__icontains=query) | Q(phone_number=query)
+                                  | Q(user__last_name__iexact=query))
+                          .order_by("user__last_name", "user__first_name")[:25])
+    if patient:
+        ctx["open_invoices"] = (Invoice.objects.select_related("doctor__user")
+                                .filter(patient=patient, status="open").order_by("service_date"))
+        ctx["ledger"] = (patient.ledger.select_related("invoice", "created_by")
+                         .order_by("-created_at")[:25])
+    return render(request, "Staff/billing.html", ctx)
+
+
+def vitals_trend(request, patient_id=None):
+    """
+    JSON vitals series for one patient: patients get their own, doctors and
+    staff any patient's. ?points= caps the number of (averaged) samples.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "login required"}, status=401)
+    role = getattr(request.user, "role", "")
+    if role == "patient":
+        patient = getattr(request.user, "patient", None)
+        if patient is None or (patient_id is not None and patient_id != patient.pk):
+            return JsonResponse({"error": "not found"}, status=404)
+    elif role in ("doctor", "staff"):
+        patient = get_object_or_404(Patient, pk=patient_id) if patient_id else None
+        if patient is None:
+            return JsonResponse({"error": "patient id required"}, status=400)
+    else:
+        return JsonResponse({"error": "forbidden"}, status=403)
+
+    try:
+        points = max(2, min(int(request.GET.get("points", 60)), 500))
+    except ValueError:
+        points = 60
+    series = vitals.trend(visit_history(patient, fields=["created_at", *vitals.TREND_FIELDS]), points)
+
+    def clean(values, digits):
+        return [None if v != v else round(float(v), digits) for v in values]  # NaN -> None
+
+    return JsonResponse({
+        "patient": patient.pk,
+        "t": [int(x) for x in series["t"]],
+        "systolic": clean(series["bp_systolic"], 0),
+        "diastolic": clean(series["bp_diastolic"], 0),
+        "weight_kg": clean(series["weight_kg"], 1),
+        "height_cm": clean(series["height_cm"], 1),
+        "bmi": clean(series["bmi"], 1),
+        "sugar": clean(series["sugar_level"], 1),
+    })
+
+
+def vitals_cohort(request):
+    """Patients whose latest reading is above ?systolic= / ?diastolic=, for doctors and staff."""
+    if not request.user.is_authenticated or getattr(request.user, "role", "") not in ("doctor", "staff"):
+        return JsonResponse({"error": "forbidden"}, status=403)
+    try:
+        systolic = int(request.GET["systolic"]) if request.GET.get("systolic") else None
+        diastolic = int(request.GET["diastolic"]) if request.GET.get("diastolic") else None
+        limit = max(1, min(int(request.GET.get("limit", 100)), 1000))
+    except ValueError:
+        return JsonResponse({"error": "systolic, diastolic and limit must be integers"}, status=400)
+    if systolic is None and diastolic is None:
+        return JsonResponse({"error": "give systolic and/or diastolic"}, status=400)
+
+    qs = (vitals.cohort(systolic, diastolic).select_related("user")
+          .order_by("-last_systolic" if systolic is not None else "-last_diastolic")[:limit])
+    return JsonResponse({"patients": [{
+        "id": p.pk,
+        "name": str(p),
+        "systolic": p.last_systolic,
+        "diastolic": p.last_diastolic,
+        "measured_at": p.last_vitals_at.isoformat() if p.last_vitals_at else None,
+    } for p in qs]})
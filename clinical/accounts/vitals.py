@@ -0,0 +1,122 @@
+import re
+
+import numpy as np
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from .models import Patient, PatientVisit
+
+BP_PATTERN = re.compile(r'^\s*(\d{2,3})\s*[/\\-]\s*(\d{2,3})\b')
+SYSTOLIC_RANGE = (50, 300)
+DIASTOLIC_RANGE = (20, 200)
+
+
+def parse_blood_pressure(text):
+    """
+    "120/80" (also "120 / 80 mmHg", "120-80") -> (120, 80). Returns
+    (None, None) for anything that is not a plausible reading.
+    """
+    if not text:
+        return None, None
+    m = BP_PATTERN.match(text)
+    if not m:
+        return None, None
+    systolic, diastolic = int(m.group(1)), int(m.group(2))
+    if not (SYSTOLIC_RANGE[0] <= systolic <= SYSTOLIC_RANGE[1]
+            and DIASTOLIC_RANGE[0] <= diastolic <= DIASTOLIC_RANGE[1]
+            and systolic > diastolic):
+        return None, None
+    return systolic, diastolic
+
+
+def backfill_batch(after_id, batch_size):
+    """
+    Parse one keyset batch of visits that have blood_pressure text but no
+    structured reading yet. Returns (last id or None when done, parsed, skipped).
+    """
+    with transaction.atomic():
+        rows = list(PatientVisit.objects
+                    .filter(pk__gt=after_id, bp_systolic__isnull=True, blood_pressure__isnull=False)
+                    .exclude(blood_pressure='')
+                    .order_by('pk')
+                    .only('id', 'blood_pressure')[:batch_size])
+        if not rows:
+            return None, 0, 0
+        parsed = []
+        for v in rows:
+            v.bp_systolic, v.bp_diastolic = parse_blood_pressure(v.blood_pressure)
+            if v.bp_systolic is not None:
+                parsed.append(v)
+        PatientVisit.objects.bulk_update(parsed, ['bp_systolic', 'bp_diastolic'])
+    return rows[-1].pk, len(parsed), len(rows) - len(parsed)
+
+
+def refresh_latest(patient_ids=None):
+    """
+    Copy each patient's newest structured reading onto Patient in one UPDATE;
+    patients with no reading left in the visit table are cleared.
+    """
+    latest = (PatientVisit.objects
+              .filter(patient=OuterRef('pk'), bp_systolic__isnull=False)
+              .order_by('-created_at', '-pk'))
+    patients = Patient.objects.all()
+    if patient_ids is not None:
+        patients = patients.filter(pk__in=patient_ids)
+    return patients.update(
+        last_systolic=Subquery(latest.values('bp_systolic')[:1]),
+        last_diastolic=Subquery(latest.values('bp_diastolic')[:1]),
+        last_vitals_at=Subquery(latest.values('created_at')[:1]),
+    )
+
+
+def reading_removed(patient_id, recorded_at):
+    """A visit's reading was cleared or deleted: if it was the patient's latest, fall back to the one before."""
+    if Patient.objects.filter(pk=patient_id, last_vitals_at=recorded_at).exists():
+        refresh_latest([patient_id])
+
+
+def cohort(systolic_above=None, diastolic_above=None):
+    """Patients whose latest reading is above the given limits, via the last_* indexes."""
+    qs = Patient.objects.all()
+    if systolic_above is not None:
+        qs = qs.filter(last_systolic__gt=systolic_above)
+    if diastolic_above is not None:
+        qs = qs.filter(last_diastolic__gt=diastolic_above)
+    return qs
+
+
+TREND_FIELDS = ('height_cm', 'weight_kg', 'bp_systolic', 'bp_diastolic', 'sugar_level')
+
+
+def trend(visits, points=60):
+    """
+    Time series of vitals from ``visits`` (dicts with created_at and
+    TREND_FIELDS, any order), with BMI, averaged into at most ``points``
+    equal-width time buckets. Missing readings are NaN in the arrays and
+    simply do not count towards a bucket's mean.
+    """
+    rows = sorted(visits, key=lambda v: v['created_at'])
+    if not rows:
+        return {'t': np.array([]), **{f: np.array([]) for f in TREND_FIELDS + ('bmi',)}}
+
+    t = np.array([v['created_at'].timestamp() for v in rows])
+    cols = {f: np.array([v[f] for v in rows], dtype=float) for f in TREND_FIELDS}
+    height_m = cols['height_cm'] / 100.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cols['bmi'] = np.where(height_m > 0, cols['weight_kg'] / (height_m * height_m), np.nan)
+
+    if len(t) <= points:
+        return {'t': t, **cols}
+
+    edges = np.linspace(t[0], t[-1], points + 1)
+    bucket = np.clip(np.searchsorted(edges, t, side='right') - 1, 0, points - 1)
+    rows_per_bucket = np.bincount(bucket, minlength=points)
+    keep = rows_per_bucket > 0
+    out = {'t': (np.bincount(bucket, weights=t, minlength=points)[keep] / rows_per_bucket[keep])}
+    for name, values in cols.items():
+        present = ~np.isnan(values)
+        sums = np.bincount(bucket, weights=np.where(present, values, 0.0), minlength=points)
+        counts = np.bincount(bucket, weights=present, minlength=points)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out[name] = (sums / counts)[keep]
+    return out
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+from functools import partial
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from . import notifications
+from .models import ACTIVE_APPOINTMENT, WAITLIST_MAX_WINDOW_DAYS, Appointment, WaitlistEntry
+from .scheduling import book_slot
+
+
+def _matching(qs, appt):
+    """
+    Entries that accept this slot, longest-waiting first. The partial index
+    only bounds ``earliest_date``: a range scan over the band of waiting
+    entries that could still cover the slot (windows are at most
+    WAITLIST_MAX_WINDOW_DAYS long). The window end, time of day and "already
+    booked with this doctor" checks are filtered per row within that band.
+    """
+    day, t = appt.appointment_date, appt.appointment_time
+    busy = Appointment.objects.filter(
+        ACTIVE_APPOINTMENT, patient=OuterRef('patient'), doctor=appt.doctor, appointment_date=day,
+    )
+    return (qs
+            .filter(status='waiting',
+                    earliest_date__range=(day - timedelta(days=WAITLIST_MAX_WINDOW_DAYS - 1), day),
+                    latest_date__gte=day)
+            .filter(Q(earliest_time__isnull=True) | Q(earliest_time__lte=t))
+            .filter(Q(latest_time__isnull=True) | Q(latest_time__gte=t))
+            .exclude(patient_id=appt.patient_id)
+            .exclude(Exists(busy))
+            # Longest-waiting window first; pk breaks ties in index order
+            .order_by('earliest_date', 'pk'))
+
+
+def candidates(appt, limit=None):
+    """
+    Waiting entries that could be offered ``appt``'s slot, in offer order:
+    entries for that doctor first, then entries for any doctor of the same
+    specialization. At most ``limit`` entries are read.
+    """
+    if limit is None:
+        limit = getattr(settings, 'WAITLIST_OFFER_ATTEMPTS', 5)
+    found = list(_matching(WaitlistEntry.objects.filter(doctor=appt.doctor), appt)[:limit])
+    if len(found) < limit and appt.doctor.specialization:
+        found += _matching(WaitlistEntry.objects.filter(doctor__isnull=True,
+                                                        specialization=appt.doctor.specialization),
+                           appt)[:limit - len(found)]
+    return found
+
+
+def offer_slot(appointment_id):
+    """
+    Book the slot freed by a canceled appointment for the first waitlist
+    match that can take it, as a pending appointment linked from the entry;
+    the patient confirms or cancels it like any other booking. A candidate
+    whose booking fails validation is skipped and stays waiting. Returns the
+    new appointment, or None when nobody matches or the slot was taken again.
+    """
+    appt = (Appointment.objects.select_related('doctor')
+            .filter(pk=appointment_id, status='canceled').first())
+    if appt is None:
+        return None
+    slot = timezone.make_aware(datetime.combine(appt.appointment_date, appt.appointment_time))
+    if slot <= timezone.now():
+        return None
+
+    for entry in candidates(appt):
+        try:
+            with transaction.atomic():
+                # Claim the entry first so two cancellations never offer it twice
+                claimed = WaitlistEntry.objects.filter(pk=entry.pk, status='waiting').update(
+                    status='offered', offered_at=timezone.now(),
+                )
+                if not claimed:
+                    continue
+                offered = book_slot(appt.doctor, entry.patient, appt.appointment_date, appt.appointment_time,
+                                    notes='Offered from the waitlist')
+                WaitlistEntry.objects.filter(pk=entry.pk).update(appointment=offered)
+                notifications.enqueue('offered', offered)
+        except ValidationError:
+            # Rolled back to waiting; try the next candidate
+            continue
+        except IntegrityError:
+            # Someone else booked the slot first
+            return None
+        return offered
+    return None
+
+
+def slot_freed(appt):
+    """Offer ``appt``'s slot once the cancellation has committed."""
+    transaction.on_commit(partial(offer_slot, appt.pk))
@@ -43,12 +43,16 @@ AUTH_USER_MODEL = 'accounts.CustomUser'
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'accounts.staticfiles.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.audit.AuditMiddleware',
+    'accounts.routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'accounts.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'clinical.urls'
@@ -74,13 +78,69 @@ WSGI_APPLICATION = 'clinical.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite production profile:
+#  - WAL lets dashboard reads run while a booking or check-in is writing
+#  - IMMEDIATE makes every atomic() block take the write lock up front, so
+#    writers queue on the busy timeout instead of failing with "database is locked"
+#  - connections are kept open between requests so the pragmas run once per worker
+# Set SQLITE_LEGACY=1 to fall back to Django's defaults (rollback journal).
+# journal_mode=WAL is stored in the database file: the first connection
+# converts whatever DATABASES['default'] names, including the sample
+# db.sqlite3 checked in for development, and leaves db.sqlite3-wal/-shm beside
+# it (gitignored). Use SQLITE_LEGACY=1 to leave the sample file as committed;
+# once converted, `git checkout db.sqlite3` restores it.
+
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=20000',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA cache_size=-32000',
+    'PRAGMA temp_store=MEMORY',
+]
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ';'.join(SQLITE_PRAGMAS),
+        },
     }
 }
 
+if os.environ.get('SQLITE_LEGACY', '') == '1':
+    DATABASES['default'].update(CONN_MAX_AGE=0, OPTIONS={})
+
+# Read replica for dashboards and admin changelists (off unless REPLICA_ENABLED is set).
+# Locally it is a second SQLite file refreshed by `manage.py snapshot_replica --interval N`.
+
+if os.environ.get('REPLICA_ENABLED', '') == '1':
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_replica.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            'init_command': 'PRAGMA query_only=1;PRAGMA mmap_size=268435456;PRAGMA cache_size=-32000',
+        },
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['accounts.routers.ReplicaRouter']
+REPLICA_STICKY_SECONDS = 60
+REPLICA_READ_VIEWS = [
+    'patient_dashboard',
+    'doctor_dashboard',
+    'staff_dashboard',
+    r'admin:accounts_\w+_changelist',
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -100,6 +160,12 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Lifetime of the set-your-password links sent to imported patients
+# (accounts.patient_import). The app has no password-reset flow, so these
+# invites are the only tokens it applies to.
+
+PASSWORD_RESET_TIMEOUT = 30 * 24 * 3600
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -119,11 +185,79 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / "staticfiles"
 STATICFILES_DIRS = [
-    BASE_DIR / "static",
+    BASE_DIR / "Static",
 ]
 
+# collectstatic fingerprints every file and precompresses the text ones (gzip,
+# plus brotli when the package is installed); accounts.staticfiles.StaticFilesMiddleware
+# then serves the collected files with far-future caching. Run collectstatic
+# before serving with DEBUG off.
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "accounts.staticfiles.CompressedManifestStaticFilesStorage"},
+}
+# Cache lifetime in seconds of static files served under their plain, unhashed names
+STATIC_MAX_AGE = 60
+# Widths of the downscaled copies of large background images, written next to
+# each by `manage.py build_image_variants` and chosen by media queries in the CSS
+STATIC_IMAGE_VARIANTS = {
+    'Home/images/bg.jpg': [640, 1280, 1920],
+    'Patient/image/RegBack.jpg': [640, 1280, 1920],
+}
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Request profiling (off unless PROFILING_ENABLED is set)
+# Captures land in PROFILING_DIR; summarize with `manage.py profile_summary`
+
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '') == '1'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0.01'))
+PROFILING_SLOW_MS = int(os.environ.get('PROFILING_SLOW_MS', '500'))
+PROFILING_INTERVAL_MS = 5
+PROFILING_MAX_FILES = 200
+PROFILING_DIR = BASE_DIR / 'profiles'
+
+
+# Appointments, visits and prescriptions older than this are moved to the
+# archive tables by `manage.py archive_history`
+
+ARCHIVE_RETENTION_DAYS = 730
+
+
+# A canceled slot is offered to at most this many waitlist entries in turn,
+# moving on when a booking fails validation (accounts.waitlist)
+
+WAITLIST_OFFER_ATTEMPTS = 5
+
+
+# Background tasks run by `manage.py run_tasks` (see accounts.jobs); exports
+# they produce are written here
+
+EXPORT_DIR = BASE_DIR / 'exports'
+
+
+# Outgoing mail for appointment notifications, sent from the outbox by
+# `manage.py send_notifications` (reminders are queued nightly by
+# `manage.py queue_appointment_reminders`). For local testing run a debugging
+# server such as `python -m aiosmtpd -n -l localhost:1025` with EMAIL_PORT=1025.
+
+EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', '25'))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', '') == '1'
+EMAIL_TIMEOUT = 10
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'appointments@clinic.local')
+
+
+# Printable prescriptions (accounts.documents), cached here keyed by content;
+# `manage.py render_prescriptions` fills it ahead of the day's pharmacy rush.
+# Stale versions are removed as documents are re-rendered.
+
+DOCUMENT_CACHE_DIR = BASE_DIR / 'documents'
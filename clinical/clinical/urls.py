@@ -31,22 +31,42 @@ urlpatterns = [
     path('edit-profile/',views.edit_profile,name='edit_profile'),
     path('change-password/',views.change_password,name='change_password'),
     path('login/', views.login_view, name='login'),
+    path('invite/<uidb64>/<token>/', views.accept_invite, name='accept_invite'),
 
     # Appointment booking
     path('book_appointment',views.book_appointment, name='book_appointment'),
     path('appointments/<int:pk>/cancel/', views.cancel_appointment, name='cancel_appointment'),
+    path('waitlist/join/', views.join_waitlist, name='join_waitlist'),
+    path('waitlist/<int:pk>/withdraw/', views.withdraw_waitlist, name='withdraw_waitlist'),
+
+    # Vitals
+    path('vitals/trend/', views.vitals_trend, name='vitals_trend'),
+    path('vitals/trend/<int:patient_id>/', views.vitals_trend, name='patient_vitals_trend'),
+    path('vitals/cohort/', views.vitals_cohort, name='vitals_cohort'),
+
+    # Printable prescriptions
+    path('visits/<int:visit_id>/prescription.pdf', views.prescription_pdf, name='prescription_pdf'),
 
     # Staff Url
     path('staff/login/', views.staff_login, name='staff_login'),
     path('staff/dashboard/',views.staff_dashboard,name='staff_dashboard'),
     path('staff/logout/', views.staff_logout, name='staff_logout'),
     path('staff/appointment/<int:pk>/', views.staff_appointment_detail, name='staff_appointment_detail'),
+    path('staff/reports/utilization/', views.staff_utilization_report, name='staff_utilization_report'),
+    path('staff/queue/', views.staff_queue, name='staff_queue'),
+    path('staff/pharmacy/', views.pharmacy_queue, name='pharmacy_queue'),
+    path('staff/billing/', views.billing_dashboard, name='billing_dashboard'),
+
+    # Waiting-room screen
+    path('queue/<int:doctor_id>/', views.queue_display, name='queue_display'),
+    path('queue/<int:doctor_id>/data/', views.queue_display_data, name='queue_display_data'),
 
     # Doctor Url
     path('doctor/login/',views.doctor_login,name='doctor_login'),
     path('doctor/logout/',views.doctor_logout,name='doctor_logout'),
     path('doctor/dashboard/',views.doctor_dashboard,name='doctor_dashboard'),
     path('doctor/appointment/<int:pk>/',views.doctor_appointment_detail,name='doctor_appointment_detail'),
+    path('doctor/search/',views.clinical_search,name='clinical_search'),
 
 ]
 